@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from fake_ollama import FakeOllamaServer
+
+PERCENTILES = (50, 95, 99)
+
+# Inputs long and open-ended enough that the rule tier hands them to the model
+INPUT_TEMPLATES = [
+    "Last weekend I drove to {place} with {name} because we wanted to try {activity}, and it changed how I see {topic}",
+    "My colleague {name} keeps telling me about {activity} in {place}, which is making me rethink my plans for {topic}",
+    "I have been worried about {topic} lately since {name} moved to {place}, so I started {activity} to cope",
+]
+FILLERS = {
+    "place": ["Seattle", "Lisbon", "the coast", "Kyoto", "my hometown", "Toronto"],
+    "name": ["Alex", "Priya", "my sister", "Jordan", "Sam", "my manager"],
+    "activity": ["rock climbing", "pottery", "night running", "learning Spanish", "volunteering", "baking bread"],
+    "topic": ["my career", "money", "my health", "family time", "moving abroad", "side projects"],
+}
+
+
+def sample_inputs(count: int) -> List[str]:
+    inputs = []
+    for i in range(count):
+        values = {key: options[(i * (3 + k)) % len(options)] for k, (key, options) in enumerate(FILLERS.items())}
+        inputs.append(f"{INPUT_TEMPLATES[i % len(INPUT_TEMPLATES)].format(**values)} (note {i})")
+    return inputs
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def latency_summary(latencies: List[float], elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    summary = {
+        "calls": len(latencies),
+        "elapsed_seconds": round(elapsed, 4),
+        "calls_per_second": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+    }
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = round(1000 * percentile(ordered, q), 3)
+    return summary
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_extract(ollama_host: str, workdir: str, inputs: int, model_choice: str, fast: bool,
+                  snapshot_format: str, route: bool = False, save_interval: Optional[float] = None,
+                  max_unsaved: Optional[int] = None) -> Dict:
+    """extract_and_store latency and throughput against the fake server
+
+    The graph is saved after each input, or by a background writer when
+    save_interval or max_unsaved is set; elapsed time includes its final flush.
+    """
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+    from model_router import ModelRouter
+
+    kg_file = os.path.join(workdir, f"extract.{'ukg' if snapshot_format == 'binary' else 'json'}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor = UltraKnowledgeExtractor(kg_file=kg_file, ollama_host=ollama_host, response_cache_size=0,
+                                            snapshot_format=snapshot_format, save_interval=save_interval,
+                                            max_unsaved_inputs=max_unsaved)
+        if not extractor.setup_llm(model_choice):
+            raise RuntimeError(f"could not reach the fake server at {ollama_host}")
+        if route:
+            extractor.router = ModelRouter(list(extractor.available_models))
+
+        latencies = []
+        start = time.perf_counter()
+        for user_input in sample_inputs(inputs):
+            call_start = time.perf_counter()
+            extractor.extract_and_store(user_input, fast=fast)
+            latencies.append(time.perf_counter() - call_start)
+        extractor.close()
+        elapsed = time.perf_counter() - start
+
+    stats = extractor.kg["analytics"]["extraction_stats"]
+    results = {
+        **latency_summary(latencies, elapsed),
+        "successful_extractions": stats["successful_extractions"],
+        "failed_extractions": stats["failed_extractions"],
+        "triplets": len(extractor.kg["triplets"]),
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if route:
+        results["routing"] = {tier: row["calls"] for tier, row in extractor.router.summary().items()}
+    return results
+
+
+def bench_analysis(ollama_host: str, inputs: int) -> Dict:
+    """perform_analysis latency and throughput against the fake server"""
+    from trust_and_sentiment_analysis import OllamaTrustSentimentAnalyzer
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer = OllamaTrustSentimentAnalyzer(ollama_host=ollama_host)
+        if not (analyzer.setup_ollama_client() and analyzer.setup_model("1")):
+            raise RuntimeError(f"could not reach the fake server at {ollama_host}")
+
+        latencies = []
+        start = time.perf_counter()
+        for message in sample_inputs(inputs):
+            analyzer.add_user_message(message)
+            call_start = time.perf_counter()
+            analyzer.perform_analysis(message)
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+
+    return {
+        **latency_summary(latencies, elapsed),
+        "parse_failures": sum(1 for analysis in analyzer.analysis_history if "error" in analysis),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def bench_save(workdir: str, size: int, snapshot_format: str) -> Dict:
+    """Time one full save of a synthetic graph with size triplets"""
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+    from kg_snapshot import fill_synthetic_graph
+
+    kg_file = os.path.join(workdir, f"graph_{size}.{'ukg' if snapshot_format == 'binary' else 'json'}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0, snapshot_format=snapshot_format)
+        fill_synthetic_graph(extractor.kg, size)
+        start = time.perf_counter()
+        extractor.save_knowledge_graph()
+        elapsed = time.perf_counter() - start
+    return {"save_seconds": round(elapsed, 4), "file_bytes": os.path.getsize(kg_file), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_load(workdir: str, size: int, snapshot_format: str) -> Dict:
+    """Time loading the graph bench_save wrote, and a first export that touches its triplets"""
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+    kg_file = os.path.join(workdir, f"graph_{size}.{'ukg' if snapshot_format == 'binary' else 'json'}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+        loaded = time.perf_counter()
+        extractor.export_for_llm_context()
+        exported = time.perf_counter()
+    return {
+        "load_seconds": round(loaded - start, 4),
+        "load_and_export_seconds": round(exported - start, 4),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def bench_triplet_memory(size: int) -> Dict:
+    """Traced memory of size triplets loaded from JSON, as plain dicts and as a TripletTable"""
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+    from kg_snapshot import fill_synthetic_graph
+    from triplet_table import TripletTable
+
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        extractor = UltraKnowledgeExtractor(kg_file=os.path.join(workdir, "graph.json"), response_cache_size=0)
+    fill_synthetic_graph(extractor.kg, size)
+    payload = json.dumps(extractor.kg["triplets"].to_json())
+    del extractor
+
+    def traced_mb(build: Callable) -> float:
+        tracemalloc.start()
+        value = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del value
+        return round(current / 2 ** 20, 1)
+
+    return {
+        "dicts_mb": traced_mb(lambda: json.loads(payload)),
+        "table_mb": traced_mb(lambda: TripletTable(json.loads(payload)))
+    }
+
+
+def run_isolated(func: Callable, *args) -> Dict:
+    """Run one benchmark in a fresh interpreter, so its peak RSS is its own"""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def run(args) -> Dict:
+    results = {
+        "config": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "inputs": args.inputs,
+            "sizes": args.sizes,
+            "memory_sizes": args.memory_sizes,
+            "snapshot_format": args.snapshot_format,
+            "fast": args.fast,
+            "route": args.route,
+            "save_interval": args.save_interval,
+            "max_unsaved": args.max_unsaved
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        }
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.inputs:
+            with FakeOllamaServer(latency=args.latency, jitter=args.jitter) as server:
+                results["extract_and_store"] = run_isolated(
+                    bench_extract, server.url, workdir, args.inputs, args.model, args.fast, args.snapshot_format,
+                    args.route, args.save_interval, args.max_unsaved)
+                results["perform_analysis"] = run_isolated(bench_analysis, server.url, args.inputs)
+
+        results["graph_size"] = {}
+        for size in args.sizes:
+            row = run_isolated(bench_save, workdir, size, args.snapshot_format)
+            load = run_isolated(bench_load, workdir, size, args.snapshot_format)
+            results["graph_size"][str(size)] = {
+                "save_seconds": row["save_seconds"],
+                "file_bytes": row["file_bytes"],
+                "save_peak_rss_mb": row["peak_rss_mb"],
+                "load_seconds": load["load_seconds"],
+                "load_and_export_seconds": load["load_and_export_seconds"],
+                "load_peak_rss_mb": load["peak_rss_mb"]
+            }
+
+    results["triplet_memory"] = {str(size): run_isolated(bench_triplet_memory, size) for size in args.memory_sizes}
+    return results
+
+
+def lower_is_better(metric: str) -> Optional[bool]:
+    """True for times and memory, False for throughput, None for anything not compared"""
+    if metric.endswith("per_second"):
+        return False
+    if metric.endswith(("_seconds", "_ms", "_mb")):
+        return True
+    return None
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, path: str = "") -> List[str]:
+    """Metrics in current that are worse than baseline by more than tolerance (a fraction)"""
+    regressions = []
+    for key, value in current.items():
+        if key in ("config", "environment") or key not in baseline:
+            continue
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            regressions.extend(compare(value, baseline[key], tolerance, name))
+            continue
+        direction = lower_is_better(key)
+        old = baseline[key]
+        if direction is None or not isinstance(value, (int, float)) or not old:
+            continue
+        change = (value - old) / old if direction else (old - value) / old
+        if change > tolerance:
+            regressions.append(f"{name}: {old} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local fake Ollama server")
+    parser.add_argument("--inputs", type=int, default=200, help="calls per throughput benchmark (0 to skip)")
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated seconds per model call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency spread, as a fraction")
+    parser.add_argument("--model", default="1", help="available_models key for extraction")
+    parser.add_argument("--fast", action="store_true", help="use FAST mode extraction")
+    parser.add_argument("--route", action="store_true", help="pick the extraction model per input")
+    parser.add_argument("--save-interval", type=float, help="save in the background at most this many seconds late")
+    parser.add_argument("--max-unsaved", type=int, help="save in the background at most this many inputs late")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000, 1000000],
+                        help="graph sizes, in triplets, for save/load timing")
+    parser.add_argument("--memory-sizes", type=int, nargs="*", default=[100000],
+                        help="triplet counts for the dicts vs TripletTable memory comparison")
+    parser.add_argument("--snapshot-format", choices=["json", "binary"], default="json")
+    parser.add_argument("--output", help="write results here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    args = parser.parse_args()
+
+    results = run(args)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n".join(f"❌ {line}" for line in regressions), file=sys.stderr)
+            raise SystemExit(1)
+        print("✅ No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
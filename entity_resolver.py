@@ -0,0 +1,200 @@
+import heapq
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set
+
+SELF_CANONICAL = "User"
+SELF_REFERENCES = {"i", "me", "myself", "user", "the user"}
+
+# Leading possessives that don't change who is meant ("my mother" is "mother");
+# "the" and "a" stay, since they can be part of a name ("The Hague")
+DETERMINERS = re.compile(r"^(?:my|our)\s+", re.IGNORECASE)
+EDGE_PUNCTUATION = " \t\n'\"`.,;:!?()[]{}"
+
+# Words that name the same relation; the first of each group is its key
+SYNONYM_GROUPS = [
+    ("mom", "mother", "mum", "mommy", "mama"),
+    ("dad", "father", "daddy", "papa"),
+    ("grandma", "grandmother", "granny", "nana"),
+    ("grandpa", "grandfather", "granddad"),
+    ("husband", "hubby"),
+    ("wife", "wifey"),
+    ("boyfriend", "bf"),
+    ("girlfriend", "gf"),
+]
+SYNONYMS = {word: group[0] for group in SYNONYM_GROUPS for word in group}
+
+
+def normalize_entity(name: str) -> str:
+    """Alias-table key: casefolded, whitespace-collapsed, without edge punctuation or determiners"""
+    text = " ".join(str(name).split()).strip(EDGE_PUNCTUATION)
+    text = DETERMINERS.sub("", text).strip(EDGE_PUNCTUATION)
+    if text.endswith("'s"):
+        text = text[:-2]
+    return text.casefold()
+
+
+def display_name(name: str) -> str:
+    """The mention as written, minus determiners and edge punctuation"""
+    text = " ".join(str(name).split()).strip(EDGE_PUNCTUATION)
+    return DETERMINERS.sub("", text).strip(EDGE_PUNCTUATION) or text
+
+
+FUZZY_CANDIDATES = 5  # trigram-ranked names checked with the exact similarity ratio
+MAX_TRIGRAM_POSTING = 256  # trigrams shared by more names than this don't help rank
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityResolver:
+    """Maps entity mentions to one canonical name per real-world entity
+
+    Lookup order: self references, the alias table (normalized mention ->
+    canonical name, persisted with the graph), relation synonyms, then a
+    trigram index over canonical names for near-miss spellings. The trigram
+    index narrows a miss down to a few candidates before any string
+    comparison, so resolution stays well under a millisecond.
+
+    A near-miss is only merged on its own when the mention's entity type
+    matches the candidate's and no entity is already known by exactly that
+    name; any other near-miss is appended to proposals for review.
+    """
+
+    def __init__(self, aliases: Dict[str, str], entity_types: Optional[Dict[str, Set[str]]] = None,
+                 proposals: Optional[List[Dict]] = None, fuzzy_threshold: float = 0.85,
+                 fuzzy_min_length: int = 5):
+        self.aliases = aliases
+        # normalized entity name -> entity types it has been seen as
+        self.entity_types: Dict[str, Set[str]] = defaultdict(set)
+        for name, types in (entity_types or {}).items():
+            self.entity_types[normalize_entity(name)].update(types)
+        self.proposals = proposals if proposals is not None else []
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_min_length = fuzzy_min_length
+        # trigram -> canonical keys containing it
+        self.trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self.trigram_counts: Dict[str, int] = {}
+        for canonical in set(aliases.values()):
+            self.index_canonical(normalize_entity(canonical))
+
+    def index_canonical(self, key: str):
+        if key in self.trigram_counts or len(key) < self.fuzzy_min_length:
+            return
+        grams = trigrams(key)
+        self.trigram_counts[key] = len(grams)
+        for gram in grams:
+            self.trigram_index[gram].add(key)
+
+    def unindex_canonical(self, key: str):
+        if self.trigram_counts.pop(key, None) is None:
+            return
+        for gram in trigrams(key):
+            self.trigram_index[gram].discard(key)
+
+    def fuzzy_match(self, key: str) -> Optional[tuple]:
+        """Closest canonical key and its similarity ratio, if above the threshold"""
+        if len(key) < self.fuzzy_min_length:
+            return None
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            posting = self.trigram_index.get(gram, ())
+            if len(posting) <= MAX_TRIGRAM_POSTING:
+                for candidate in posting:
+                    shared[candidate] += 1
+        # Typos break up to three trigrams each, so overlap only shortlists
+        shortlist = heapq.nlargest(FUZZY_CANDIDATES, shared, key=shared.get)
+        best, best_score = None, self.fuzzy_threshold
+        for candidate in shortlist:
+            matcher = SequenceMatcher(None, key, candidate)
+            # Cheap upper bounds first; the full ratio is the expensive part
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            if score >= best_score:
+                best, best_score = candidate, score
+        return (best, round(best_score, 3)) if best is not None else None
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Canonical name for a mention that is already known, without learning anything"""
+        key = normalize_entity(name)
+        if key in SELF_REFERENCES:
+            return SELF_CANONICAL
+        if key in self.aliases:
+            return self.aliases[key]
+        return self.aliases.get(SYNONYMS.get(key, key))
+
+    def resolve(self, name: str, entity_type: Optional[str] = None, fuzzy: bool = True) -> str:
+        """Canonical name for a mention, registering it as a new entity if it matches none"""
+        known = self.lookup(name)
+        if known is not None:
+            self.add_type(known, entity_type)
+            return known
+
+        key = normalize_entity(name)
+        if not key:
+            return name
+        match = self.fuzzy_match(key) if fuzzy else None
+        if match is not None:
+            candidate, score = match
+            if entity_type is not None and entity_type in self.entity_types.get(candidate, ()) \
+                    and key not in self.entity_types:
+                self.aliases[key] = self.aliases[candidate]
+                return self.aliases[key]
+            self.propose(display_name(name), self.aliases[candidate], score)
+
+        canonical = display_name(name)
+        self.aliases[key] = canonical
+        if key in SYNONYMS:
+            self.aliases.setdefault(SYNONYMS[key], canonical)
+        self.aliases.setdefault(normalize_entity(canonical), canonical)
+        self.index_canonical(normalize_entity(canonical))
+        self.add_type(canonical, entity_type)
+        return canonical
+
+    def add_type(self, canonical: str, entity_type: Optional[str]):
+        if entity_type is not None:
+            self.entity_types[normalize_entity(canonical)].add(entity_type)
+
+    def propose(self, mention: str, candidate: str, score: float):
+        """Record a near-miss that was not merged automatically, once per pair"""
+        for proposal in self.proposals:
+            if proposal["mention"] == mention and proposal["candidate"] == candidate:
+                return
+        self.proposals.append({"mention": mention, "candidate": candidate, "score": score})
+
+    def merge(self, names: Iterable[str], into: str) -> Dict[str, str]:
+        """Point every alias of names at into's entity; returns old canonical -> new canonical"""
+        target = self.resolve(into, fuzzy=False)
+        renamed = {}
+        for name in names:
+            old = self.lookup(name)
+            key = normalize_entity(name)
+            self.aliases[key] = target
+            if old is not None and old != target:
+                renamed[old] = target
+                for alias, canonical in self.aliases.items():
+                    if canonical == old:
+                        self.aliases[alias] = target
+                self.unindex_canonical(normalize_entity(old))
+                self.entity_types[normalize_entity(target)] |= self.entity_types.pop(normalize_entity(old), set())
+        # Proposals this merge settled are no longer open
+        self.proposals[:] = [proposal for proposal in self.proposals
+                             if self.lookup(proposal["mention"]) != self.lookup(proposal["candidate"])]
+        return renamed
+
+    def split(self, alias: str, new_name: Optional[str] = None) -> str:
+        """Detach one alias from its entity so it becomes (or joins) new_name"""
+        key = normalize_entity(alias)
+        canonical = display_name(new_name or alias)
+        self.aliases[key] = canonical
+        self.aliases[normalize_entity(canonical)] = canonical
+        self.index_canonical(normalize_entity(canonical))
+        return canonical
+
+    def aliases_of(self, canonical: str) -> List[str]:
+        return [alias for alias, target in self.aliases.items() if target == canonical]
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from prompt_budget import count_message_tokens, count_tokens
+
+# The quoted message extraction prompts wrap the input in
+QUOTED_INPUT = re.compile(r'The user says: "(.*)"', re.DOTALL)
+# benchmark.sample_inputs tags every input with its index
+NOTE_TAG = re.compile(r"\(note (\d+)\)")
+WORD = re.compile(r"[A-Za-z][\w'-]+")
+STREAM_CHUNK_CHARS = 16
+
+
+def extraction_response(messages: List[Dict]) -> str:
+    """Extraction JSON built from the input, so graphs grow the way real runs make them grow
+
+    The first triplet is new for every input: its object carries the
+    input's note index (or a hash of its text when it has none). The others
+    repeat whenever inputs share their last word or the people they name,
+    so some facts merge as they do with a real model.
+    """
+    text = messages[-1]["content"]
+    match = QUOTED_INPUT.search(text)
+    quoted = match.group(1) if match else text
+    note = NOTE_TAG.search(quoted)
+    key = note.group(1) if note else hashlib.md5(quoted.encode()).hexdigest()[:8]
+    words = WORD.findall(NOTE_TAG.sub("", quoted)) or ["something"]
+    capitalized = [word for word in words[1:] if word[0].isupper() and word != "I"]
+    triplets = [
+        {"subject": "User", "predicate": f"mentions_{words[0].lower()}",
+         "object": f"{' '.join(words[1:4]) or words[0]} (note {key})", "category": "experiences", "confidence": 0.9},
+        {"subject": "User", "predicate": "talks_about", "object": words[-1].lower(),
+         "category": "interests", "confidence": 0.8}
+    ]
+    triplets += [{"subject": "User", "predicate": "knows", "object": name, "category": "relationships",
+                  "confidence": 0.85} for name in capitalized[:2]]
+    return json.dumps({
+        "triplets": triplets,
+        "named_entities": {"people": capitalized[:2], "places": [], "organizations": []},
+        "topics_mentioned": [words[-1].lower()]
+    })
+
+
+def analysis_response(messages: List[Dict]) -> str:
+    return json.dumps({
+        "trust_trend": "INCREASING",
+        "trust_confidence": 0.8,
+        "sentiment_trend": "IMPROVING",
+        "sentiment_confidence": 0.75,
+        "key_indicators": ["openness", "engagement"],
+        "analysis_summary": "The user is sharing more openly.",
+        "timestamp": "2025-01-01T00:00:00"
+    })
+
+
+class FakeOllamaServer:
+    """Local stand-in for Ollama's OpenAI-compatible API, for offline benchmarks
+
+    Serves /v1/chat/completions (plain and streamed), /v1/models and
+    Ollama's native /api/generate preload on a background thread. Every
+    completion waits latency seconds (+/- jitter as a fraction) and answers
+    with canned JSON: an analysis object for the trust/sentiment prompt, an
+    extraction object derived from the input otherwise. responses, if
+    given, are returned in rotation instead. The first request naming a
+    model that is not loaded yet also waits load_latency, like a cold load.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 responses: Optional[List[str]] = None, models: Optional[List[str]] = None, seed: int = 0,
+                 load_latency: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.responses = itertools.cycle(responses) if responses else None
+        self.models = models or ["llama3.2:1b", "llama3.2:3b", "llama3.1:8b", "qwen2.5:3b"]
+        self.random = random.Random(seed)
+        self.load_latency = load_latency
+        self.loaded = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            spread = self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency * (1 + spread))
+
+    def load(self, model: str) -> float:
+        """Seconds to wait for model to be loaded, marking it loaded"""
+        with self._lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        return self.load_latency
+
+    def respond(self, messages: List[Dict]) -> str:
+        if self.responses is not None:
+            with self._lock:
+                return next(self.responses)
+        if "therapeutic" in " ".join(message["content"] for message in messages):
+            return analysis_response(messages)
+        return extraction_response(messages)
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, payload: Dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    self.send_json({"object": "list", "data": [
+                        {"id": model, "object": "model", "created": 0, "owned_by": "library"} for model in server.models
+                    ]})
+                else:
+                    self.send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/") == "/api/generate" and not request.get("prompt"):
+                    # Preload: load the model and answer without generating
+                    time.sleep(server.load(request.get("model", "")))
+                    self.send_json({"model": request.get("model", ""), "response": "", "done": True,
+                                    "done_reason": "load"})
+                    return
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self.send_json({"error": "not found"}, 404)
+                    return
+
+                time.sleep(server.load(request.get("model", "")) + server.delay())
+                messages = request.get("messages", [])
+                content = server.respond(messages)
+                usage = {"prompt_tokens": count_message_tokens(messages), "completion_tokens": count_tokens(content)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                base = {"id": f"chatcmpl-{server.requests}", "created": int(time.time()),
+                        "model": request.get("model", "")}
+
+                if not request.get("stream"):
+                    self.send_json({**base, "object": "chat.completion", "usage": usage, "choices": [
+                        {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                    ]})
+                    return
+
+                # Server-sent events, one small delta per chunk; the connection
+                # closes after [DONE] so no chunked transfer encoding is needed
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                        chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                            {"index": 0, "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]}, "finish_reason": None}
+                        ]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client hung up once it had the whole object
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible Ollama endpoint")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency spread, as a fraction")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="seconds to load a model on first use")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(port=args.port, latency=args.latency, jitter=args.jitter, load_latency=args.load_latency)
+    print(f"🧪 Fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import re
+from collections import defaultdict, deque
+from typing import Dict, Hashable, List, Optional, Tuple
+
+MENTION_WORD = re.compile(r"[\w'&-]+")
+MAX_MENTION_WORDS = 6  # longest entity name looked for in free text
+
+
+def entity_key(name: str) -> str:
+    """Case- and whitespace-insensitive lookup key for an entity name"""
+    return " ".join(str(name).casefold().split())
+
+
+class AdjacencyIndex:
+    """Subject -> edges and object -> edges over the triplet set
+
+    Edges are triplet IDs; every query walks only the adjacency lists it
+    needs, so its cost follows the size of the answer, not of the graph.
+    Traversals only go through neighbors(), so a subclass answering
+    neighbors, match and known_keys from elsewhere (a database) gets
+    k_hop and path for free.
+    """
+
+    def __init__(self):
+        self.outgoing: Dict[str, List[Hashable]] = defaultdict(list)
+        self.incoming: Dict[str, List[Hashable]] = defaultdict(list)
+        self.by_predicate: Dict[str, List[Hashable]] = defaultdict(list)
+        # edge -> (subject key, predicate, object key)
+        self.edges: Dict[Hashable, Tuple[str, str, str]] = {}
+        # entity key -> name as first seen, for display
+        self.names: Dict[str, str] = {}
+        self.longest_name = 1
+
+    def add(self, edge: Hashable, subject: str, predicate: str, obj: str):
+        if edge in self.edges:
+            return
+        subject_key, object_key = entity_key(subject), entity_key(obj)
+        self.edges[edge] = (subject_key, predicate, object_key)
+        self.outgoing[subject_key].append(edge)
+        self.incoming[object_key].append(edge)
+        self.by_predicate[predicate].append(edge)
+        for key, name in ((subject_key, subject), (object_key, obj)):
+            if key not in self.names:
+                self.names[key] = str(name)
+                self.longest_name = max(self.longest_name, len(key.split()))
+
+    def __contains__(self, entity: str) -> bool:
+        return bool(self.known_keys([entity_key(entity)]))
+
+    def known_keys(self, keys: List[str]) -> set:
+        """The entity keys among keys that appear in some edge"""
+        return {key for key in keys if key in self.outgoing or key in self.incoming}
+
+    def display_name(self, key: str) -> str:
+        """An entity's name as first seen"""
+        return self.names.get(key, key)
+
+    def neighbors(self, entity: str, direction: str = "both") -> List[Tuple[Hashable, str]]:
+        """(edge, neighbor key) pairs; direction is "out", "in" or "both\""""
+        key = entity_key(entity)
+        pairs = []
+        if direction in ("out", "both"):
+            pairs.extend((edge, self.edges[edge][2]) for edge in self.outgoing.get(key, ()))
+        if direction in ("in", "both"):
+            pairs.extend((edge, self.edges[edge][0]) for edge in self.incoming.get(key, ()))
+        return pairs
+
+    def k_hop(self, entity: str, k: int, limit: Optional[int] = None) -> Dict[str, int]:
+        """Entity key -> hop distance for everything within k hops (edges in either direction)"""
+        start = entity_key(entity)
+        distances = {start: 0}
+        frontier = deque([start])
+        while frontier:
+            key = frontier.popleft()
+            if distances[key] >= k:
+                continue
+            for _, neighbor in self.neighbors(key):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[key] + 1
+                    if limit is not None and len(distances) > limit:
+                        return distances
+                    frontier.append(neighbor)
+        return distances
+
+    def path(self, source: str, target: str, max_depth: int = 4) -> Optional[List[Hashable]]:
+        """Edges of a shortest undirected path from source to target, None if there is none within max_depth"""
+        start, goal = entity_key(source), entity_key(target)
+        if start == goal:
+            return []
+        parents = {start: None}
+        frontier = [start]
+        for _ in range(max_depth):
+            next_frontier = []
+            for key in frontier:
+                for edge, neighbor in self.neighbors(key):
+                    if neighbor in parents:
+                        continue
+                    parents[neighbor] = (key, edge)
+                    if neighbor == goal:
+                        edges = []
+                        while parents[neighbor] is not None:
+                            neighbor, edge = parents[neighbor]
+                            edges.append(edge)
+                        return edges[::-1]
+                    next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return None
+
+    def match(self, subject: Optional[str] = None, predicate: Optional[str] = None,
+              obj: Optional[str] = None) -> List[Hashable]:
+        """Edges matching a (subject, predicate, object) pattern; None is a wildcard"""
+        subject_key = entity_key(subject) if subject is not None else None
+        object_key = entity_key(obj) if obj is not None else None
+
+        candidates = []
+        if subject_key is not None:
+            candidates.append(self.outgoing.get(subject_key, []))
+        if object_key is not None:
+            candidates.append(self.incoming.get(object_key, []))
+        if predicate is not None:
+            candidates.append(self.by_predicate.get(predicate, []))
+        if not candidates:
+            return list(self.edges)
+
+        pattern = (subject_key, predicate, object_key)
+        return [edge for edge in min(candidates, key=len)
+                if all(want is None or want == have for want, have in zip(pattern, self.edges[edge]))]
+
+    def mentioned_entities(self, text: str) -> List[str]:
+        """Keys of known entities named in text, longest phrases first"""
+        words = [word.casefold() for word in MENTION_WORD.findall(text)]
+        phrases = [" ".join(words[i:i + size])
+                   for size in range(min(self.longest_name, MAX_MENTION_WORDS, len(words)), 0, -1)
+                   for i in range(len(words) - size + 1)]
+        known = self.known_keys(phrases)
+        return list(dict.fromkeys(key for key in phrases if key in known))
@@ -0,0 +1,182 @@
+import atexit
+import functools
+import signal
+import threading
+import time
+import weakref
+from typing import Callable, Optional
+
+# Seconds to wait before retrying a save that failed
+RETRY_DELAY = 1.0
+
+# Writers still running, closed (and so flushed) at exit
+_open_writers = weakref.WeakSet()
+_signals_installed = False
+_signals_lock = threading.Lock()
+
+
+def close_open_writers():
+    for writer in list(_open_writers):
+        writer.close()
+
+
+def install_signal_handler():
+    """Turn SIGTERM into a normal exit, so the atexit hook flushes open writers
+
+    Opt-in for applications that own the process (the CLI calls it from
+    main() when a background writer is on); a library or server host
+    keeps its own SIGTERM handling. The handler only unwinds the main
+    thread, which releases any graph lock it holds mid-update; flushing
+    from inside the handler could deadlock on that lock. A handler
+    installed earlier is still called instead. Only the main thread may
+    install handlers.
+    """
+    global _signals_installed
+    with _signals_lock:
+        if _signals_installed or threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle(signum, frame):
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, handle)
+        _signals_installed = True
+
+
+atexit.register(close_open_writers)
+
+
+class GroupCommitWriter:
+    """Background thread that folds many saves into one write
+
+    mark_dirty() records that more inputs are waiting to be saved and
+    returns at once. The thread calls save(inputs) for all of them together
+    once max_pending inputs are waiting or interval seconds after the first
+    of them, whichever comes first. A crash therefore loses at most
+    max_pending inputs - mark_dirty() waits for the disk only when that many
+    are already unsaved - or interval seconds plus one write's worth of
+    work. At least one bound must be given. Writers are flushed on close()
+    and at interpreter exit (on SIGTERM too once install_signal_handler()
+    has been called); a failed save is retried after RETRY_DELAY seconds.
+    """
+
+    def __init__(self, save: Callable[[int], None], interval: Optional[float] = None,
+                 max_pending: Optional[int] = None, name: str = "kg-writer"):
+        if interval is None and max_pending is None:
+            raise ValueError("GroupCommitWriter needs an interval, a max_pending count, or both")
+        self.save = save
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = 0
+        self.writing = 0  # inputs in the save under way
+        self.dirty_since = None
+        self.retry_after = 0.0
+        self.closed = False
+        self.stats = {"flushes": 0, "inputs_saved": 0, "failures": 0}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+        _open_writers.add(self)
+
+    def mark_dirty(self, inputs: int = 1):
+        with self._condition:
+            while self.full(inputs) and not self.closed:
+                self._condition.wait()
+            if self.closed:
+                closed = True
+            else:
+                closed = False
+                self.pending += inputs
+                if self.dirty_since is None:
+                    self.dirty_since = time.monotonic()
+                self._condition.notify_all()
+        if closed:
+            self.write(inputs)  # nothing left to hand it to
+
+    def full(self, inputs: int) -> bool:
+        """True if queuing inputs more would leave more than max_pending unsaved"""
+        unsaved = self.pending + self.writing
+        return self.max_pending is not None and unsaved > 0 and unsaved + inputs > self.max_pending
+
+    def due(self) -> bool:
+        if self.pending == 0 or time.monotonic() < self.retry_after:
+            return False
+        if self.max_pending is not None and self.pending >= self.max_pending:
+            return True
+        return self.interval is not None and time.monotonic() - self.dirty_since >= self.interval
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self.closed and not self.due():
+                    self._condition.wait(self.wait_time())
+                if self.closed:
+                    return
+            self.write_pending()
+
+    def write_pending(self):
+        with self._condition:
+            inputs, self.pending, self.dirty_since = self.pending, 0, None
+            self.writing += inputs
+        if not inputs:
+            return
+        self.write(inputs)
+        with self._condition:
+            self.writing -= inputs
+            self._condition.notify_all()
+
+    def wait_time(self) -> Optional[float]:
+        """Seconds until pending inputs come due by time; None when only a new mark can make them due"""
+        if not self.pending:
+            return None
+        now = time.monotonic()
+        if now < self.retry_after:
+            return self.retry_after - now
+        if self.interval is not None:
+            return max(0.0, self.dirty_since + self.interval - now)
+        return None
+
+    def write(self, inputs: int):
+        with self._flush_lock:
+            try:
+                self.save(inputs)
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"❌ Background save failed, will retry: {e}")
+                with self._condition:
+                    self.pending += inputs
+                    self.dirty_since = self.dirty_since or time.monotonic()
+                    self.retry_after = time.monotonic() + RETRY_DELAY
+                return
+            self.stats["flushes"] += 1
+            self.stats["inputs_saved"] += inputs
+
+    def flush(self):
+        """Save whatever is pending now, on the calling thread"""
+        self.write_pending()
+
+    def close(self):
+        """Stop the thread and save whatever is still pending"""
+        with self._condition:
+            if self.closed:
+                return
+            self.closed = True
+            self._condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        _open_writers.discard(self)
+
+
+def synchronized(method):
+    """Run a method holding self.write_lock, so a background save never encodes it half done"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,165 @@
+import bisect
+import contextlib
+import functools
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Upper bounds, in seconds, of the stage latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# hook(kind, name, value) - kind is "timer" (value in seconds) or "counter" (increment)
+MetricsHook = Callable[[str, str, float], None]
+
+
+class Metrics:
+    """Per-stage timers and counters for the extraction and analysis hot paths
+
+    Stages are timed into fixed-bucket histograms and counters accumulate
+    totals; both are exported as Prometheus text or a JSON snapshot. Hooks
+    see every observation as it happens, for forwarding to StatsD, logs
+    or tracing. One instance may be shared by any number of extractors and
+    analyzers; updates are thread-safe.
+    """
+
+    enabled = True
+
+    def __init__(self, namespace: str = "notes_ai", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        # stage -> [bucket counts..., count, sum, max]
+        self.timers: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.hooks: List[MetricsHook] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            row = self.timers.get(stage)
+            if row is None:
+                row = self.timers[stage] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                row[index] += 1
+            n = len(self.buckets)
+            row[n] += 1
+            row[n + 1] += seconds
+            row[n + 2] = max(row[n + 2], seconds)
+        for hook in self.hooks:
+            hook("timer", stage, seconds)
+
+    def inc(self, name: str, value: float = 1):
+        if not value:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_usage(self, usage):
+        """Token counts from an OpenAI-style response.usage, if the server sent one"""
+        if usage is None:
+            return
+        self.inc("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        self.inc("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> Dict:
+        """Current values as plain data: stage timings and counter totals"""
+        n = len(self.buckets)
+        with self._lock:
+            timers = {stage: list(row) for stage, row in self.timers.items()}
+            counters = dict(self.counters)
+        return {
+            "timestamp": time.time(),
+            "stages": {
+                stage: {
+                    "count": row[n],
+                    "total_seconds": round(row[n + 1], 6),
+                    "mean_seconds": round(row[n + 1] / row[n], 6) if row[n] else 0.0,
+                    "max_seconds": round(row[n + 2], 6),
+                    "buckets": {str(bound): count for bound, count in zip(self.buckets, row[:n])}
+                }
+                for stage, row in sorted(timers.items())
+            },
+            "counters": dict(sorted(counters.items()))
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        n = len(self.buckets)
+        with self._lock:
+            timers = {stage: list(row) for stage, row in self.timers.items()}
+            counters = dict(self.counters)
+
+        name = f"{self.namespace}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each pipeline stage.", f"# TYPE {name} histogram"]
+        for stage, row in sorted(timers.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, row[:n]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {row[n]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {row[n + 1]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {row[n]}')
+
+        for counter, value in sorted(counters.items()):
+            metric = f"{self.namespace}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics:
+    """Stand-in used when instrumentation is off: every call is a no-op"""
+
+    enabled = False
+    _null_timer = contextlib.nullcontext()
+
+    def add_hook(self, hook: MetricsHook):
+        pass
+
+    def observe(self, stage: str, seconds: float):
+        pass
+
+    def inc(self, name: str, value: float = 1):
+        pass
+
+    def timer(self, stage: str):
+        return self._null_timer
+
+    def record_usage(self, usage):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def timed(stage: str):
+    """Time a method into self.metrics under stage"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,110 @@
+import copy
+from collections import defaultdict, Counter
+from typing import Any, Callable, Dict, List
+
+from triplet_table import TripletTable
+
+SCHEMA_VERSION = "2.1"
+# Graphs written before meta.version existed are treated as this version
+BASE_VERSION = "2.0"
+
+
+def migrate_categories_2_0(knowledge_categories: Dict, template: Dict) -> Dict:
+    """2.0 facts could carry their value as current_value instead of object"""
+    for facts in knowledge_categories.values():
+        for data in facts.values():
+            if isinstance(data, dict) and "current_value" in data:
+                data.setdefault("object", data.pop("current_value"))
+    return knowledge_categories
+
+
+def migrate_meta_2_0(meta: Dict, template: Dict) -> Dict:
+    for key, value in template["meta"].items():
+        meta.setdefault(key, value)
+    return meta
+
+
+def migrate_metadata_2_0(metadata: Dict, template: Dict) -> Dict:
+    for key, value in template["conversation_metadata"].items():
+        metadata.setdefault(key, copy.deepcopy(value))
+    return metadata
+
+
+def migrate_analytics_2_0(analytics: Dict, template: Dict) -> Dict:
+    for key, value in template["analytics"].items():
+        analytics.setdefault(key, copy.deepcopy(value))
+    for key, value in template["analytics"]["extraction_stats"].items():
+        analytics["extraction_stats"].setdefault(key, copy.deepcopy(value))
+    return analytics
+
+
+# version -> (next version, {section: upgrade(section value, empty template) -> section value})
+MIGRATIONS = {
+    "2.0": ("2.1", {
+        "meta": migrate_meta_2_0,
+        "knowledge_categories": migrate_categories_2_0,
+        "conversation_metadata": migrate_metadata_2_0,
+        "analytics": migrate_analytics_2_0,
+    }),
+}
+
+
+class KnowledgeGraphSchema:
+    """Typed view of the knowledge graph file: version migrations plus in-memory container types
+
+    Everything happens section by section, so a lazily loaded snapshot only
+    pays for the sections it touches and a JSON load is a single pass.
+    """
+
+    def __init__(self, empty_graph: Callable[[], Dict], triplet_id: Callable[[Dict], str]):
+        self.empty_graph = empty_graph
+        self.triplet_id = triplet_id
+
+    @staticmethod
+    def version_of(meta: Dict) -> str:
+        return meta.get("version", BASE_VERSION)
+
+    @staticmethod
+    def upgrade_steps(version: str) -> List[Dict[str, Callable]]:
+        """Section upgraders to apply, oldest first, to bring version up to date"""
+        steps = []
+        while version != SCHEMA_VERSION:
+            if version not in MIGRATIONS:
+                raise ValueError(f"Unsupported knowledge graph version {version!r}")
+            version, upgraders = MIGRATIONS[version]
+            steps.append(upgraders)
+        return steps
+
+    def rehydrate_section(self, name: str, value: Any, version: str) -> Any:
+        """Migrate one decoded section from version and wrap it in its in-memory types"""
+        steps = self.upgrade_steps(version)
+        if steps:
+            template = self.empty_graph()
+            for upgraders in steps:
+                if name in upgraders:
+                    value = upgraders[name](value, template)
+
+        if name == "triplets":
+            if isinstance(value, dict):
+                return TripletTable.from_columns(value["columns"])
+            return TripletTable(
+                triplet if triplet.get("id") else {**triplet, "id": self.triplet_id(triplet)}
+                for triplet in value
+            )
+        if name == "relationships":
+            return defaultdict(list, value)
+        if name == "conversation_metadata":
+            value["entity_mentions"] = Counter(value.get("entity_mentions", {}))
+            value["relationship_frequency"] = Counter(value.get("relationship_frequency", {}))
+        if name == "meta":
+            value["version"] = SCHEMA_VERSION
+        return value
+
+    def add_missing_sections(self, kg) -> List[str]:
+        """Fill in top-level sections older graphs don't have, returns their names"""
+        missing = []
+        for name, value in self.empty_graph().items():
+            if name not in kg:
+                kg[name] = value
+                missing.append(name)
+        return missing
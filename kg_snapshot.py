@@ -0,0 +1,266 @@
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import time
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # sections are stored as compact JSON instead
+    msgpack = None
+
+# File layout: MAGIC | uint32 header length | JSON header | section blobs.
+# The header maps each top-level section to [offset, length, codec], with
+# offsets relative to the end of the header.
+MAGIC = b"UKGSNAP1"
+HEADER_LENGTH = struct.Struct("<I")
+SNAPSHOT_VERSION = 1
+
+
+def is_snapshot(path: str) -> bool:
+    """True if path holds a binary sectioned snapshot rather than JSON"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def encode_section(value: Any, default: Optional[Callable] = None) -> tuple:
+    if msgpack is not None:
+        return "msgpack", msgpack.packb(value, default=default, use_bin_type=True)
+    return "json", json.dumps(value, separators=(",", ":"), default=default).encode()
+
+
+def decode_section(blob: bytes, codec: str) -> Any:
+    if codec == "msgpack":
+        if msgpack is None:
+            raise ValueError("snapshot section is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(blob, raw=False, strict_map_key=False)
+    return json.loads(blob)
+
+
+class LazyKnowledgeGraph(MutableMapping):
+    """Knowledge graph backed by a memory-mapped snapshot
+
+    Only the header is read on open; each section is decoded (and passed
+    through on_decode) the first time it is touched. Sections that are
+    never touched are copied to the next snapshot as raw bytes.
+    """
+
+    def __init__(self, path: str, on_decode: Optional[Callable[[str, Any], Any]] = None):
+        self.on_decode = on_decode
+        self.sections: Dict[str, Any] = {}
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a knowledge graph snapshot")
+
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        (header_length,) = HEADER_LENGTH.unpack_from(self.map, len(MAGIC))
+        header = json.loads(self.map[header_start:header_start + header_length])
+        self.version = header["version"]
+        self.base = header_start + header_length
+        # Section name -> (offset, length, codec) of sections not decoded yet
+        self.pending: Dict[str, tuple] = {name: tuple(entry) for name, entry in header["sections"].items()}
+
+    def raw_section(self, name: str) -> Optional[tuple]:
+        """(codec, bytes) of a section that hasn't been decoded, else None"""
+        if name not in self.pending:
+            return None
+        offset, length, codec = self.pending[name]
+        return codec, self.map[self.base + offset:self.base + offset + length]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.sections
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.sections:
+            if name not in self.pending:
+                raise KeyError(name)
+            codec, blob = self.raw_section(name)
+            value = decode_section(blob, codec)
+            if self.on_decode is not None:
+                value = self.on_decode(name, value)
+            self.sections[name] = value
+            del self.pending[name]
+        return self.sections[name]
+
+    def __setitem__(self, name: str, value: Any):
+        self.pending.pop(name, None)
+        self.sections[name] = value
+
+    def __delitem__(self, name: str):
+        if name in self.pending:
+            del self.pending[name]
+        else:
+            del self.sections[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.sections or name in self.pending
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self.sections)
+        yield from [name for name in list(self.pending) if name not in self.sections]
+
+    def __len__(self) -> int:
+        return len(self.sections) + len(self.pending)
+
+    def close(self):
+        """Decode everything still pending and release the mapping"""
+        for name in list(self.pending):
+            self[name]
+        self.map.close()
+
+
+def write_snapshot(path: str, kg: MutableMapping, default: Optional[Callable] = None):
+    """Atomically write kg as a sectioned snapshot (temp file + fsync + rename)"""
+    write_atomic(path, encode_snapshot(kg, default))
+
+
+def encode_snapshot(kg: MutableMapping, default: Optional[Callable] = None) -> List[bytes]:
+    """A snapshot file's contents, as the byte strings to write in order"""
+    blobs = []
+    sections = {}
+    offset = 0
+    for name in kg:
+        raw = kg.raw_section(name) if isinstance(kg, LazyKnowledgeGraph) else None
+        codec, blob = raw if raw is not None else encode_section(kg[name], default)
+        sections[name] = [offset, len(blob), codec]
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({"version": SNAPSHOT_VERSION, "sections": sections}, separators=(",", ":")).encode()
+    return [MAGIC, HEADER_LENGTH.pack(len(header)), header] + blobs
+
+
+def write_atomic(path: str, parts: List[bytes]):
+    """Write parts to path through a temp file, fsync and rename - a crash leaves the old file intact"""
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'wb') as f:
+        for part in parts:
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def convert(source_file: str, target_file: str, snapshot_format: str):
+    """Load a graph (either format, journal replayed) and rewrite it in snapshot_format"""
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+    extractor = UltraKnowledgeExtractor(kg_file=source_file, response_cache_size=0)
+    extractor.kg_file = target_file
+    extractor.snapshot_format = snapshot_format
+    extractor.write_snapshot()
+
+
+def json_to_snapshot(json_file: str, snapshot_file: str):
+    """Convert a JSON knowledge graph file to the binary snapshot format"""
+    convert(json_file, snapshot_file, "binary")
+
+
+def snapshot_to_json(snapshot_file: str, json_file: str):
+    """Convert a binary snapshot back to the pretty-printed JSON format"""
+    convert(snapshot_file, json_file, "json")
+
+
+def fill_synthetic_graph(kg: Dict, n_triplets: int, seed: int = 0):
+    """Populate an empty graph with n_triplets shaped like real extractions, for benchmarks"""
+    rng = random.Random(seed)
+    predicates = [f"relation_{i}" for i in range(200)]
+    categories = list(kg["knowledge_categories"])
+    for i in range(n_triplets):
+        subject = "User" if i % 3 == 0 else f"Entity {rng.randrange(n_triplets // 10 + 1)}"
+        triplet = {
+            "subject": subject,
+            "predicate": rng.choice(predicates),
+            "object": f"Entity {rng.randrange(n_triplets // 5 + 1)}",
+            "category": rng.choice(categories),
+            "confidence": round(rng.uniform(0.5, 1.0), 2),
+            "id": f"{i:012x}",
+            "extracted_at": f"2025-01-{1 + i % 28:02d} 12:{i % 60:02d}:00.{i % 1000000:06d}",
+            "source_input": f"Sample message {i % 5000} mentioning {subject}",
+            "seen_count": 1
+        }
+        kg["triplets"].append(triplet)
+        kg["relationships"][triplet["predicate"]].append({
+            "subject": triplet["subject"], "object": triplet["object"],
+            "confidence": triplet["confidence"], "timestamp": triplet["extracted_at"]
+        })
+    for i in range(n_triplets // 10):
+        kg["named_entities"]["people"][f"Entity {i}"] = {
+            "first_mentioned": "2025-01-01 12:00:00", "mention_count": 1 + i % 7, "contexts": []
+        }
+        kg["conversation_metadata"]["entity_mentions"][f"Entity {i}"] = 1 + i % 7
+
+
+def benchmark_cold_start(sizes, workdir: str = ".", repeat: int = 3) -> Dict:
+    """Time extractor construction + first export_for_llm_context, JSON file vs snapshot"""
+    from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+    results = {}
+    for size in sizes:
+        json_file = os.path.join(workdir, f"bench_{size}.json")
+        snapshot_file = os.path.join(workdir, f"bench_{size}.ukg")
+        for path in (json_file, snapshot_file):
+            if os.path.exists(path):
+                os.remove(path)
+        writer = UltraKnowledgeExtractor(kg_file=json_file, response_cache_size=0)
+        fill_synthetic_graph(writer.kg, size)
+        writer.write_snapshot()
+        json_to_snapshot(json_file, snapshot_file)
+
+        row = {"json_bytes": os.path.getsize(json_file), "snapshot_bytes": os.path.getsize(snapshot_file)}
+        for label, path in (("json", json_file), ("snapshot", snapshot_file)):
+            load_times, export_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                extractor = UltraKnowledgeExtractor(kg_file=path, response_cache_size=0)
+                loaded = time.perf_counter()
+                extractor.export_for_llm_context()
+                load_times.append(loaded - start)
+                export_times.append(time.perf_counter() - loaded)
+            row[f"{label}_load_seconds"] = round(min(load_times), 6)
+            row[f"{label}_load_and_export_seconds"] = round(min(l + e for l, e in zip(load_times, export_times)), 6)
+        results[size] = row
+        for path in (json_file, snapshot_file):
+            os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge graph snapshot tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    to_binary = commands.add_parser("to-binary", help="convert a JSON graph to a binary snapshot")
+    to_binary.add_argument("json_file")
+    to_binary.add_argument("snapshot_file")
+
+    to_json = commands.add_parser("to-json", help="convert a binary snapshot to a JSON graph")
+    to_json.add_argument("snapshot_file")
+    to_json.add_argument("json_file")
+
+    bench = commands.add_parser("bench", help="cold-start time vs graph size, JSON vs snapshot")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--workdir", default=".")
+
+    args = parser.parse_args()
+    if args.command == "to-binary":
+        json_to_snapshot(args.json_file, args.snapshot_file)
+        print(f"✅ Wrote {args.snapshot_file}")
+    elif args.command == "to-json":
+        snapshot_to_json(args.snapshot_file, args.json_file)
+        print(f"✅ Wrote {args.json_file}")
+    else:
+        print(json.dumps(benchmark_cold_start(args.sizes, args.workdir, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
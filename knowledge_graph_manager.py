@@ -0,0 +1,245 @@
+import contextlib
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+from instrumentation import Metrics
+from model_router import ModelRouter
+import kg_snapshot
+
+# Rough in-memory bytes per on-disk byte of a loaded graph, by file format
+# (compact binary sections inflate more than pretty-printed JSON)
+MEMORY_PER_FILE_BYTE = {"json": 3.0, "binary": 5.0}
+MIN_GRAPH_BYTES = 64 * 1024
+
+
+class KnowledgeGraphManager:
+    """Hosts many users' knowledge graphs behind one model connection
+
+    Each user ID maps to its own graph file under base_dir, sharded by a hash
+    of the ID. Loaded graphs sit in an LRU that is bounded both by count and
+    by an estimate of their memory, so resident memory follows configuration
+    rather than the number of tenants. Cold graphs are flushed and evicted.
+    Tenants share the response cache (and response_cache_file), but each
+    under its own key namespace, so one user's inputs never answer, or
+    reveal themselves to, another's.
+    """
+
+    def __init__(self, base_dir: str = "knowledge_graphs", ollama_host: str = "http://localhost:11434",
+                 max_loaded_graphs: int = 64, max_memory_mb: Optional[float] = 512,
+                 snapshot_format: str = "json", shard_depth: int = 2,
+                 response_cache_size: int = 1024, response_cache_file: Optional[str] = None,
+                 extractor_options: Optional[Dict] = None, metrics: Optional[Metrics] = None,
+                 router: Optional[ModelRouter] = None):
+        self.base_dir = base_dir
+        self.ollama_host = ollama_host
+        self.max_loaded_graphs = max_loaded_graphs
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.snapshot_format = snapshot_format
+        self.shard_depth = shard_depth
+        self.extractor_options = extractor_options or {}
+        os.makedirs(base_dir, exist_ok=True)
+
+        # Holds what every tenant shares - model client, response cache, rule
+        # tier, model router - and is never saved itself
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.prototype = UltraKnowledgeExtractor(
+                kg_file=os.path.join(base_dir, "prototype.json"), ollama_host=ollama_host,
+                response_cache_size=response_cache_size, response_cache_file=response_cache_file,
+                metrics=metrics, router=router
+            )
+
+        # user_id -> extractor, least recently used first
+        self.graphs: "OrderedDict[str, UltraKnowledgeExtractor]" = OrderedDict()
+        self.memory_estimates: Dict[str, int] = {}
+        # user_id -> [lock, threads holding or waiting for it]; dropped once unused
+        self.tenant_locks: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0}
+
+    def setup_llm(self, model_choice: str) -> bool:
+        """Connect to the model once; every tenant reuses this client"""
+        if not self.prototype.setup_llm(model_choice):
+            return False
+        with self._lock:
+            for user_id, extractor in self.graphs.items():
+                self.share_resources(extractor, user_id)
+        return True
+
+    def graph_file(self, user_id: str) -> str:
+        """Sharded path for a user's graph: base_dir/ab/cd/<hash>.<ext>"""
+        digest = hashlib.sha256(str(user_id).encode()).hexdigest()
+        shards = [digest[2 * i:2 * i + 2] for i in range(self.shard_depth)]
+        extension = "ukg" if self.snapshot_format == "binary" else "json"
+        return os.path.join(self.base_dir, *shards, f"{digest}.{extension}")
+
+    def share_resources(self, extractor: UltraKnowledgeExtractor, user_id: Optional[str] = None):
+        extractor.connection = self.prototype.connection
+        extractor.ollama_client = self.prototype.ollama_client
+        extractor.current_model = self.prototype.current_model
+        extractor.response_cache = self.prototype.response_cache
+        extractor.rule_extractor = self.prototype.rule_extractor
+        extractor.structured_output = self.prototype.structured_output
+        extractor.metrics = self.prototype.metrics
+        extractor.router = self.prototype.router
+        if user_id is not None:
+            extractor.cache_namespace = hashlib.sha256(str(user_id).encode()).hexdigest()
+
+    def estimate_memory(self, extractor: UltraKnowledgeExtractor) -> int:
+        on_disk = 0
+        for path in (extractor.kg_file, extractor.journal_file):
+            if os.path.exists(path):
+                on_disk += os.path.getsize(path)
+        return max(MIN_GRAPH_BYTES, int(on_disk * MEMORY_PER_FILE_BYTE.get(extractor.snapshot_format, 3.0)))
+
+    @property
+    def memory_in_use(self) -> int:
+        return sum(self.memory_estimates.values())
+
+    @contextlib.contextmanager
+    def tenant_lock(self, user_id: str, blocking: bool = True) -> Iterator[bool]:
+        """Hold the user's lock; yields False instead if non-blocking and another thread has it"""
+        with self._lock:
+            entry = self.tenant_locks.setdefault(user_id, [threading.RLock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(blocking=blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.tenant_locks[user_id]
+
+    @contextlib.contextmanager
+    def tenant(self, user_id: str) -> Iterator[UltraKnowledgeExtractor]:
+        """The user's extractor, loaded if needed and held against eviction while in use"""
+        with self.tenant_lock(user_id):
+            yield self._get_extractor(user_id)
+
+    def _get_extractor(self, user_id: str) -> UltraKnowledgeExtractor:
+        """Loaded or cached extractor; only call while holding the user's tenant_lock"""
+        with self._lock:
+            extractor = self.graphs.get(user_id)
+            if extractor is not None:
+                self.graphs.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return extractor
+
+        path = self.graph_file(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            extractor = UltraKnowledgeExtractor(kg_file=path, ollama_host=self.ollama_host,
+                                                snapshot_format=self.snapshot_format,
+                                                response_cache_size=0, **self.extractor_options)
+        self.share_resources(extractor, user_id)
+
+        with self._lock:
+            # Another thread may have loaded it meanwhile
+            if user_id in self.graphs:
+                self.graphs.move_to_end(user_id)
+                return self.graphs[user_id]
+            self.graphs[user_id] = extractor
+            self.memory_estimates[user_id] = self.estimate_memory(extractor)
+            self.stats["loads"] += 1
+        self.evict_cold(keep=user_id)
+        return extractor
+
+    def over_budget(self) -> bool:
+        if len(self.graphs) > self.max_loaded_graphs:
+            return True
+        return self.max_memory_bytes is not None and self.memory_in_use > self.max_memory_bytes
+
+    def evict_cold(self, keep: Optional[str] = None) -> List[str]:
+        """Flush and drop least recently used graphs until back under the limits"""
+        evicted = []
+        with self._lock:
+            candidates = [user_id for user_id in self.graphs if user_id != keep]
+        for user_id in candidates:
+            with self._lock:
+                if not self.over_budget():
+                    break
+            if self.evict(user_id, blocking=False):
+                evicted.append(user_id)
+        return evicted
+
+    def evict(self, user_id: str, blocking: bool = True) -> bool:
+        """Flush one graph and drop it from memory; False if it is busy (non-blocking) or not loaded"""
+        with self.tenant_lock(user_id, blocking) as acquired:
+            if not acquired:
+                return False
+            with self._lock:
+                extractor = self.graphs.pop(user_id, None)
+                self.memory_estimates.pop(user_id, None)
+            if extractor is None:
+                return False
+            self.flush_extractor(extractor)
+            extractor.close()
+            if isinstance(extractor.kg, kg_snapshot.LazyKnowledgeGraph):
+                extractor.kg.map.close()
+            with self._lock:
+                self.stats["evictions"] += 1
+            return True
+
+    @staticmethod
+    def flush_extractor(extractor: UltraKnowledgeExtractor):
+        # Saves queued for a background writer go out first. Non-journal graphs
+        # are then up to date; journaled ones are folded into their snapshot so
+        # the next load needs no replay
+        extractor.flush_pending_saves()
+        if extractor.journal_mode:
+            extractor.append_journal_records()
+            extractor.persist_knowledge_graph()
+
+    def flush(self, user_id: Optional[str] = None):
+        """Write out one tenant's graph, or every loaded graph"""
+        with self._lock:
+            user_ids = [user_id] if user_id is not None else list(self.graphs)
+        for uid in user_ids:
+            with self._lock:
+                if uid not in self.graphs:
+                    continue
+            with self.tenant(uid) as extractor:
+                self.flush_extractor(extractor)
+                with self._lock:
+                    if uid in self.memory_estimates:
+                        self.memory_estimates[uid] = self.estimate_memory(extractor)
+        self.evict_cold()
+
+    def close(self):
+        """Flush and evict everything"""
+        with self._lock:
+            user_ids = list(self.graphs)
+        for user_id in user_ids:
+            self.evict(user_id)
+
+    def extract_and_store(self, user_id: str, user_input: str, fast: bool = False,
+                          on_triplet: Optional[Callable[[Dict], None]] = None) -> Dict:
+        with self.tenant(user_id) as extractor:
+            result = extractor.extract_and_store(user_input, fast=fast, on_triplet=on_triplet)
+            with self._lock:
+                if user_id in self.memory_estimates:
+                    self.memory_estimates[user_id] = self.estimate_memory(extractor)
+        self.evict_cold()
+        return result
+
+    def export_for_llm_context(self, user_id: str, max_triplets: int = 50, max_entities: int = 30,
+                               query: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        with self.tenant(user_id) as extractor:
+            return extractor.export_for_llm_context(max_triplets=max_triplets, max_entities=max_entities,
+                                                    query=query, max_tokens=max_tokens)
+
+    def manager_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "loaded_graphs": len(self.graphs),
+            "estimated_memory_mb": round(self.memory_in_use / (1024 * 1024), 2),
+            "response_cache": self.prototype.response_cache.stats(),
+            "coalesced_requests": self.prototype.connection.coalescer.coalesced if self.prototype.connection else 0
+        }
@@ -0,0 +1,687 @@
+import functools
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Any, Optional, Callable
+
+from graph_query import MAX_MENTION_WORDS, AdjacencyIndex, entity_key
+from knowledge_retrieval import tokenize
+
+CONVERSATION_KEYS = ["topics_mentioned", "emotional_indicators", "temporal_markers",
+                     "relationship_dynamics", "behavior_patterns", "decision_factors",
+                     "communication_style", "priority_indicators"]
+# Triplet columns returned as triplet dicts (NULL columns are left out)
+TRIPLET_FIELDS = ("subject", "predicate", "object", "category", "subcategory", "confidence", "temporal_info",
+                  "context", "id", "extracted_at", "source_input", "seen_count")
+# Small graph sections the extractor keeps in memory; a store saves them as JSON next to meta
+META_SECTIONS = ["entity_aliases", "entity_merge_proposals"]
+
+
+def locked(method):
+    """Run a store method holding self.lock, one thread on the connection at a time"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class KnowledgeGraphStore:
+    """Storage backend interface for UltraKnowledgeExtractor.
+
+    A store owns the bulky parts of the graph (triplets, entities, mentions,
+    category facts) so the extractor only keeps meta and analytics in memory.
+    """
+
+    def load_meta(self) -> Optional[Dict]:
+        """Return persisted meta/extraction_stats (plus any saved META_SECTIONS), or None for an empty store"""
+        raise NotImplementedError
+
+    def save_meta(self, meta: Dict, extraction_stats: Dict, sections: Optional[Dict] = None):
+        """Persist meta, extraction stats and META_SECTIONS and commit pending writes"""
+        raise NotImplementedError
+
+    def entity_types(self) -> Dict[str, set]:
+        """Entity name -> the named entity types it is filed under"""
+        raise NotImplementedError
+
+    @property
+    def adjacency(self) -> AdjacencyIndex:
+        """Graph queries (neighbors, k_hop, path, match) over the stored triplets, edges being triplet IDs"""
+        raise NotImplementedError
+
+    def triplets_by_id(self, triplet_ids: List[str]) -> List[Dict]:
+        """Stored triplets in the order of triplet_ids"""
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    def dedupe_triplets(self) -> int:
+        raise NotImplementedError
+
+    def import_json_graph(self, kg: Dict):
+        """Bulk-load a graph in the JSON file schema"""
+        raise NotImplementedError
+
+    def integrate(self, extracted_data: Dict, user_input: str, current_time: str,
+                  triplet_id: Callable[[Dict], str], retention: Optional[Dict] = None):
+        raise NotImplementedError
+
+    def apply_retention(self, retention: Dict) -> Dict[str, int]:
+        """Trim every ring buffer to the retention caps, returns rows dropped per kind"""
+        raise NotImplementedError
+
+    def knowledge_base_size(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def extraction_context(self, user_input: str) -> str:
+        raise NotImplementedError
+
+    def display_stats(self, meta: Dict, extraction_stats: Dict):
+        raise NotImplementedError
+
+    def export_for_llm_context(self, max_triplets: int = 50, max_entities: int = 30,
+                               query: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteKnowledgeStore(KnowledgeGraphStore):
+    """SQLite backend with indexed triplet, entity, mention and category fact tables"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS triplets (
+        rowid INTEGER PRIMARY KEY,
+        id TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        predicate TEXT NOT NULL,
+        object TEXT NOT NULL,
+        category TEXT,
+        subcategory TEXT,
+        confidence REAL,
+        temporal_info TEXT,
+        context TEXT,
+        extracted_at TEXT,
+        source_input TEXT,
+        seen_count INTEGER NOT NULL DEFAULT 1,
+        subject_key TEXT,
+        object_key TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_triplets_subject ON triplets(subject);
+    CREATE INDEX IF NOT EXISTS idx_triplets_predicate ON triplets(predicate);
+    CREATE INDEX IF NOT EXISTS idx_triplets_object ON triplets(object);
+    CREATE INDEX IF NOT EXISTS idx_triplets_category ON triplets(category);
+    CREATE INDEX IF NOT EXISTS idx_triplets_extracted_at ON triplets(extracted_at);
+    CREATE INDEX IF NOT EXISTS idx_triplets_rank ON triplets(confidence DESC, extracted_at DESC);
+
+    CREATE TABLE IF NOT EXISTS entities (
+        entity_type TEXT NOT NULL,
+        name TEXT NOT NULL,
+        first_mentioned TEXT,
+        mention_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (entity_type, name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_entities_rank ON entities(entity_type, mention_count DESC);
+
+    CREATE TABLE IF NOT EXISTS mentions (
+        entity_type TEXT NOT NULL,
+        name TEXT NOT NULL,
+        timestamp TEXT,
+        input TEXT,
+        context TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_mentions_entity ON mentions(entity_type, name);
+
+    CREATE TABLE IF NOT EXISTS mention_counts (
+        name TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_mention_counts_count ON mention_counts(count DESC);
+
+    CREATE TABLE IF NOT EXISTS category_facts (
+        category TEXT NOT NULL,
+        key TEXT NOT NULL,
+        subject TEXT,
+        predicate TEXT,
+        object TEXT,
+        subcategory TEXT,
+        confidence REAL,
+        temporal_info TEXT,
+        last_updated TEXT,
+        update_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (category, key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_category_facts_category ON category_facts(category);
+
+    CREATE TABLE IF NOT EXISTS fact_sources (
+        category TEXT NOT NULL,
+        key TEXT NOT NULL,
+        context TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_fact_sources_fact ON fact_sources(category, key);
+
+    CREATE TABLE IF NOT EXISTS fact_terms (
+        term TEXT NOT NULL,
+        category TEXT NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (term, category, key)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS conversation_items (
+        rowid INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        value TEXT,
+        timestamp TEXT,
+        source_input TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversation_items_kind ON conversation_items(kind, rowid);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS triplet_text USING fts5(id UNINDEXED, body);
+
+    CREATE TABLE IF NOT EXISTS kv (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """
+
+    def __init__(self, db_file: str = "ultra_knowledge_graph.db"):
+        self.db_file = db_file
+        # Background saves and asyncio.to_thread() use the connection from
+        # other threads; every public method serializes on the lock instead
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.ensure_unique_triplets()
+        self.ensure_entity_keys()
+        self.conn.commit()
+        self._adjacency = SQLiteAdjacency(self)
+
+    def ensure_unique_triplets(self):
+        """Upgrade databases created before triplets were deduplicated on ingest"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(triplets)")]
+        if "seen_count" not in columns:
+            self.conn.execute("ALTER TABLE triplets ADD COLUMN seen_count INTEGER NOT NULL DEFAULT 1")
+        try:
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_triplets_uid ON triplets(id)")
+        except sqlite3.IntegrityError:
+            self.dedupe_triplets()
+        self.conn.execute("DROP INDEX IF EXISTS idx_triplets_id")
+        if self.conn.execute("SELECT 1 FROM triplet_text LIMIT 1").fetchone() is None:
+            self.conn.execute(
+                "INSERT INTO triplet_text (id, body) SELECT id,"
+                " subject || ' ' || predicate || ' ' || object || ' ' || COALESCE(source_input, '') FROM triplets")
+
+    def ensure_entity_keys(self):
+        """Upgrade databases created before triplets carried entity_key() columns for graph queries"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(triplets)")]
+        if "subject_key" not in columns:
+            self.conn.execute("ALTER TABLE triplets ADD COLUMN subject_key TEXT")
+            self.conn.execute("ALTER TABLE triplets ADD COLUMN object_key TEXT")
+        self.conn.executemany(
+            "UPDATE triplets SET subject_key = ?, object_key = ? WHERE rowid = ?",
+            [(entity_key(subject), entity_key(obj), rowid) for rowid, subject, obj in self.conn.execute(
+                "SELECT rowid, subject, object FROM triplets WHERE subject_key IS NULL").fetchall()]
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_triplets_subject_key ON triplets(subject_key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_triplets_object_key ON triplets(object_key)")
+
+    # ----- meta -----
+
+    @locked
+    def load_meta(self) -> Optional[Dict]:
+        rows = dict(self.conn.execute("SELECT key, value FROM kv").fetchall())
+        if "meta" not in rows:
+            return None
+        return {
+            "meta": json.loads(rows["meta"]),
+            "extraction_stats": json.loads(rows.get("extraction_stats", "{}")),
+            **{name: json.loads(rows[name]) for name in META_SECTIONS if name in rows}
+        }
+
+    @locked
+    def save_meta(self, meta: Dict, extraction_stats: Dict, sections: Optional[Dict] = None):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+            [("meta", json.dumps(meta)), ("extraction_stats", json.dumps(extraction_stats))]
+            + [(name, json.dumps(value)) for name, value in (sections or {}).items() if name in META_SECTIONS]
+        )
+        self.conn.commit()
+
+    @locked
+    def entity_types(self) -> Dict[str, set]:
+        types = {}
+        for entity_type, name in self.conn.execute("SELECT entity_type, name FROM entities"):
+            types.setdefault(name, set()).add(entity_type)
+        return types
+
+    @locked
+    def dedupe_triplets(self) -> int:
+        """Merge duplicate triplet rows into the earliest one, returns number removed"""
+        self.conn.execute("DROP INDEX IF EXISTS idx_triplets_uid")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_triplets_id ON triplets(id)")
+        self.conn.execute(
+            "UPDATE triplets SET"
+            " seen_count = (SELECT SUM(d.seen_count) FROM triplets d WHERE d.id = triplets.id),"
+            " confidence = (SELECT MAX(d.confidence) FROM triplets d WHERE d.id = triplets.id),"
+            " extracted_at = (SELECT MAX(d.extracted_at) FROM triplets d WHERE d.id = triplets.id)"
+            " WHERE rowid IN (SELECT MIN(rowid) FROM triplets GROUP BY id HAVING COUNT(*) > 1)")
+        removed = self.conn.execute(
+            "DELETE FROM triplets WHERE rowid NOT IN (SELECT MIN(rowid) FROM triplets GROUP BY id)").rowcount
+        self.conn.execute("CREATE UNIQUE INDEX idx_triplets_uid ON triplets(id)")
+        self.conn.execute("DROP INDEX idx_triplets_id")
+        self.conn.commit()
+        return removed
+
+    @locked
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM triplets LIMIT 1").fetchone() is None
+
+    # ----- writes -----
+
+    @staticmethod
+    def fact_terms(key: str, value: Any) -> set:
+        """Tokens a category fact can be looked up by"""
+        return set(tokenize(key)) | set(tokenize(value))
+
+    def _insert_triplet(self, triplet: Dict):
+        if self.conn.execute("SELECT 1 FROM triplets WHERE id = ?", (triplet["id"],)).fetchone() is None:
+            self.conn.execute(
+                "INSERT INTO triplet_text (id, body) VALUES (?, ?)",
+                (triplet["id"], " ".join(tokenize(
+                    f"{triplet['subject']} {triplet['predicate']} {triplet['object']} {triplet.get('source_input', '')}")))
+            )
+        self.conn.execute(
+            "INSERT INTO triplets (id, subject, predicate, object, category, subcategory, confidence,"
+            " temporal_info, context, extracted_at, source_input, seen_count, subject_key, object_key)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET seen_count = seen_count + excluded.seen_count,"
+            " confidence = MAX(confidence, excluded.confidence),"
+            " extracted_at = MAX(extracted_at, excluded.extracted_at)",
+            (triplet["id"], str(triplet["subject"]), str(triplet["predicate"]), str(triplet["object"]),
+             triplet.get("category", "general"), triplet.get("subcategory"),
+             triplet.get("confidence", 0.8), triplet.get("temporal_info"), triplet.get("context", ""),
+             triplet.get("extracted_at"), triplet.get("source_input"), triplet.get("seen_count", 1),
+             entity_key(triplet["subject"]), entity_key(triplet["object"]))
+        )
+
+    def _upsert_category_fact(self, category: str, key: str, fact: Dict, contexts: List[str]):
+        self.conn.execute(
+            "INSERT INTO category_facts (category, key, subject, predicate, object, subcategory, confidence,"
+            " temporal_info, last_updated, update_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(category, key) DO UPDATE SET subject=excluded.subject, predicate=excluded.predicate,"
+            " object=excluded.object, subcategory=excluded.subcategory, confidence=excluded.confidence,"
+            " temporal_info=excluded.temporal_info, last_updated=excluded.last_updated,"
+            " update_count=category_facts.update_count + excluded.update_count",
+            (category, key, str(fact.get("subject")), str(fact.get("predicate")), str(fact.get("object")),
+             fact.get("subcategory", "general"), fact.get("confidence", 0.8),
+             fact.get("temporal_info", "unknown"), fact.get("last_updated"), fact.get("update_count", 1))
+        )
+        self.conn.executemany(
+            "INSERT INTO fact_sources (category, key, context) VALUES (?, ?, ?)",
+            [(category, key, context) for context in contexts]
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO fact_terms (term, category, key) VALUES (?, ?, ?)",
+            [(term, category, key) for term in self.fact_terms(key, fact.get("object", ""))]
+        )
+
+    def _add_mention(self, entity_type: str, name: str, first_mentioned: str, count: int, contexts: List[Dict]):
+        self.conn.execute(
+            "INSERT INTO entities (entity_type, name, first_mentioned, mention_count) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(entity_type, name) DO UPDATE SET mention_count = mention_count + excluded.mention_count",
+            (entity_type, name, first_mentioned, count)
+        )
+        self.conn.executemany(
+            "INSERT INTO mentions (entity_type, name, timestamp, input, context) VALUES (?, ?, ?, ?, ?)",
+            [(entity_type, name, c.get("timestamp"), c.get("input"), c.get("context", "")) for c in contexts]
+        )
+
+    def _bump_mention_count(self, name: str, count: int):
+        self.conn.execute(
+            "INSERT INTO mention_counts (name, count) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET count = count + excluded.count",
+            (name, count)
+        )
+
+    def _add_conversation_item(self, kind: str, item: Dict):
+        value = item["value"]
+        self.conn.execute(
+            "INSERT INTO conversation_items (kind, value, timestamp, source_input) VALUES (?, ?, ?, ?)",
+            (kind, value if isinstance(value, str) else json.dumps(value),
+             item.get("timestamp"), item.get("source_input"))
+        )
+
+    @locked
+    def integrate(self, extracted_data: Dict, user_input: str, current_time: str,
+                  triplet_id: Callable[[Dict], str], retention: Optional[Dict] = None):
+        """Mirror of UltraKnowledgeExtractor.integrate_extracted_knowledge as indexed writes
+
+        With retention, the mention, fact source and conversation item
+        lists touched here are kept as ring buffers like the JSON graph's.
+        """
+        retention = retention or {}
+        for triplet in extracted_data.get("triplets", []):
+            self._insert_triplet({
+                **triplet,
+                "id": triplet_id(triplet),
+                "extracted_at": current_time,
+                "source_input": user_input
+            })
+            category = triplet.get("category", "general")
+            key = f"{triplet['predicate']}_{triplet['object']}".replace(" ", "_")
+            self._upsert_category_fact(category, key, {
+                **triplet,
+                "subcategory": triplet.get("subcategory", "general"),
+                "last_updated": current_time,
+                "update_count": 1
+            }, [triplet["context"]] if triplet.get("context") else [])
+            self._trim("fact_sources", ("category", "key"), (category, key), retention.get("max_contexts_per_fact"))
+
+        for entity_type, entities in extracted_data.get("named_entities", {}).items():
+            for entity in entities:
+                self._add_mention(entity_type, entity, current_time, 1, [{
+                    "timestamp": current_time,
+                    "input": user_input,
+                    "context": extracted_data.get("context", "")
+                }])
+                self._bump_mention_count(entity, 1)
+                self._trim("mentions", ("entity_type", "name"), (entity_type, entity),
+                           retention.get("max_contexts_per_entity"))
+
+        for key in CONVERSATION_KEYS:
+            for item in extracted_data.get(key, []):
+                self._add_conversation_item(key, {
+                    "value": item,
+                    "timestamp": current_time,
+                    "source_input": user_input
+                })
+            self._trim("conversation_items", ("kind",), (key,), retention.get("max_items_per_metadata_list"))
+
+    # ----- retention -----
+
+    def _trim(self, table: str, columns: tuple, group: tuple, cap: Optional[int]) -> int:
+        """Keep the newest cap rows of one group, returns the number deleted"""
+        if not cap:
+            return 0
+        where = " AND ".join(f"{column} = ?" for column in columns)
+        return self.conn.execute(
+            f"DELETE FROM {table} WHERE {where} AND rowid NOT IN"
+            f" (SELECT rowid FROM {table} WHERE {where} ORDER BY rowid DESC LIMIT ?)",
+            (*group, *group, cap)).rowcount
+
+    def _trim_all(self, table: str, columns: tuple, cap: Optional[int]) -> int:
+        """Keep the newest cap rows of every group, returns the number deleted"""
+        if not cap:
+            return 0
+        return self.conn.execute(
+            f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER"
+            f" (PARTITION BY {', '.join(columns)} ORDER BY rowid DESC) AS position FROM {table})"
+            f" WHERE position > ?)", (cap,)).rowcount
+
+    @locked
+    def apply_retention(self, retention: Dict) -> Dict[str, int]:
+        dropped = {
+            "entity_contexts": self._trim_all("mentions", ("entity_type", "name"),
+                                              retention.get("max_contexts_per_entity")),
+            "fact_contexts": self.conn.execute(
+                "DELETE FROM fact_sources WHERE context IS NULL OR context = ''").rowcount,
+            "metadata_items": self._trim_all("conversation_items", ("kind",),
+                                             retention.get("max_items_per_metadata_list"))
+        }
+        dropped["fact_contexts"] += self._trim_all("fact_sources", ("category", "key"),
+                                                   retention.get("max_contexts_per_fact"))
+        self.conn.commit()
+        return dropped
+
+    @locked
+    def import_json_graph(self, kg: Dict):
+        for triplet in kg.get("triplets", []):
+            self._insert_triplet(triplet)
+
+        for category, facts in kg.get("knowledge_categories", {}).items():
+            for key, fact in facts.items():
+                if isinstance(fact, dict):
+                    self._upsert_category_fact(category, key, fact, fact.get("source_contexts", []))
+
+        # Contexts may reference raw inputs stored once in source_texts
+        source_texts = kg.get("source_texts", {})
+
+        for entity_type, entities in kg.get("named_entities", {}).items():
+            for name, data in entities.items():
+                contexts = [{**c, "input": c.get("input", source_texts.get(c.get("input_ref"), {}).get("text"))}
+                            for c in data.get("contexts", [])]
+                self._add_mention(entity_type, name, data.get("first_mentioned"),
+                                  data.get("mention_count", 0), contexts)
+
+        metadata = kg.get("conversation_metadata", {})
+        for name, count in metadata.get("entity_mentions", {}).items():
+            self._bump_mention_count(name, count)
+        for key in CONVERSATION_KEYS:
+            for item in metadata.get(key, []):
+                self._add_conversation_item(
+                    key, {**item, "source_input": item.get("source_input",
+                                                           source_texts.get(item.get("source_ref"), {}).get("text"))})
+
+        self.save_meta(kg.get("meta", {}), kg.get("analytics", {}).get("extraction_stats", {}),
+                       {name: kg[name] for name in META_SECTIONS if name in kg})
+
+    # ----- reads -----
+
+    @property
+    def adjacency(self) -> AdjacencyIndex:
+        return self._adjacency
+
+    @locked
+    def triplets_by_id(self, triplet_ids: List[str]) -> List[Dict]:
+        rows = {}
+        for start in range(0, len(triplet_ids), 500):
+            chunk = triplet_ids[start:start + 500]
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(TRIPLET_FIELDS)} FROM triplets WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            for row in cursor:
+                triplet = {field: value for field, value in zip(TRIPLET_FIELDS, row) if value is not None}
+                rows[triplet["id"]] = triplet
+        return [rows[triplet_id] for triplet_id in triplet_ids if triplet_id in rows]
+
+    @locked
+    def knowledge_base_size(self) -> Dict[str, int]:
+        return {
+            "total_triplets": self.conn.execute("SELECT COUNT(*) FROM triplets").fetchone()[0],
+            "total_entities": self.conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0],
+            "knowledge_categories": self.conn.execute(
+                "SELECT COUNT(DISTINCT category) FROM category_facts").fetchone()[0]
+        }
+
+    @locked
+    def extraction_context(self, user_input: str) -> str:
+        context_parts = []
+
+        recent_topics = [row[0] for row in self.conn.execute(
+            "SELECT value FROM conversation_items WHERE kind = 'topics_mentioned' ORDER BY rowid DESC LIMIT 10")]
+        if recent_topics:
+            context_parts.append(f"Recent topics discussed: {', '.join(reversed(recent_topics))}")
+
+        frequent_entities = self.conn.execute(
+            "SELECT name, count FROM mention_counts ORDER BY count DESC LIMIT 15").fetchall()
+        if frequent_entities:
+            entities_str = ", ".join([f"{entity}({count})" for entity, count in frequent_entities])
+            context_parts.append(f"Frequently mentioned entities: {entities_str}")
+
+        known_relationships = [f"{subj} {pred} {obj}" for subj, pred, obj, _, _ in self.ranked_triplets(user_input)]
+        predicates = [] if known_relationships else [
+            row[0] for row in self.conn.execute("SELECT DISTINCT predicate FROM triplets LIMIT 10")]
+        for predicate in predicates:
+            for subj, obj in self.conn.execute(
+                    "SELECT subject, object FROM triplets WHERE predicate = ? ORDER BY rowid LIMIT 3", (predicate,)):
+                known_relationships.append(f"{subj} {predicate} {obj}")
+        if known_relationships:
+            context_parts.append(f"Known relationships: {'; '.join(known_relationships)}")
+
+        input_keywords = list(set(tokenize(user_input)))
+        if input_keywords:
+            placeholders = ",".join("?" * len(input_keywords))
+            rows = self.conn.execute(
+                f"SELECT DISTINCT f.category, f.key, f.object FROM fact_terms t"
+                f" JOIN category_facts f ON f.category = t.category AND f.key = t.key"
+                f" WHERE t.term IN ({placeholders}) LIMIT 10", input_keywords).fetchall()
+            if rows:
+                relevant_knowledge = [f"{category}.{key}: {value}" for category, key, value in rows]
+                context_parts.append(f"Relevant existing knowledge: {'; '.join(relevant_knowledge)}")
+
+        return "\n".join(context_parts) if context_parts else "No existing context available."
+
+    @locked
+    def display_stats(self, meta: Dict, extraction_stats: Dict):
+        size = self.knowledge_base_size()
+
+        print("\n" + "="*100)
+        print("📊 ULTRA KNOWLEDGE GRAPH STATISTICS")
+        print("="*100)
+
+        print(f"📈 Total Knowledge Triplets: {size['total_triplets']}")
+        print(f"👥 Total Named Entities: {size['total_entities']}")
+        print(f"📂 Active Knowledge Categories: {size['knowledge_categories']}")
+        print(f"🔄 Total Inputs Processed: {meta['total_inputs_processed']}")
+        print(f"🎯 Extraction Success Rate: {extraction_stats['successful_extractions']}/{extraction_stats['total_extractions']}")
+        avoided = extraction_stats.get("llm_calls_avoided", {})
+        print(f"⚡ LLM Calls Avoided: {avoided.get('rule_based', 0)} rule-based, {avoided.get('no_content', 0)} no-content")
+
+        print("\n📋 KNOWLEDGE BY CATEGORY:")
+        print("-" * 80)
+        for category, count in self.conn.execute(
+                "SELECT category, COUNT(*) FROM category_facts GROUP BY category").fetchall():
+            print(f"  {category.title().replace('_', ' ')}: {count} items")
+            for predicate, obj, confidence in self.conn.execute(
+                    "SELECT predicate, object, confidence FROM category_facts WHERE category = ? LIMIT 2", (category,)):
+                print(f"    • {predicate or 'has'}: {obj} (confidence: {confidence or 0:.1f})")
+
+        print("\n👥 NAMED ENTITIES:")
+        print("-" * 80)
+        for entity_type, count in self.conn.execute(
+                "SELECT entity_type, COUNT(*) FROM entities GROUP BY entity_type").fetchall():
+            print(f"  {entity_type.title()}: {count}")
+            for name, mentions in self.conn.execute(
+                    "SELECT name, mention_count FROM entities WHERE entity_type = ?"
+                    " ORDER BY mention_count DESC LIMIT 3", (entity_type,)):
+                print(f"    • {name} (mentioned {mentions} times)")
+
+        print("\n📈 Current Knowledge Graph Size:")
+        print(f"  • Entities: {size['total_entities']}")
+        print(f"  • Triplets: {size['total_triplets']}")
+        print(f"  • Categories: {size['knowledge_categories']}")
+
+        print("="*100)
+
+    @locked
+    def ranked_triplets(self, query: str, limit: int = 10) -> List[tuple]:
+        """Top-k triplets for a message by FTS5 bm25 rank"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        return self.conn.execute(
+            "SELECT t.subject, t.predicate, t.object, t.confidence, t.temporal_info FROM triplet_text f"
+            " JOIN triplets t ON t.id = f.id WHERE triplet_text MATCH ? ORDER BY bm25(triplet_text) LIMIT ?",
+            (match, limit)).fetchall()
+
+    @locked
+    def export_for_llm_context(self, max_triplets: int = 50, max_entities: int = 30,
+                               query: Optional[str] = None) -> str:
+        context_parts = []
+
+        if query:
+            recent_triplets = self.ranked_triplets(query, max_triplets)
+        else:
+            recent_triplets = self.conn.execute(
+                "SELECT subject, predicate, object, confidence, temporal_info FROM triplets"
+                " ORDER BY confidence DESC, extracted_at DESC LIMIT ?", (max_triplets,)).fetchall()
+        if recent_triplets:
+            context_parts.append("KEY KNOWLEDGE ABOUT USER:")
+            for subj, pred, obj, confidence, temporal in recent_triplets:
+                if (confidence or 0) >= 0.7:  # Only high-confidence info
+                    context_parts.append(f"• {subj} {pred.replace('_', ' ')} {obj} {f'({temporal})' if temporal else ''}")
+
+        important_entities = []
+        entity_types = [row[0] for row in self.conn.execute("SELECT DISTINCT entity_type FROM entities")]
+        for entity_type in entity_types:
+            for (name,) in self.conn.execute(
+                    "SELECT name FROM entities WHERE entity_type = ? AND mention_count > 1"
+                    " ORDER BY mention_count DESC LIMIT 5", (entity_type,)):
+                important_entities.append(f"{name} ({entity_type})")
+        if important_entities:
+            context_parts.append(f"\nIMPORTANT ENTITIES: {', '.join(important_entities[:max_entities])}")
+
+        recent_patterns = [row[0] for row in self.conn.execute(
+            "SELECT value FROM conversation_items WHERE kind = 'behavior_patterns' ORDER BY rowid DESC LIMIT 10")]
+        if recent_patterns:
+            context_parts.append(f"\nBEHAVIOR PATTERNS: {'; '.join(set(recent_patterns))}")
+
+        return "\n".join(context_parts)
+
+    @locked
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class SQLiteAdjacency(AdjacencyIndex):
+    """AdjacencyIndex answered from a SQLiteKnowledgeStore's triplets table
+
+    Lookups go through the indexed subject_key/object_key columns, so
+    nothing is held in memory; k_hop and path reuse the inherited
+    breadth-first search on top of neighbors().
+    """
+
+    def __init__(self, store: SQLiteKnowledgeStore):
+        super().__init__()
+        self.conn = store.conn
+        self.lock = store.lock
+        self.longest_name = MAX_MENTION_WORDS
+
+    @locked
+    def neighbors(self, entity: str, direction: str = "both") -> List[tuple]:
+        key = entity_key(entity)
+        pairs = []
+        if direction in ("out", "both"):
+            pairs.extend(self.conn.execute(
+                "SELECT id, object_key FROM triplets WHERE subject_key = ? ORDER BY rowid", (key,)))
+        if direction in ("in", "both"):
+            pairs.extend(self.conn.execute(
+                "SELECT id, subject_key FROM triplets WHERE object_key = ? ORDER BY rowid", (key,)))
+        return pairs
+
+    @locked
+    def match(self, subject: Optional[str] = None, predicate: Optional[str] = None,
+              obj: Optional[str] = None) -> List[str]:
+        conditions = [(column, value) for column, value in (
+            ("subject_key", entity_key(subject) if subject is not None else None),
+            ("predicate", predicate),
+            ("object_key", entity_key(obj) if obj is not None else None)) if value is not None]
+        where = " AND ".join(f"{column} = ?" for column, _ in conditions) or "1"
+        return [row[0] for row in self.conn.execute(
+            f"SELECT id FROM triplets WHERE {where} ORDER BY rowid", [value for _, value in conditions])]
+
+    @locked
+    def known_keys(self, keys: List[str]) -> set:
+        keys = list(set(keys))
+        known = set()
+        for start in range(0, len(keys), 400):
+            chunk = keys[start:start + 400]
+            marks = ", ".join("?" * len(chunk))
+            known.update(row[0] for row in self.conn.execute(
+                f"SELECT subject_key FROM triplets WHERE subject_key IN ({marks})"
+                f" UNION SELECT object_key FROM triplets WHERE object_key IN ({marks})", chunk + chunk))
+        return known
+
+    @locked
+    def display_name(self, key: str) -> str:
+        row = self.conn.execute(
+            "SELECT name FROM (SELECT rowid, subject AS name FROM triplets WHERE subject_key = ?"
+            " UNION ALL SELECT rowid, object FROM triplets WHERE object_key = ?) ORDER BY rowid LIMIT 1",
+            (key, key)).fetchone()
+        return row[0] if row else key
@@ -0,0 +1,132 @@
+import math
+import re
+from collections import defaultdict, Counter
+from typing import Dict, List, Iterable, Hashable
+
+try:
+    import numpy as np
+except ImportError:  # BM25 scoring falls back to plain posting-list loops
+    np = None
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Words that would otherwise match nearly every fact
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "in", "on", "at", "to", "for", "with", "by",
+    "from", "is", "am", "are", "was", "were", "be", "been", "has", "have", "had", "do", "does",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "this", "that", "so", "as", "very"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed (underscores split words)"""
+    return [token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+class InvertedIndex:
+    """Token -> set of document keys, maintained incrementally"""
+
+    def __init__(self):
+        self.postings: Dict[str, set] = defaultdict(set)
+
+    def add(self, key: Hashable, tokens: Iterable[str]):
+        for token in tokens:
+            self.postings[token].add(key)
+
+    def remove(self, key: Hashable, tokens: Iterable[str]):
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting:
+                posting.discard(key)
+                if not posting:
+                    del self.postings[token]
+
+    def lookup(self, tokens: Iterable[str], limit: int = 10) -> List[Hashable]:
+        """Keys matching any token, most token hits first"""
+        hits = Counter()
+        for token in set(tokens):
+            hits.update(self.postings.get(token, ()))
+        return [key for key, _ in hits.most_common(limit)]
+
+
+class BM25Index:
+    """Okapi BM25 over a growing document set, stored as a sparse term matrix.
+
+    Each term column holds parallel (doc row, term frequency) arrays; with
+    NumPy a query is scored as a handful of vectorized column operations
+    instead of a Python loop over every document.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_keys: List[Hashable] = []
+        self.doc_rows: Dict[Hashable, int] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.columns: Dict[str, tuple] = defaultdict(lambda: ([], []))
+        self._frozen: Dict[str, tuple] = {}
+        self._frozen_lengths = None
+
+    def __len__(self):
+        return len(self.doc_keys)
+
+    def add(self, key: Hashable, tokens: List[str]):
+        """Index a document once; re-adding a known key is a no-op"""
+        if key in self.doc_rows:
+            return
+        row = len(self.doc_keys)
+        self.doc_rows[key] = row
+        self.doc_keys.append(key)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+        for token, tf in Counter(tokens).items():
+            rows, tfs = self.columns[token]
+            rows.append(row)
+            tfs.append(tf)
+            self._frozen.pop(token, None)
+        self._frozen_lengths = None
+
+    def _column(self, token: str):
+        """NumPy view of a term column, cached until the column changes"""
+        if token not in self._frozen:
+            rows, tfs = self.columns[token]
+            self._frozen[token] = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float64))
+        return self._frozen[token]
+
+    def search(self, tokens: List[str], limit: int = 10) -> List[Hashable]:
+        """Keys of the top-scoring documents for the query tokens, best first"""
+        n_docs = len(self.doc_keys)
+        terms = [token for token in set(tokens) if token in self.columns]
+        if not n_docs or not terms:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+
+        if np is not None:
+            if self._frozen_lengths is None:
+                self._frozen_lengths = np.asarray(self.doc_lengths, dtype=np.float64)
+            norms = self.k1 * (1 - self.b + self.b * self._frozen_lengths / avg_length)
+            scores = np.zeros(n_docs)
+            for token in terms:
+                rows, tfs = self._column(token)
+                idf = np.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norms[rows])
+
+            matched = np.flatnonzero(scores)
+            if len(matched) > limit:
+                # Keep everything tied with the limit-th score, so ties break by row as below
+                cutoff = np.partition(scores[matched], len(matched) - limit)[len(matched) - limit]
+                matched = matched[scores[matched] >= cutoff]
+            ranked = matched[np.lexsort((matched, -scores[matched]))][:limit]
+            return [self.doc_keys[row] for row in ranked.tolist()]
+
+        scores = defaultdict(float)
+        for token in terms:
+            rows, tfs = self.columns[token]
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for row, tf in zip(rows, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row] / avg_length)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores, key=lambda row: (-scores[row], row))[:limit]
+        return [self.doc_keys[row] for row in ranked]
@@ -0,0 +1,361 @@
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+# Bare words models write in place of JSON literals
+LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class StreamingJSONScanner:
+    """Incremental, string-aware scanner for the first top-level JSON object in model output
+
+    Text is fed chunk by chunk as it streams in. Each character is looked at
+    once; feed() returns True as soon as the outermost object closes, so the
+    caller can stop generation there. Objects inside the top-level array
+    named element_key are handed to on_element as soon as each one closes.
+    """
+
+    def __init__(self, on_element: Optional[Callable[[Dict], None]] = None, element_key: str = "triplets"):
+        self.on_element = on_element
+        self.element_key = element_key
+        self.text = ""
+        self.pos = 0
+        self.start = None
+        self.end = None
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.current_key = None
+        self.element_start = None
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def result(self) -> Optional[str]:
+        """The complete top-level object, or None if it hasn't closed yet"""
+        return self.text[self.start:self.end + 1] if self.complete else None
+
+    def feed(self, chunk: str) -> bool:
+        if self.complete:
+            return True
+        self.text += chunk
+        text = self.text
+
+        for i in range(self.pos, len(text)):
+            c = text[i]
+
+            if self.start is None:
+                if c == "{":
+                    self.start = i
+                    self.stack.append(c)
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1:
+                        self.last_string = text[self.string_start + 1:i]
+                continue
+
+            if c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c == ":" and len(self.stack) == 1:
+                self.current_key = self.last_string
+            elif c in "{[":
+                self.stack.append(c)
+                if c == "{" and len(self.stack) == 3 and self.stack[1] == "[" and self.current_key == self.element_key:
+                    self.element_start = i
+            elif c in "}]":
+                self.stack.pop()
+                if c == "}" and self.element_start is not None and len(self.stack) == 2:
+                    self.emit(text[self.element_start:i + 1])
+                    self.element_start = None
+                if not self.stack:
+                    self.end = i
+                    self.pos = i + 1
+                    return True
+
+        self.pos = len(text)
+        return False
+
+    def emit(self, element_text: str):
+        if self.on_element is None:
+            return
+        try:
+            element = json.loads(element_text)
+        except json.JSONDecodeError:
+            try:
+                element = json.loads(repair_json(element_text))
+            except json.JSONDecodeError:
+                return
+        self.on_element(element)
+
+
+def strip_thinking(text: str) -> str:
+    """Drop the <think>...</think> block reasoning models put before their answer"""
+    end = text.find(THINK_CLOSE)
+    if end != -1 and THINK_OPEN in text[:end]:
+        return text[end + len(THINK_CLOSE):]
+    return text
+
+
+def iter_json_objects(text: str, close_truncated: bool = True) -> Iterator[str]:
+    """Each top-level {...} span in text, in order, found in a single pass
+
+    String-aware for both quote styles, so braces inside values don't
+    count. An object cut off by the token limit is yielded last, closed
+    after its last complete value, when close_truncated is set.
+    """
+    start = None
+    stack = []
+    quote = None
+    escape = False
+    safe_end, safe_stack = None, None  # where a truncated object can be cut and closed
+    for i, c in enumerate(text):
+        if quote:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == quote:
+                quote = None
+            continue
+        if start is None:
+            if c == "{":
+                start, stack = i, ["{"]
+                safe_end, safe_stack = i + 1, ["{"]
+            continue
+        if c == '"' or c == "'":
+            quote = c
+        elif c in "{[":
+            stack.append(c)
+            safe_end, safe_stack = i + 1, list(stack)
+        elif c in "}]":
+            stack.pop()
+            if not stack:
+                yield text[start:i + 1]
+                start = None
+            else:
+                safe_end, safe_stack = i + 1, list(stack)
+        elif c == ",":
+            safe_end, safe_stack = i, list(stack)
+
+    if start is not None and close_truncated:
+        yield text[start:safe_end] + "".join(CLOSERS[opener] for opener in reversed(safe_stack))
+
+
+def repair_json(text: str) -> str:
+    """Fix the defects models commonly produce, in one pass
+
+    Single-quoted strings become double-quoted, unquoted keys get quotes,
+    trailing commas before a closing bracket are dropped and Python's
+    True/False/None become JSON literals. Valid JSON comes back unchanged.
+    """
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c == '"' or c == "'":
+            # Copy the string through, re-quoting single-quoted ones
+            out.append('"')
+            i += 1
+            while i < n and text[i] != c:
+                if text[i] == "\\" and i + 1 < n:
+                    if c == "'" and text[i + 1] == "'":
+                        out.append("'")
+                    else:
+                        out.append(text[i:i + 2])
+                    i += 2
+                    continue
+                out.append('\\"' if text[i] == '"' and c == "'" else text[i])
+                i += 1
+            out.append('"')
+            i += 1
+            continue
+        if c in "}]":
+            # Drop a trailing comma (and the whitespace after it)
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        elif c.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and text[k] == ":":
+                out.append(f'"{word}"')  # unquoted key
+            else:
+                out.append(LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+class CompiledSchema:
+    """A JSON Schema, compiled once into nested check functions
+
+    Covers the subset prompts need: type, properties, required,
+    additionalProperties (as a schema), items, enum, minimum and maximum.
+    errors() returns (path, message) pairs, path being the keys and list
+    indexes leading to the offending value.
+    """
+
+    TYPES = {
+        "object": lambda v: isinstance(v, dict),
+        "array": lambda v: isinstance(v, list),
+        "string": lambda v: isinstance(v, str),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "boolean": lambda v: isinstance(v, bool),
+        "null": lambda v: v is None,
+    }
+
+    def __init__(self, schema: Dict):
+        self.schema = schema
+        self.check = self.compile(schema)
+
+    def errors(self, value: Any) -> List[Tuple[tuple, str]]:
+        errors = []
+        self.check(value, (), errors)
+        return errors
+
+    def compile(self, schema: Dict) -> Callable[[Any, tuple, List], None]:
+        checks = []
+
+        if "type" in schema:
+            names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            type_checks = [self.TYPES[name] for name in names]
+            expected = "|".join(names)
+
+            def check_type(value, path, errors):
+                if not any(check(value) for check in type_checks):
+                    errors.append((path, f"expected {expected}, got {type(value).__name__}"))
+                    return False
+                return True
+            checks.append(check_type)
+
+        if "enum" in schema:
+            allowed = set(schema["enum"])
+
+            def check_enum(value, path, errors):
+                if value not in allowed:
+                    errors.append((path, f"{value!r} is not one of {sorted(allowed)}"))
+                    return False
+                return True
+            checks.append(check_enum)
+
+        if "minimum" in schema or "maximum" in schema:
+            low, high = schema.get("minimum"), schema.get("maximum")
+
+            def check_range(value, path, errors):
+                if isinstance(value, (int, float)) and ((low is not None and value < low) or
+                                                        (high is not None and value > high)):
+                    errors.append((path, f"{value} is outside [{low}, {high}]"))
+                    return False
+                return True
+            checks.append(check_range)
+
+        if "properties" in schema or "required" in schema or "additionalProperties" in schema:
+            properties = {key: self.compile(sub) for key, sub in schema.get("properties", {}).items()}
+            required = list(schema.get("required", ()))
+            extra = schema.get("additionalProperties")
+            extra_check = self.compile(extra) if isinstance(extra, dict) else None
+
+            def check_object(value, path, errors):
+                if not isinstance(value, dict):
+                    return True
+                for key in required:
+                    if key not in value:
+                        errors.append((path + (key,), "is required"))
+                for key, item in value.items():
+                    check = properties.get(key, extra_check)
+                    if check is not None:
+                        check(item, path + (key,), errors)
+                return True
+            checks.append(check_object)
+
+        if "items" in schema:
+            item_check = self.compile(schema["items"])
+
+            def check_items(value, path, errors):
+                if isinstance(value, list):
+                    for index, item in enumerate(value):
+                        item_check(item, path + (index,), errors)
+                return True
+            checks.append(check_items)
+
+        def check(value, path, errors):
+            for step in checks:
+                if not step(value, path, errors):
+                    return
+        return check
+
+
+def drop_invalid(value: Any, errors: List[Tuple[tuple, str]]) -> Any:
+    """Remove what each error points at - the innermost list element on its path,
+    or else the key itself - keeping the valid rest; None if the root is invalid"""
+    cuts = set()
+    for path, _ in errors:
+        if not path:
+            return None
+        indexes = [i for i, step in enumerate(path) if isinstance(step, int)]
+        cuts.add(path[:indexes[-1] + 1] if indexes else path)
+
+    for cut in sorted(cuts, reverse=True):
+        parent = value
+        try:
+            for step in cut[:-1]:
+                parent = parent[step]
+            del parent[cut[-1]]
+        except (KeyError, IndexError, TypeError):
+            continue
+    return value
+
+
+def parse_json_object(text: str, schema: Optional[CompiledSchema] = None) -> Tuple[Optional[Dict], List[Tuple[tuple, str]]]:
+    """First JSON object in model output, repaired if need be, with its schema errors
+
+    Candidates are tried in order; the first that parses and validates wins,
+    otherwise the first that parses at all is returned with its errors.
+    (None, []) means no object could be read.
+    """
+    fallback = None
+    for candidate in iter_json_objects(strip_thinking(text)):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            try:
+                value = json.loads(repair_json(candidate))
+            except json.JSONDecodeError:
+                continue
+        errors = schema.errors(value) if schema is not None else []
+        if not errors:
+            return value, []
+        if fallback is None:
+            fallback = (value, errors)
+    return fallback if fallback is not None else (None, [])
+
+
+def structured_output(name: str, schema: Dict) -> Dict:
+    """response_format for a schema-constrained completion
+
+    Ollama's OpenAI-compatible endpoint maps this onto its format option,
+    so decoding can only produce JSON matching the schema.
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
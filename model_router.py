@@ -0,0 +1,138 @@
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+WORD = re.compile(r"[^\W\d_][\w'-]*")
+# Commas, semicolons and subordinating words each add a clause to untangle
+CLAUSE_MARKER = re.compile(
+    r"[,;:]|\b(?:because|although|though|while|whereas|which|who|whom|whose|unless|until|since|but|however)\b",
+    re.IGNORECASE
+)
+NUMBER = re.compile(r"\d+")
+
+
+def complexity(text: str) -> float:
+    """Cheap 0-1 estimate of how hard an input is to extract from
+
+    Blends length, clause count and how many names and numbers it carries,
+    which is what the small models get wrong first.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return 0.0
+    clauses = len(CLAUSE_MARKER.findall(text))
+    specifics = sum(1 for word in words[1:] if word[0].isupper() and word != "I") + len(NUMBER.findall(text))
+    return round(0.5 * min(1.0, len(words) / 60) + 0.3 * min(1.0, clauses / 6) + 0.2 * min(1.0, specifics / 6), 3)
+
+
+class ModelRouter:
+    """Picks a model tier per input from available_models, smallest first
+
+    The starting tier follows the input's complexity. Tiers whose rolling
+    parse-success rate has fallen below min_success_rate are skipped, and
+    with latency_budget set a tier that has been running over it hands
+    simple-enough inputs one tier down. After a call, an unparsable answer
+    (or an empty one on a non-trivial input) escalates to the next tier.
+    Every decision is kept in decisions and, with log_file, appended to it
+    as a JSON line for tuning the thresholds.
+    """
+
+    def __init__(self, tiers: Sequence[str], thresholds: Sequence[float] = (0.4, 0.7),
+                 window: int = 50, min_samples: int = 5, min_success_rate: float = 0.7,
+                 latency_budget: Optional[float] = None, empty_escalation_complexity: float = 0.2,
+                 log_file: Optional[str] = None, max_decisions: int = 1000):
+        self.tiers = list(tiers)
+        self.thresholds = list(thresholds)
+        self.window = window
+        self.min_samples = min_samples
+        self.min_success_rate = min_success_rate
+        self.latency_budget = latency_budget
+        self.empty_escalation_complexity = empty_escalation_complexity
+        self.log_file = log_file
+        # tier -> recent (latency seconds, success) outcomes
+        self.outcomes: Dict[str, deque] = {tier: deque(maxlen=window) for tier in self.tiers}
+        self.calls = {tier: 0 for tier in self.tiers}
+        self.decisions = deque(maxlen=max_decisions)
+        self._lock = threading.Lock()
+
+    def success_rate(self, tier: str) -> Optional[float]:
+        """Rolling parse-success rate, None until min_samples calls have been seen"""
+        outcomes = self.outcomes[tier]
+        if len(outcomes) < self.min_samples:
+            return None
+        return sum(1 for _, success in outcomes if success) / len(outcomes)
+
+    def mean_latency(self, tier: str) -> Optional[float]:
+        outcomes = self.outcomes[tier]
+        if len(outcomes) < self.min_samples:
+            return None
+        return sum(latency for latency, _ in outcomes) / len(outcomes)
+
+    def reliable(self, tier: str) -> bool:
+        rate = self.success_rate(tier)
+        return rate is None or rate >= self.min_success_rate
+
+    def choose(self, user_input: str) -> str:
+        score = complexity(user_input)
+        with self._lock:
+            base = min(sum(1 for threshold in self.thresholds if score >= threshold), len(self.tiers) - 1)
+            tier = base
+            reasons = [f"complexity {score}"]
+
+            while tier < len(self.tiers) - 1 and not self.reliable(self.tiers[tier]):
+                reasons.append(f"{self.tiers[tier]} success rate {self.success_rate(self.tiers[tier]):.2f}")
+                tier += 1
+
+            if self.latency_budget is not None and tier == base and tier > 0:
+                latency = self.mean_latency(self.tiers[tier])
+                if latency is not None and latency > self.latency_budget and self.reliable(self.tiers[tier - 1]):
+                    reasons.append(f"{self.tiers[tier]} latency {latency:.2f}s over budget")
+                    tier -= 1
+
+            chosen = self.tiers[tier]
+            self.calls[chosen] += 1
+        self.log({"event": "route", "tier": chosen, "complexity": score,
+                  "words": len(WORD.findall(user_input)), "reason": "; ".join(reasons)})
+        return chosen
+
+    def record(self, tier: str, latency: float, success: bool):
+        with self._lock:
+            self.outcomes[tier].append((latency, success))
+
+    def escalate(self, tier: str, user_input: str, outcome: str) -> Optional[str]:
+        """Tier to retry on after outcome ("ok", "empty" or "unparsable"), or None to keep the answer"""
+        if outcome == "ok" or self.tiers.index(tier) == len(self.tiers) - 1:
+            return None
+        score = complexity(user_input)
+        if outcome == "empty" and score < self.empty_escalation_complexity:
+            return None  # probably nothing to extract
+        next_tier = self.tiers[self.tiers.index(tier) + 1]
+        with self._lock:
+            self.calls[next_tier] += 1
+        self.log({"event": "escalate", "tier": next_tier, "from": tier, "complexity": score, "reason": outcome})
+        return next_tier
+
+    def log(self, decision: Dict):
+        decision = {"ts": time.time(), **decision}
+        self.decisions.append(decision)
+        if self.log_file:
+            with self._lock, open(self.log_file, 'a') as f:
+                f.write(json.dumps(decision) + "\n")
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-tier call counts and rolling latency/success, for stats output"""
+        with self._lock:
+            return {
+                tier: {
+                    "calls": self.calls[tier],
+                    "mean_latency_seconds": round(self.mean_latency(tier), 3) if self.mean_latency(tier) is not None else None,
+                    "success_rate": round(self.success_rate(tier), 3) if self.success_rate(tier) is not None else None
+                }
+                for tier in self.tiers
+            }
+
+    def recent_decisions(self, limit: int = 20) -> List[Dict]:
+        return list(self.decisions)[-limit:]
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# Connection pool shared by every async extractor/analyzer on an event loop
+ASYNC_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+ASYNC_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+
+# Connection pool shared by every synchronous extractor/analyzer in the process.
+# Ollama serves a handful of parallel requests per model, so a small pool with
+# long-lived keep-alive connections beats opening one per call
+SYNC_POOL_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=16, keepalive_expiry=300.0)
+SYNC_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+# Preloads fetch weights from disk, which takes far longer than a generation
+PRELOAD_TIMEOUT = httpx.Timeout(300.0, connect=5.0)
+
+# How long Ollama keeps a preloaded model in memory after the preload
+DEFAULT_KEEP_ALIVE = "30m"
+
+_async_clients = weakref.WeakKeyDictionary()
+_connections: Dict[str, "OllamaConnection"] = {}
+_connections_lock = threading.Lock()
+
+
+def get_async_client(ollama_host: str = "http://localhost:11434") -> AsyncOpenAI:
+    """Shared AsyncOpenAI client for the running event loop and Ollama host
+
+    httpx connections belong to the loop that opened them, so clients are
+    cached per loop and dropped with it.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if ollama_host not in clients:
+        clients[ollama_host] = AsyncOpenAI(
+            base_url=f"{ollama_host}/v1",
+            api_key="ollama",  # Required but unused for Ollama
+            http_client=httpx.AsyncClient(limits=ASYNC_POOL_LIMITS, timeout=ASYNC_TIMEOUT)
+        )
+    return clients[ollama_host]
+
+
+class RequestCoalescer:
+    """Lets identical concurrent requests share one generation
+
+    The first caller for a key runs the call; callers that arrive with the
+    same key while it is in flight wait for it and get its result (or its
+    exception) instead of sending their own request. Nothing is kept once
+    the call finishes - that is ResponseCache's job.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[str, Future] = {}
+        self.async_inflight = weakref.WeakKeyDictionary()  # event loop -> {key: task}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def run(self, key: str, call: Callable[[], str]) -> str:
+        with self._lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self.inflight[key]
+
+    async def arun(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        """run for coroutines; requests are shared among callers on the same event loop"""
+        loop = asyncio.get_running_loop()
+        tasks = self.async_inflight.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = loop.create_task(call())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        else:
+            with self._lock:
+                self.coalesced += 1
+        # One caller being cancelled must not cancel the others' request
+        return await asyncio.shield(task)
+
+
+class OllamaConnection:
+    """One Ollama host's pooled client, shared by every extractor and analyzer in the process
+
+    Wraps an OpenAI client over a tuned httpx connection pool and adds
+    what the OpenAI API lacks: a cheap health check against /v1/models
+    instead of a throwaway generation, explicit model preloading through
+    Ollama's native /api/generate with keep_alive, so a cold load happens
+    at setup rather than on the first real request, and coalescing of
+    identical in-flight requests.
+    """
+
+    def __init__(self, ollama_host: str = "http://localhost:11434", limits: httpx.Limits = SYNC_POOL_LIMITS,
+                 timeout: httpx.Timeout = SYNC_TIMEOUT):
+        self.ollama_host = ollama_host
+        self.http = httpx.Client(limits=limits, timeout=timeout)
+        self.client = OpenAI(
+            base_url=f"{ollama_host}/v1",
+            api_key="ollama",  # Required but unused for Ollama
+            http_client=self.http
+        )
+        self.coalescer = RequestCoalescer()
+        self.preloaded: Set[str] = set()
+
+    def installed_models(self) -> Set[str]:
+        """IDs of the models the server has pulled; raises if it cannot be reached"""
+        return {model.id for model in self.client.models.list()}
+
+    def has_model(self, model_id: str) -> bool:
+        installed = self.installed_models()
+        return model_id in installed or (":" not in model_id and f"{model_id}:latest" in installed)
+
+    def preload(self, model_id: str, keep_alive: str = DEFAULT_KEEP_ALIVE) -> bool:
+        """Load a model into memory now and keep it resident for keep_alive
+
+        Ollama loads a model when a generate request names it without a
+        prompt. Later OpenAI-compatible requests renew residency for the
+        server's own OLLAMA_KEEP_ALIVE, so set that too for long idle gaps.
+        Servers that only speak the OpenAI API reject the call, which is
+        reported as False and otherwise harmless.
+        """
+        try:
+            response = self.http.post(f"{self.ollama_host}/api/generate", timeout=PRELOAD_TIMEOUT,
+                                      json={"model": model_id, "keep_alive": keep_alive, "stream": False})
+            response.raise_for_status()
+        except httpx.HTTPError:
+            return False
+        self.preloaded.add(model_id)
+        return True
+
+    def close(self):
+        self.http.close()
+
+
+def get_connection(ollama_host: str = "http://localhost:11434") -> OllamaConnection:
+    """Shared OllamaConnection for a host, created on first use"""
+    with _connections_lock:
+        if ollama_host not in _connections:
+            _connections[ollama_host] = OllamaConnection(ollama_host)
+        return _connections[ollama_host]
+
+
+class ResponseCache:
+    """LRU cache of model responses keyed on (model_id, prompt hash)
+
+    Runs of whitespace in prompts are collapsed before hashing so inputs
+    differing only in spacing share an entry; case is kept, since it can
+    change what the model extracts (names, "May" vs "may"). With
+    cache_file set, entries are appended to a JSON-lines file and reloaded
+    (newest max_size) on startup.
+    """
+
+    def __init__(self, max_size: int = 256, cache_file: Optional[str] = None):
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if cache_file and os.path.exists(cache_file):
+            self.load()
+
+    @staticmethod
+    def make_key(model_id: str, messages: List[Dict], max_tokens: int, namespace: str = "") -> str:
+        """Cache key; callers sharing a cache but not their data (tenants) pass distinct namespaces"""
+        prompt = "\n".join(f"{m['role']}:{' '.join(str(m['content']).split())}" for m in messages)
+        scope = f"{namespace}\n" if namespace else ""
+        prompt_hash = hashlib.sha256(f"{scope}{max_tokens}\n{prompt}".encode()).hexdigest()
+        return f"{model_id}:{prompt_hash}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            response = self.entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            if self.cache_file:
+                with open(self.cache_file, 'a') as f:
+                    f.write(json.dumps({"key": key, "response": response}) + "\n")
+
+    def load(self):
+        """Reload persisted entries, rewriting the file once it holds mostly evicted ones"""
+        lines = 0
+        with open(self.cache_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                lines += 1
+                self.entries[record["key"]] = record["response"]
+                self.entries.move_to_end(record["key"])
+                if len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+
+        if lines > 2 * max(self.max_size, 1):
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                for key, response in self.entries.items():
+                    f.write(json.dumps({"key": key, "response": response}) + "\n")
+            os.replace(tmp_file, self.cache_file)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,137 @@
+import re
+from typing import Dict, List, Optional
+
+# Pieces a BPE tokenizer rarely merges across: letter runs, 1-3 digit
+# groups, single punctuation marks and newline runs
+TOKEN_PIECE = re.compile(r"[^\W\d_]+|\d{1,3}|\n+|[^\w\s]|_")
+# Letter runs longer than this split into extra tokens, one per this many characters
+CHARS_PER_WORD_TOKEN = 6
+LONG_WORD = re.compile(r"[^\W\d_]{7,}")
+# Chat templates wrap every message in role markers
+MESSAGE_OVERHEAD = 4
+
+# Prompt tokens allowed when the model entry doesn't set prompt_budget
+DEFAULT_PROMPT_BUDGET = 2048
+
+# How context items are ranked against each other; each signal is in [0, 1]
+PRIORITY_WEIGHTS = {"relevance": 0.5, "confidence": 0.3, "recency": 0.2}
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count for Llama/Qwen-style BPE vocabularies
+
+    Common words count as one token and long or rare words as one per few
+    characters. It needs no vocabulary file and costs a couple of regex
+    passes, cheap enough to run on every candidate context item.
+    """
+    text = str(text)
+    extra = sum((len(word) - 1) // CHARS_PER_WORD_TOKEN for word in LONG_WORD.findall(text))
+    return len(TOKEN_PIECE.findall(text)) + extra
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Approximate prompt tokens for a chat completion request"""
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest word-boundary prefix of text within max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def priority(relevance: float = 0.0, confidence: float = 0.0, recency: float = 0.0,
+             weights: Optional[Dict[str, float]] = None) -> float:
+    weights = weights or PRIORITY_WEIGHTS
+    return weights["relevance"] * relevance + weights["confidence"] * confidence + weights["recency"] * recency
+
+
+def rank_score(rank: int, count: int) -> float:
+    """1.0 for the best of count ranked items down to 0.5 for the worst"""
+    return 1.0 - 0.5 * rank / max(1, count - 1) if count > 1 else 1.0
+
+
+def recency_scores(timestamps: List[Optional[str]]) -> List[float]:
+    """Per-timestamp recency in [0, 1] by rank, newest 1.0 (str(datetime) values sort chronologically)"""
+    order = sorted(range(len(timestamps)), key=lambda i: timestamps[i] or "")
+    scores = [0.0] * len(timestamps)
+    for rank, i in enumerate(order, 1):
+        scores[i] = rank / len(timestamps)
+    return scores
+
+
+class PromptBudget:
+    """Context sections filled with the highest-priority items that fit a token budget
+
+    Sections are declared in display order; items are added with a
+    priority and kept greedily, best first, while they still fit. Kept
+    items are rendered in the order they were added, so a section that was
+    ranked by relevance reads in relevance order.
+    """
+
+    def __init__(self, max_tokens: Optional[int]):
+        self.max_tokens = max(0, max_tokens) if max_tokens is not None else None  # None: no limit
+        self.sections: Dict[str, tuple] = {}  # name -> (header, separator)
+        self.items: List[tuple] = []           # (priority, order, section, text)
+        self.used_tokens = 0
+
+    def section(self, name: str, header: str, separator: str = "; "):
+        self.sections[name] = (header, separator)
+
+    def add(self, section: str, text: str, priority: float = 0.0):
+        self.items.append((priority, len(self.items), section, text))
+
+    def select(self) -> Dict[str, List[str]]:
+        """Section -> kept item texts, in insertion order"""
+        remaining = self.max_tokens if self.max_tokens is not None else float("inf")
+        opened = set()
+        kept = []
+        for item_priority, order, section, text in sorted(self.items, key=lambda item: (-item[0], item[1])):
+            header, separator = self.sections[section]
+            cost = count_tokens(text) + (count_tokens(separator) if section in opened else count_tokens(header) + 1)
+            if cost <= remaining:
+                remaining -= cost
+                opened.add(section)
+                kept.append((order, section, text))
+
+        selected = {name: [] for name in self.sections}
+        for _, section, text in sorted(kept):
+            selected[section].append(text)
+        return selected
+
+    def render(self, empty: str = "") -> str:
+        parts = []
+        for name, texts in self.select().items():
+            if texts:
+                header, separator = self.sections[name]
+                parts.append(header + separator.join(texts))
+        rendered = "\n".join(parts) if parts else empty
+        self.used_tokens = count_tokens(rendered)
+        return rendered
+
+
+def fit_context(text: str, max_tokens: int, empty: str = "") -> str:
+    """Trim "Header: item; item" context lines to max_tokens, earlier lines and items first"""
+    budget = PromptBudget(max_tokens)
+    lines = [line for line in text.splitlines() if line.strip()]
+    for line_number, line in enumerate(lines):
+        header, _, body = line.partition(": ")
+        if not body:
+            header, body = "", line
+        else:
+            header += ": "
+        separator = "; " if "; " in body else ", "
+        items = body.split(separator)
+        budget.section(str(line_number), header, separator)
+        for rank, item in enumerate(items):
+            budget.add(str(line_number), item, 1.0 - line_number / len(lines) - rank / (len(items) * len(lines)))
+    return budget.render(empty)
@@ -0,0 +1,99 @@
+import re
+from typing import Dict, List, Optional
+
+# A value is a short phrase without connectives - anything richer goes to the model
+# Time words say when, not what ("I'm a mess today", "I work at home now")
+TIME = r"(?:now|today|tonight|tomorrow|yesterday|anymore|lately|currently|nowadays|again)"
+WORD = rf"(?!(?:at|in|for|with|about|who|which|that|because|but|since|when|where|if|so|to|{TIME})\b)[\w'&-]+"
+# "My name is not important", "I live in fear of exams" are not facts about a value
+VALUE = rf"(?!(?:not|no|never|nothing|home|fear)\b)(?P<value>{WORD}(?:\s+{WORD}){{0,4}})"
+# Names, employers and places must be capitalized; lowercase ones are left to the model
+PROPER = rf"(?=(?-i:[A-Z])){VALUE}"
+# "I'm a little worried", "I'm a bit tired" describe a mood, not what the user is
+KIND = rf"(?!(?:little|bit|lot|tad|few|couple|kind|sort)\b){VALUE}"
+# "I like you", "I love your idea" are about the conversation, not an interest
+THING = rf"(?!(?:you|me|him|her|us|them|it|this|that|these|those|your|his|their|its|our|my)\b){VALUE}"
+
+# (pattern, predicate, category, named entity type)
+FACT_PATTERNS = [
+    (rf"(?:my name is|my name's|call me|i am called|i'm called) {PROPER}", "name", "identity", "people"),
+    (r"i(?: am|'m) (?P<value>\d{1,3}) (?:years old|year old|yrs old|yo)", "age", "identity", None),
+    (rf"i(?: live| reside| am based|'m based) in {PROPER}", "lives_in", "demographics", "places"),
+    (rf"i(?: am|'m) from {PROPER}", "from", "demographics", "places"),
+    (rf"i work (?:at|for) {PROPER}", "works_at", "professional", "organizations"),
+    (rf"i (?:study|studied) at {PROPER}", "studies_at", "demographics", "organizations"),
+    (rf"i(?: am|'m) (?:a|an) {KIND}", "is_a", "identity", None),
+    (rf"my (?:favorite|favourite) (?P<thing>\w+(?:\s\w+)?) is {VALUE}", "favorite", "interests", None),
+    (rf"i (?:really )?(?:like|love|enjoy) {THING}", "likes", "interests", None),
+]
+
+# Clauses with nothing to extract
+FILLER_PATTERN = re.compile(
+    r"(?:(?:hi|hello|hey)(?: there)?|yo|good (?:morning|afternoon|evening|night)|thanks?(?: you)?(?: so much| a lot)?|thx|"
+    r"ok(?:ay)?|cool|nice|great|sure|yes|yeah|yep|no|nope|lol|ha(?:ha)+|bye|goodbye|see you|"
+    r"how are you(?: doing)?(?: today)?|what's up|sup|hmm+|sounds good|got it)",
+    re.IGNORECASE
+)
+
+CLAUSE_SPLIT = re.compile(r"[.!?;]+|,\s*|\s+and\s+", re.IGNORECASE)
+
+
+class RuleBasedExtractor:
+    """Deterministic first tier in front of the LLM extractor
+
+    An input is only resolved here when every clause in it is either a
+    high-confidence fact pattern or filler; anything else goes to the model.
+    """
+
+    def __init__(self, confidence: float = 0.95):
+        self.confidence = confidence
+        self.patterns = [(re.compile(pattern, re.IGNORECASE), predicate, category, entity_type)
+                         for pattern, predicate, category, entity_type in FACT_PATTERNS]
+
+    @staticmethod
+    def split_clauses(user_input: str) -> List[str]:
+        return [clause.strip(" '\"") for clause in CLAUSE_SPLIT.split(user_input) if clause.strip(" '\"")]
+
+    def match_clause(self, clause: str) -> Optional[Dict]:
+        for pattern, predicate, category, entity_type in self.patterns:
+            match = pattern.fullmatch(clause)
+            if match:
+                fields = match.groupdict()
+                if fields.get("thing"):
+                    predicate = f"favorite_{fields['thing'].lower().replace(' ', '_')}"
+                return {
+                    "subject": "User",
+                    "predicate": predicate,
+                    "object": fields["value"],
+                    "category": category,
+                    "confidence": self.confidence,
+                    "entity_type": entity_type
+                }
+        return None
+
+    def extract(self, user_input: str) -> Optional[Dict]:
+        """Extraction in the LLM JSON shape, {} for chit-chat, or None when the model is needed"""
+        clauses = self.split_clauses(user_input)
+        if not clauses:
+            return {}
+
+        triplets = []
+        named_entities = {}
+        for clause in clauses:
+            if FILLER_PATTERN.fullmatch(clause):
+                continue
+            fact = self.match_clause(clause)
+            if fact is None:
+                return None
+            entity_type = fact.pop("entity_type")
+            if entity_type:
+                named_entities.setdefault(entity_type, []).append(fact["object"])
+            triplets.append(fact)
+
+        if not triplets:
+            return {}
+        return {
+            "triplets": triplets,
+            "named_entities": named_entities,
+            "topics_mentioned": []
+        }
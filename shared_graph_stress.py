@@ -0,0 +1,94 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict
+
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def worker(kg_file: str, worker_id: int, inputs: int, llm_latency: float, compact_every: int):
+    """One process ingesting its own facts into the shared graph, saving after each input"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor = UltraKnowledgeExtractor(kg_file=kg_file, shared=True, compact_every=compact_every,
+                                            response_cache_size=0)
+        for i in range(inputs):
+            time.sleep(llm_latency)  # stands in for the model call, which runs outside the lock
+            extractor.integrate_extracted_knowledge({
+                "triplets": [
+                    {"subject": "User", "predicate": f"fact_{worker_id}", "object": f"value {i}",
+                     "category": "experiences", "confidence": 0.9},
+                    # Shared by every worker - must merge, not duplicate
+                    {"subject": "User", "predicate": "uses", "object": "the shared graph",
+                     "category": "technology", "confidence": 0.8}
+                ],
+                "named_entities": {"concepts": [f"worker {worker_id}"]}
+            }, f"worker {worker_id} input {i}")
+            extractor.kg["analytics"]["extraction_stats"]["successful_extractions"] += 1
+            extractor.save_knowledge_graph()
+
+
+def run(workers: int, inputs: int, llm_latency: float, compact_every: int, workdir: str) -> Dict:
+    """Run one stress round and check nothing was lost"""
+    kg_file = os.path.join(workdir, f"stress_{workers}.json")
+    processes = [multiprocessing.Process(target=worker, args=(kg_file, w, inputs, llm_latency, compact_every))
+                 for w in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor = UltraKnowledgeExtractor(kg_file=kg_file, shared=True, response_cache_size=0)
+    shared = extractor.kg["triplets"].find(extractor.generate_triplet_id(
+        {"subject": "User", "predicate": "uses", "object": "the shared graph"}))
+    stats = extractor.kg["analytics"]["extraction_stats"]
+    expected = workers * inputs
+    result = {
+        "workers": workers,
+        "inputs": expected,
+        "seconds": round(elapsed, 3),
+        "inputs_per_second": round(expected / elapsed, 1),
+        "triplets": len(extractor.kg["triplets"]),
+        "shared_triplet_seen_count": shared["seen_count"] if shared else 0,
+        "total_inputs_processed": extractor.kg["meta"]["total_inputs_processed"],
+        "successful_extractions": stats["successful_extractions"],
+        "entity_mentions": sum(extractor.kg["conversation_metadata"]["entity_mentions"].values()),
+        "worker_exit_codes": [process.exitcode for process in processes]
+    }
+    result["ok"] = (
+        result["triplets"] == expected + 1
+        and result["shared_triplet_seen_count"] == expected
+        and result["total_inputs_processed"] == expected
+        and result["successful_extractions"] == expected
+        and result["entity_mentions"] == expected
+        and not any(result["worker_exit_codes"])
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spawn N processes writing one shared knowledge graph")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--inputs", type=int, default=50, help="inputs per worker")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="simulated seconds per model call")
+    parser.add_argument("--compact-every", type=int, default=100)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for workers in args.workers:
+            results.append(run(workers, args.inputs, args.llm_latency, args.compact_every, workdir))
+    print(json.dumps(results, indent=2))
+    if not all(result["ok"] for result in results):
+        raise SystemExit("❌ Shared graph lost updates")
+
+
+if __name__ == "__main__":
+    main()
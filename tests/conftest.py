@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def extraction(i: int, person: str = "Alex") -> dict:
+    """Extraction data as the model returns it, distinct per i"""
+    return {
+        "triplets": [
+            {"subject": "User", "predicate": f"likes_{i}", "object": f"hobby {i}", "category": "interests",
+             "confidence": 0.9}
+        ],
+        "named_entities": {"people": [person], "places": [], "organizations": []},
+        "topics_mentioned": [f"topic {i}"]
+    }
+
+
+@pytest.fixture
+def kg_file(tmp_path):
+    return str(tmp_path / "graph.json")
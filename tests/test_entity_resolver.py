@@ -0,0 +1,78 @@
+from entity_resolver import EntityResolver, normalize_entity
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def test_possessives_are_stripped_but_articles_are_kept():
+    assert normalize_entity("my Mother's") == "mother"
+    assert normalize_entity("our  dog.") == "dog"
+    assert normalize_entity("The Hague") == "the hague"
+    assert normalize_entity("A Tribe Called Quest") == "a tribe called quest"
+
+
+def test_relation_synonyms_resolve_to_one_entity():
+    resolver = EntityResolver({})
+    mom = resolver.resolve("Mom", "people")
+    assert resolver.resolve("my mother", "people") == mom
+    assert resolver.resolve("mum") == mom
+
+
+def test_two_letter_words_are_not_relation_synonyms():
+    resolver = EntityResolver({})
+    mom = resolver.resolve("Mom", "people")
+    dad = resolver.resolve("Dad", "people")
+    assert resolver.resolve("Ma", "places") not in (mom, dad)
+    assert resolver.resolve("PA", "places") not in (mom, dad)
+
+
+def test_near_miss_of_the_same_type_is_merged():
+    resolver = EntityResolver({})
+    jonathan = resolver.resolve("Jonathan", "people")
+    assert resolver.resolve("Jonathon", "people") == jonathan
+    assert resolver.proposals == []
+
+
+def test_near_miss_of_another_type_is_only_proposed():
+    resolver = EntityResolver({})
+    resolver.resolve("Paris", "places")
+    assert resolver.resolve("Parisa", "people") == "Parisa"
+    assert resolver.proposals == [{"mention": "Parisa", "candidate": "Paris", "score": 0.909}]
+    # Seen again, it is the entity it was registered as, and not proposed twice
+    assert resolver.resolve("Parisa", "people") == "Parisa"
+    assert len(resolver.proposals) == 1
+
+
+def test_untyped_near_miss_is_only_proposed():
+    resolver = EntityResolver({})
+    resolver.resolve("Jonathan", "people")
+    assert resolver.resolve("Jonathon") == "Jonathon"
+    assert resolver.proposals[0]["candidate"] == "Jonathan"
+
+
+def test_existing_entity_is_never_folded_into_a_near_miss():
+    resolver = EntityResolver({}, entity_types={"Jonathan": {"people"}, "Jonathon": {"people"}})
+    resolver.resolve("Jonathan", "people")
+    assert resolver.resolve("Jonathon", "people") == "Jonathon"
+    assert len(resolver.proposals) == 1
+
+
+def test_merge_settles_its_proposal():
+    resolver = EntityResolver({})
+    resolver.resolve("Jonathan", "people")
+    resolver.resolve("Jonathon")
+    resolver.merge(["Jonathon"], "Jonathan")
+    assert resolver.resolve("Jonathon") == "Jonathan"
+    assert resolver.proposals == []
+
+
+def test_proposals_persist_with_the_graph(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    extractor.integrate_extracted_knowledge({"named_entities": {"places": ["Paris"]}}, "I visited Paris")
+    extractor.integrate_extracted_knowledge({"named_entities": {"people": ["Parisa"]}}, "Parisa called")
+    extractor.persist_knowledge_graph()
+
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    assert reloaded.kg["entity_merge_proposals"] == [{"mention": "Parisa", "candidate": "Paris", "score": 0.909}]
+    assert set(reloaded.kg["named_entities"]["people"]) == {"Parisa"}
+
+    reloaded.merge_entities(["Parisa"], "Paris")
+    assert reloaded.kg["entity_merge_proposals"] == []
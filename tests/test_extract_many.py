@@ -0,0 +1,58 @@
+import json
+import random
+import re
+import threading
+import time
+
+from conftest import extraction
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+NOTE = re.compile(r"note (\d+)")
+
+
+def batch_extractor(kg_file, **kwargs):
+    """Extractor whose model answers each note after a random delay, tracking peak concurrency"""
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0, **kwargs)
+    rng = random.Random(3)
+    lock = threading.Lock()
+    calls = {"running": 0, "peak": 0}
+
+    def generate(messages, max_tokens=800, on_triplet=None, model=None, cache=True):
+        with lock:
+            calls["running"] += 1
+            calls["peak"] = max(calls["peak"], calls["running"])
+            delay = rng.uniform(0, 0.02)
+        time.sleep(delay)
+        with lock:
+            calls["running"] -= 1
+        return json.dumps(extraction(int(NOTE.findall(messages[-1]["content"])[-1])))
+
+    extractor.generate_with_model = generate
+    return extractor, calls
+
+
+def inputs(count):
+    return [f"Over the weekend I spent hours on a hobby that I keep coming back to, note {i}" for i in range(count)]
+
+
+def test_results_and_integration_follow_input_order(kg_file):
+    extractor, calls = batch_extractor(kg_file)
+    batch = extractor.extract_many(inputs(12), concurrency=4)
+
+    assert [result["input_index"] for result in batch["results"]] == list(range(12))
+    assert batch["successful_inputs"] == 12
+    assert [t["object"] for t in extractor.kg["triplets"]] == [f"hobby {i}" for i in range(12)]
+    assert 1 < calls["peak"] <= 4
+    assert extractor.kg["meta"]["total_inputs_processed"] == 12
+
+
+def test_checkpoints_save_progress(kg_file):
+    extractor, _ = batch_extractor(kg_file)
+    saves = []
+    save = extractor.save_knowledge_graph
+    extractor.save_knowledge_graph = lambda inputs=1: (saves.append(inputs), save(inputs))
+    extractor.extract_many(inputs(7), concurrency=3, checkpoint_every=3)
+
+    assert saves == [3, 3, 1]
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    assert len(reloaded.kg["triplets"]) == 7
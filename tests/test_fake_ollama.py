@@ -0,0 +1,31 @@
+import json
+
+from benchmark import sample_inputs
+from fake_ollama import extraction_response
+
+
+def extract(text):
+    return json.loads(extraction_response([{"role": "user", "content": f'The user says: "{text}"'}]))
+
+
+def facts(text):
+    return {(t["subject"], t["predicate"], t["object"]) for t in extract(text)["triplets"]}
+
+
+def test_every_input_adds_new_facts_and_some_repeat():
+    inputs = sample_inputs(30)
+    per_input = [facts(text) for text in inputs]
+    seen = set()
+    for found in per_input:
+        assert found - seen
+        seen |= found
+    assert len(seen) < sum(len(found) for found in per_input)
+
+
+def test_inputs_without_a_note_tag_differ_by_text():
+    assert facts("I went hiking with Priya today") != facts("I went hiking with Priya yesterday")
+    assert facts("I went hiking with Priya today") == facts("I went hiking with Priya today")
+
+
+def test_people_exclude_the_sentence_start():
+    assert extract("Yesterday Alex and I cooked")["named_entities"]["people"] == ["Alex"]
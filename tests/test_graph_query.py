@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from graph_query import AdjacencyIndex
+from knowledge_graph_store import SQLiteKnowledgeStore
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+FACTS = [
+    ("User", "sister", "Alex"),
+    ("Alex", "lives_in", "New York"),
+    ("Alex", "works_at", "Acme"),
+    ("Sam", "works_at", "Acme"),
+    ("Acme", "based_in", "new  york"),
+    ("Priya", "likes", "jazz"),
+]
+
+
+@pytest.fixture(params=["memory", "store"])
+def graph(request, tmp_path):
+    store = SQLiteKnowledgeStore(str(tmp_path / "graph.db")) if request.param == "store" else None
+    extractor = UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"), store=store, response_cache_size=0)
+    triplets = [{"subject": s, "predicate": p, "object": o, "category": "social", "confidence": 0.9}
+                for s, p, o in FACTS]
+    extractor.integrate_extracted_knowledge({"triplets": triplets}, "facts")
+    yield extractor
+    extractor.close()
+
+
+def facts(triplets):
+    return [(t["subject"], t["predicate"], t["object"]) for t in triplets]
+
+
+def test_neighbors_follow_direction_and_predicate(graph):
+    assert facts(graph.neighbors("alex", "out")) == [FACTS[1], FACTS[2]]
+    assert facts(graph.neighbors("Alex", "in")) == [FACTS[0]]
+    assert facts(graph.neighbors("Alex")) == [FACTS[1], FACTS[2], FACTS[0]]
+    assert facts(graph.neighbors("Alex", predicate="works_at")) == [FACTS[2]]
+    assert graph.neighbors("Nobody") == []
+
+
+def test_k_hop_distances(graph):
+    assert graph.k_hop("User", k=2) == {"User": 0, "Alex": 1, "New York": 2, "Acme": 2}
+    assert graph.k_hop("User", k=3) == {"User": 0, "Alex": 1, "New York": 2, "Acme": 2, "Sam": 3}
+
+
+def test_path_is_a_shortest_path_in_either_direction(graph):
+    assert facts(graph.path("Sam", "New York")) == [FACTS[3], FACTS[4]]
+    assert facts(graph.path("User", "Sam")) == [FACTS[0], FACTS[2], FACTS[3]]
+    assert graph.path("User", "user") == []
+    assert graph.path("User", "jazz") is None
+    assert graph.path("User", "Sam", max_depth=2) is None
+
+
+def test_match_combines_constraints(graph):
+    assert facts(graph.match(predicate="works_at")) == [FACTS[2], FACTS[3]]
+    assert facts(graph.match(predicate="works_at", obj="acme", subject="SAM")) == [FACTS[3]]
+    assert facts(graph.match(obj="New York")) == [FACTS[1], FACTS[4]]
+    assert graph.match(subject="Sam", predicate="likes") == []
+    assert len(graph.match()) == len(FACTS)
+
+
+def test_entity_neighborhood_finds_multi_word_names(graph):
+    assert facts(graph.entity_neighborhood("Any news from NEW YORK or Priya?")) == [FACTS[1], FACTS[4], FACTS[5]]
+
+
+class Unwalkable(list):
+    """Candidate list that fails the test if a query iterates it"""
+
+    def __iter__(self):
+        raise AssertionError("walked a larger candidate list")
+
+
+def test_match_walks_the_smallest_candidate_list():
+    index = AdjacencyIndex()
+    for i in range(100):
+        index.add(f"p{i}", "User", "likes", f"thing {i}")
+    index.add("rare", "User", "owns", "thing 7")
+    index.by_predicate["likes"] = Unwalkable(index.by_predicate["likes"])
+
+    assert index.match(subject="User", obj="thing 7", predicate="likes") == ["p7"]
+    assert index.mentioned_entities("is thing 7 or thing 70 owned by the user") == ["thing 7", "thing 70", "user"]
+
+
+def test_store_created_before_entity_keys_is_upgraded(tmp_path):
+    db_file = str(tmp_path / "graph.db")
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE triplets (rowid INTEGER PRIMARY KEY, id TEXT NOT NULL, subject TEXT NOT NULL,"
+                 " predicate TEXT NOT NULL, object TEXT NOT NULL, category TEXT, subcategory TEXT, confidence REAL,"
+                 " temporal_info TEXT, context TEXT, extracted_at TEXT, source_input TEXT,"
+                 " seen_count INTEGER NOT NULL DEFAULT 1)")
+    conn.execute("INSERT INTO triplets (id, subject, predicate, object) VALUES ('a', 'Alex', 'lives_in', 'New York')")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteKnowledgeStore(db_file)
+    assert store.adjacency.neighbors("new york", "in") == [("a", "alex")]
+    assert store.adjacency.display_name("new york") == "New York"
+    store.close()
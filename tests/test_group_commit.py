@@ -0,0 +1,134 @@
+import asyncio
+import json
+import signal
+import threading
+import time
+
+import pytest
+
+import group_commit
+import ultra_knowledge_extractor
+from conftest import extraction
+from group_commit import GroupCommitWriter
+from knowledge_graph_store import SQLiteKnowledgeStore
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+TEXT = "Yesterday Alex and I argued about moving to Lisbon, because the rent there keeps rising"
+
+
+def test_saves_within_the_interval_are_folded_into_one_write():
+    saved = []
+    writer = GroupCommitWriter(saved.append, interval=0.2)
+    for _ in range(5):
+        writer.mark_dirty()
+    time.sleep(0.4)
+    assert saved == [5]
+    writer.close()
+    assert writer.stats == {"flushes": 1, "inputs_saved": 5, "failures": 0}
+
+
+def test_unsaved_inputs_never_exceed_max_pending():
+    unsaved = []
+    writer = None
+
+    def save(inputs):
+        unsaved.append(writer.pending + writer.writing)
+        time.sleep(0.01)
+
+    writer = GroupCommitWriter(save, max_pending=3)
+    for _ in range(10):
+        writer.mark_dirty()
+    writer.close()
+    assert max(unsaved) <= 3
+    assert writer.stats["inputs_saved"] == 10
+
+
+def test_signal_handler_is_opt_in(monkeypatch):
+    monkeypatch.setattr(group_commit, "_signals_installed", False)
+    before = signal.getsignal(signal.SIGTERM)
+    GroupCommitWriter(lambda inputs: None, interval=1.0).close()
+    assert signal.getsignal(signal.SIGTERM) == before
+
+    try:
+        group_commit.install_signal_handler()
+        handler = signal.getsignal(signal.SIGTERM)
+        assert handler != before
+        if before in (signal.SIG_DFL, None):
+            with pytest.raises(SystemExit):
+                handler(signal.SIGTERM, None)
+    finally:
+        signal.signal(signal.SIGTERM, before)
+
+
+def test_store_backed_group_commit_round_trip(tmp_path):
+    def open_extractor(**kwargs):
+        return UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"),
+                                       store=SQLiteKnowledgeStore(str(tmp_path / "graph.db")),
+                                       response_cache_size=0, **kwargs)
+
+    extractor = open_extractor(save_interval=0.05, max_unsaved_inputs=3)
+    for i in range(7):
+        extractor.integrate_extracted_knowledge(extraction(i), f"input {i}")
+        extractor.request_save()
+    extractor.close()
+    assert extractor.writer.stats["failures"] == 0
+    assert extractor.writer.stats["inputs_saved"] == 7
+
+    reloaded = open_extractor()
+    assert reloaded.kg["meta"]["total_inputs_processed"] == 7
+    assert reloaded.knowledge_base_size()["total_triplets"] == 7
+
+
+def test_async_saves_do_not_block_the_event_loop(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, max_unsaved_inputs=1, response_cache_size=0)
+    write_started = threading.Event()
+
+    def slow_save(inputs):
+        write_started.set()
+        time.sleep(0.3)
+
+    extractor.writer.save = slow_save
+
+    async def generate(messages, max_tokens=800, model=None, cache=True):
+        return json.dumps(extraction(len(messages)))
+
+    extractor.agenerate_with_model = generate
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await extractor.aextract_and_store(TEXT)
+        await asyncio.to_thread(write_started.wait)
+        # The writer is full until the slow write ends; the loop keeps running meanwhile
+        ticks_before = ticks
+        await extractor.aextract_and_store(TEXT + " again")
+        ticker.cancel()
+        return ticks - ticks_before
+
+    assert asyncio.run(run()) >= 5
+    extractor.close()
+
+
+@pytest.mark.parametrize("argv, writer", [([], False), (["--save-interval", "2", "--max-unsaved", "10"], True)])
+def test_cli_writes_in_the_background_only_when_asked(tmp_path, monkeypatch, argv, writer):
+    monkeypatch.chdir(tmp_path)
+    answers = iter(["1", "quit"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monkeypatch.setattr(UltraKnowledgeExtractor, "setup_llm", lambda self, choice: True)
+    installed, writers = [], []
+    monkeypatch.setattr(ultra_knowledge_extractor, "install_signal_handler", lambda: installed.append(1))
+    close = UltraKnowledgeExtractor.close
+    monkeypatch.setattr(UltraKnowledgeExtractor, "close", lambda self: (writers.append(self.writer), close(self)))
+
+    ultra_knowledge_extractor.main(argv)
+    assert (writers[0] is not None) is writer
+    assert bool(installed) is writer
+    if writer:
+        assert (writers[0].interval, writers[0].max_pending) == (2.0, 10)
@@ -0,0 +1,57 @@
+from conftest import extraction
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def ingest(extractor, start, count):
+    for i in range(start, start + count):
+        text = f"I picked up hobby {i} with Alex"
+        extractor.integrate_extracted_knowledge(extraction(i), text)
+        extractor.save_knowledge_graph()
+
+
+def test_journal_round_trip(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    ingest(extractor, 0, 3)
+
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    assert len(reloaded.kg["triplets"]) == 3
+    assert reloaded.kg["meta"]["total_inputs_processed"] == 3
+    assert reloaded.kg["conversation_metadata"]["entity_mentions"]["Alex"] == 3
+
+
+def test_torn_journal_tail_is_dropped(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    ingest(extractor, 0, 2)
+    with open(extractor.journal_file, 'a') as f:
+        f.write('{"seq": 99, "op": "integ')
+
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    assert len(reloaded.kg["triplets"]) == 2
+    with open(extractor.journal_file, 'rb') as f:
+        assert f.read().endswith(b"\n")
+
+
+def test_compaction_folds_journal_into_snapshot(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, compact_every=2, response_cache_size=0)
+    ingest(extractor, 0, 5)
+
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    assert len(reloaded.kg["triplets"]) == 5
+    assert reloaded.kg["meta"]["total_inputs_processed"] == 5
+
+
+def test_snapshot_mode_save_does_not_replay_journal_again(kg_file):
+    journaled = UltraKnowledgeExtractor(kg_file=kg_file, journal_mode=True, response_cache_size=0)
+    ingest(journaled, 0, 3)
+
+    # Reopened without journal mode: the full snapshot it writes already holds the journal's records
+    plain = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    ingest(plain, 3, 2)
+    mentions = plain.kg["conversation_metadata"]["entity_mentions"]["Alex"]
+    source_texts = {ref: dict(entry) for ref, entry in plain.kg["source_texts"].items()}
+
+    reloaded = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    assert reloaded.kg["conversation_metadata"]["entity_mentions"]["Alex"] == mentions == 5
+    assert {ref: dict(entry) for ref, entry in reloaded.kg["source_texts"].items()} == source_texts
+    assert len(reloaded.kg["triplets"]) == 5
+    assert reloaded.kg["meta"]["total_inputs_processed"] == 5
@@ -0,0 +1,76 @@
+import json
+
+import kg_snapshot
+from conftest import extraction
+from kg_snapshot import LazyKnowledgeGraph, encode_snapshot
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def binary_graph(tmp_path, inputs=3):
+    path = str(tmp_path / "graph.ukg")
+    extractor = UltraKnowledgeExtractor(kg_file=path, snapshot_format="binary", response_cache_size=0)
+    for i in range(inputs):
+        extractor.integrate_extracted_knowledge(extraction(i), f"input {i}")
+    extractor.save_knowledge_graph(inputs)
+    return path
+
+
+def test_sections_decode_once_on_first_touch(tmp_path):
+    decoded = []
+    kg = LazyKnowledgeGraph(binary_graph(tmp_path), on_decode=lambda name, value: decoded.append(name) or value)
+
+    assert "triplets" in kg and not kg.is_loaded("triplets")
+    assert len(kg["triplets"]["columns"]["ids"]) == 3
+    kg["triplets"]
+    assert decoded == ["triplets"]
+    assert not kg.is_loaded("named_entities")
+    kg.close()
+
+
+def test_untouched_sections_are_copied_as_raw_bytes(tmp_path):
+    kg = LazyKnowledgeGraph(binary_graph(tmp_path))
+    codec, raw = kg.raw_section("triplets")
+    kg["meta"] = {**kg["meta"], "note": "edited"}
+
+    rewritten = tmp_path / "rewritten.ukg"
+    rewritten.write_bytes(b"".join(encode_snapshot(kg)))
+    assert not kg.is_loaded("triplets")
+    copy = LazyKnowledgeGraph(str(rewritten))
+    assert copy.raw_section("triplets") == (codec, raw)
+    assert copy["meta"]["note"] == "edited"
+    copy.close()
+    kg.close()
+
+
+def test_binary_and_json_round_trip(tmp_path):
+    json_file = str(tmp_path / "graph.json")
+    extractor = UltraKnowledgeExtractor(kg_file=json_file, response_cache_size=0)
+    for i in range(3):
+        extractor.integrate_extracted_knowledge(extraction(i), f"input {i}")
+    extractor.save_knowledge_graph(3)
+
+    snapshot_file, back_file = str(tmp_path / "graph.ukg"), str(tmp_path / "back.json")
+    kg_snapshot.json_to_snapshot(json_file, snapshot_file)
+    assert kg_snapshot.is_snapshot(snapshot_file) and not kg_snapshot.is_snapshot(json_file)
+    kg_snapshot.snapshot_to_json(snapshot_file, back_file)
+
+    with open(json_file) as f, open(back_file) as g:
+        original, restored = json.load(f), json.load(g)
+    for section in ("triplets", "named_entities", "relationships", "source_texts"):
+        assert restored[section] == original[section]
+
+
+def test_resync_after_a_compaction_releases_the_old_mapping(tmp_path):
+    path = binary_graph(tmp_path)
+    reader = UltraKnowledgeExtractor(kg_file=path, shared=True, response_cache_size=0)
+    writer = UltraKnowledgeExtractor(kg_file=path, shared=True, compact_every=1, response_cache_size=0)
+    old = reader.kg
+    assert isinstance(old, LazyKnowledgeGraph)
+
+    writer.integrate_extracted_knowledge(extraction(3), "input 3")
+    writer.save_knowledge_graph()
+    with reader.shared_lock():
+        reader.sync_shared_journal()
+
+    assert old.map.closed
+    assert len(reader.kg["triplets"]) == 4
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import knowledge_retrieval
+from knowledge_retrieval import BM25Index, InvertedIndex, tokenize
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def test_tokenize_lowercases_splits_underscores_and_drops_stopwords():
+    assert tokenize("My favorite_Food is THE pizza!") == ["favorite", "food", "pizza"]
+
+
+def test_inverted_index_ranks_by_token_hits_and_forgets_removed_keys():
+    index = InvertedIndex()
+    index.add("chess", ["play", "chess", "club"])
+    index.add("go", ["play", "go"])
+    index.add("food", ["pizza"])
+
+    assert index.lookup(["chess", "club", "play"]) == ["chess", "go"]
+    assert index.lookup(["play"], limit=1) in (["chess"], ["go"])
+    index.remove("chess", ["play", "chess", "club"])
+    assert index.lookup(["chess", "play"]) == ["go"]
+    assert "chess" not in index.postings
+
+
+def test_relevant_facts_reach_the_extraction_context(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    extractor.integrate_extracted_knowledge({"triplets": [
+        {"subject": "User", "predicate": "favorite_food", "object": "pizza", "category": "interests"},
+        {"subject": "User", "predicate": "works_as", "object": "nurse", "category": "professional"},
+    ]}, "facts")
+    context = extractor.get_extraction_context("Ordering pizza tonight", 400)
+    assert "favorite_food_pizza: pizza" in context
+    assert "works_as_nurse" not in context
+
+
+def corpus():
+    docs = [tokenize(text) for text in [
+        "user plays chess every weekend", "user plays go", "chess club meets tuesday chess chess",
+        "user likes hiking in the alps", "sister plays piano", "user reads poetry about chess",
+    ]]
+    index = BM25Index()
+    for i, tokens in enumerate(docs):
+        index.add(f"doc{i}", tokens)
+    return index
+
+
+def test_bm25_prefers_rare_terms_and_repeated_matches():
+    index = corpus()
+    assert index.search(["chess"])[0] == "doc2"
+    assert index.search(["chess", "weekend"])[0] == "doc0"
+    assert index.search(["piano", "plays"])[0] == "doc4"
+    assert index.search(["unknown"]) == []
+    assert len(index.search(["plays", "chess"], limit=2)) == 2
+
+
+def test_re_adding_a_document_is_a_no_op():
+    index = corpus()
+    index.add("doc0", ["completely", "different"])
+    assert len(index) == 6
+    assert index.search(["different"]) == []
+
+
+@pytest.mark.skipif(knowledge_retrieval.np is None, reason="NumPy not installed")
+def test_numpy_and_pure_python_scoring_agree(monkeypatch):
+    rng = random.Random(7)
+    vocabulary = [f"w{i}" for i in range(40)]
+    index = BM25Index()
+    for i in range(300):
+        index.add(i, [rng.choice(vocabulary) for _ in range(rng.randint(1, 12))])
+    queries = [[rng.choice(vocabulary) for _ in range(3)] for _ in range(20)]
+
+    vectorized = [index.search(query, limit=10) for query in queries]
+    monkeypatch.setattr(knowledge_retrieval, "np", None)
+    assert [index.search(query, limit=10) for query in queries] == vectorized
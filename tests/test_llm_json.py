@@ -0,0 +1,148 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from llm_json import (CompiledSchema, StreamingJSONScanner, drop_invalid, iter_json_objects, parse_json_object,
+                      repair_json)
+from ultra_knowledge_extractor import EXTRACTION_VALIDATOR, UltraKnowledgeExtractor
+
+
+@pytest.mark.parametrize("broken, fixed", [
+    ("{'a': 'it\\'s', 'b': 'say \"hi\"'}", {"a": "it's", "b": 'say "hi"'}),
+    ("{a: 1, b: [1, 2,], }", {"a": 1, "b": [1, 2]}),
+    ('{"ok": True, "no": False, "none": None}', {"ok": True, "no": False, "none": None}),
+])
+def test_repair_fixes_common_model_defects(broken, fixed):
+    assert json.loads(repair_json(broken)) == fixed
+
+
+def test_repair_leaves_valid_json_unchanged():
+    text = '{"a": "b, ]", "c": [true, null, 1.5e3]}'
+    assert repair_json(text) == text
+
+
+def test_objects_are_found_around_prose_and_braces_in_strings():
+    text = 'Sure! {"a": "}{"} and then {"b": 2} done'
+    assert list(iter_json_objects(text)) == ['{"a": "}{"}', '{"b": 2}']
+
+
+def test_truncated_object_is_closed_after_its_last_complete_value():
+    text = '{"triplets": [{"subject": "User", "predicate": "plays", "object": "chess"}, {"subject": "Us'
+    closed = list(iter_json_objects(text))[-1]
+    assert json.loads(closed) == {"triplets": [{"subject": "User", "predicate": "plays", "object": "chess"}, {}]}
+    assert list(iter_json_objects(text, close_truncated=False)) == []
+
+    # The cut-off triplet fails validation and is dropped with nothing else
+    value, errors = parse_json_object(text, EXTRACTION_VALIDATOR)
+    value = drop_invalid(value, [error for error in errors if error[0][0] == "triplets"])
+    assert value["triplets"] == [{"subject": "User", "predicate": "plays", "object": "chess"}]
+
+
+def test_thinking_block_is_skipped():
+    value, errors = parse_json_object('<think>maybe {"x": 1}</think>\n{"y": 2}')
+    assert value == {"y": 2} and errors == []
+
+
+def test_first_valid_candidate_wins_over_an_earlier_invalid_one():
+    schema = CompiledSchema({"type": "object", "required": ["y"]})
+    value, errors = parse_json_object('{"x": 1} {"y": 2}', schema)
+    assert value == {"y": 2} and errors == []
+
+
+def test_schema_errors_carry_paths():
+    schema = CompiledSchema({
+        "type": "object",
+        "properties": {"items": {"type": "array", "items": {"type": "integer", "minimum": 0}},
+                       "kind": {"enum": ["a", "b"]}},
+        "required": ["kind"]
+    })
+    assert schema.errors({"items": [1, -1, "x"]}) == [
+        (("kind",), "is required"),
+        (("items", 1), "-1 is outside [0, None]"),
+        (("items", 2), "expected integer, got str"),
+    ]
+    assert schema.errors({"kind": "c"}) == [(("kind",), "'c' is not one of ['a', 'b']")]
+
+
+def test_invalid_triplets_are_dropped_and_the_rest_kept():
+    response = """Here you go:
+    {'triplets': [
+        {'subject': 'User', 'predicate': 'likes', 'object': 'chess', 'confidence': 0.9},
+        {'subject': 'User', 'predicate': 'is', 'confidence': 2},
+        {'subject': 'User', 'predicate': 'age', 'object': 31},
+    ],
+    'named_entities': {'people': ['Alex', 7]},
+    'topics_mentioned': ['games']}"""
+    value, errors = parse_json_object(response, EXTRACTION_VALIDATOR)
+    assert len(errors) == 3
+    value = drop_invalid(value, errors)
+    assert [t["object"] for t in value["triplets"]] == ["chess", 31]
+    assert value["named_entities"] == {"people": ["Alex"]}
+    assert EXTRACTION_VALIDATOR.errors(value) == []
+
+
+def test_invalid_root_is_dropped_whole():
+    value, errors = parse_json_object('{"triplets": "none"}', CompiledSchema({"type": "array"}))
+    assert drop_invalid(value, errors) is None
+
+
+def test_scanner_emits_triplets_as_they_close_and_stops_at_the_end():
+    seen = []
+    scanner = StreamingJSONScanner(on_element=seen.append)
+    chunks = ['noise {"triplets": [{"subject": "a", "object": "}"', '}, {"subject": "b"}',
+              '], "topics_mentioned": []} trailing', ' more']
+    done = [scanner.feed(chunk) for chunk in chunks]
+    assert done == [False, False, True, True]
+    assert seen == [{"subject": "a", "object": "}"}, {"subject": "b"}]
+    assert json.loads(scanner.result())["topics_mentioned"] == []
+
+
+def test_scanner_handles_escapes_split_across_chunks():
+    scanner = StreamingJSONScanner()
+    chunks = ['{"a": "say \\', '"}\\', '" {", "b": ', '[1, {"c": "]"}]}', ' {"second": 1}']
+    done = [scanner.feed(chunk) for chunk in chunks]
+    assert done == [False, False, False, True, True]
+    assert json.loads(scanner.result()) == {"a": 'say "}" {', "b": [1, {"c": "]"}]}
+
+
+def test_scanner_fed_one_character_at_a_time_stops_on_the_closing_brace():
+    text = 'Sure, here it is: {"triplets": [{"subject": "a"}]} and then some'
+    seen = []
+    scanner = StreamingJSONScanner(on_element=seen.append)
+    stop = next(i for i, c in enumerate(text) if scanner.feed(c))
+    assert text[stop] == "}" and text[stop + 1:] == " and then some"
+    assert seen == [{"subject": "a"}]
+
+
+def test_streaming_generation_hangs_up_once_the_object_closes(kg_file):
+    pieces = ['{"triplets": [{"subject": "User", "predicate": "likes", ', '"object": "jazz"}]', '}', " Hope this", " helps!"]
+    consumed = []
+
+    class Stream:
+        closed = False
+
+        def __iter__(self):
+            for piece in pieces:
+                consumed.append(piece)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+        def close(self):
+            self.closed = True
+
+    stream = Stream()
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    extractor.create_completion = lambda *args, **kwargs: stream
+    seen = []
+    response = extractor.stream_with_model([], 800, None, seen.append, {"model_id": "test:1b"})
+
+    assert consumed == pieces[:3] and stream.closed
+    assert seen == [{"subject": "User", "predicate": "likes", "object": "jazz"}]
+    assert json.loads(response)["triplets"] == seen
+
+
+def test_prompt_example_is_valid_json(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    system_prompt = extractor.build_extraction_messages("I like jazz")[0]["content"]
+    example = json.loads(next(iter_json_objects(system_prompt)))
+    assert example["triplets"][0]["confidence"] == 0.9
@@ -0,0 +1,81 @@
+import json
+import threading
+
+from conftest import extraction
+from knowledge_graph_manager import MIN_GRAPH_BYTES, KnowledgeGraphManager
+from ollama_client import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "I moved to Lisbon"}]
+
+
+def manager(tmp_path, **kwargs):
+    kwargs.setdefault("response_cache_size", 0)
+    return KnowledgeGraphManager(base_dir=str(tmp_path / "graphs"), **kwargs)
+
+
+def ingest(graphs, user_id, i):
+    with graphs.tenant(user_id) as extractor:
+        extractor.integrate_extracted_knowledge(extraction(i), f"input {i}")
+        extractor.request_save()
+
+
+def test_least_recently_used_graph_is_evicted_by_count(tmp_path):
+    graphs = manager(tmp_path, max_loaded_graphs=2)
+    ingest(graphs, "alice", 0)
+    ingest(graphs, "bob", 1)
+    ingest(graphs, "alice", 2)
+    ingest(graphs, "carol", 3)
+
+    assert list(graphs.graphs) == ["alice", "carol"]
+    assert graphs.stats["evictions"] == 1
+    assert graphs.tenant_locks == {}
+
+
+def test_memory_budget_evicts_down_to_the_limit(tmp_path):
+    graphs = manager(tmp_path, max_memory_mb=1.5 * MIN_GRAPH_BYTES / (1024 * 1024))
+    for i, user_id in enumerate(["alice", "bob", "carol"]):
+        ingest(graphs, user_id, i)
+        assert list(graphs.graphs) == [user_id]
+    assert graphs.stats["evictions"] == 2
+
+
+def test_eviction_flushes_queued_saves_and_the_graph_reloads(tmp_path):
+    graphs = manager(tmp_path, extractor_options={"save_interval": 3600})
+    ingest(graphs, "alice", 0)
+    path = graphs.graph_file("alice")
+
+    assert graphs.evict("alice")
+    with open(path) as f:
+        assert [t["object"] for t in json.load(f)["triplets"]] == ["hobby 0"]
+
+    with graphs.tenant("alice") as extractor:
+        assert [t["object"] for t in extractor.kg["triplets"]] == ["hobby 0"]
+    assert graphs.stats["loads"] == 2
+
+
+def test_busy_tenant_is_not_evicted(tmp_path):
+    graphs = manager(tmp_path)
+    entered, release = threading.Event(), threading.Event()
+
+    def hold():
+        with graphs.tenant("alice"):
+            entered.set()
+            release.wait()
+
+    worker = threading.Thread(target=hold)
+    worker.start()
+    entered.wait()
+    assert not graphs.evict("alice", blocking=False)
+    release.set()
+    worker.join()
+    assert graphs.evict("alice")
+    assert graphs.tenant_locks == {}
+
+
+def test_tenants_share_the_response_cache_under_separate_keys(tmp_path):
+    graphs = manager(tmp_path, response_cache_size=16)
+    with graphs.tenant("alice") as alice, graphs.tenant("bob") as bob:
+        assert alice.response_cache is bob.response_cache
+        keys = [ResponseCache.make_key("test:1b", MESSAGES, 300, extractor.cache_namespace) for extractor in (alice, bob)]
+        assert keys[0] != keys[1]
+        assert "alice" not in alice.cache_namespace
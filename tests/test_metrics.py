@@ -0,0 +1,70 @@
+import json
+from types import SimpleNamespace
+
+from instrumentation import NULL_METRICS, Metrics, timed
+
+
+def sample_metrics():
+    metrics = Metrics(namespace="test", buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.05, 0.05, 2.0):
+        metrics.observe("llm_call", seconds)
+    metrics.inc("llm_calls", 4)
+    metrics.inc("llm_calls_avoided")
+    metrics.inc("unused", 0)
+    metrics.record_usage(SimpleNamespace(prompt_tokens=120, completion_tokens=None))
+    return metrics
+
+
+def test_prometheus_export_has_cumulative_buckets_and_counters():
+    lines = sample_metrics().to_prometheus().splitlines()
+
+    assert "# TYPE test_stage_duration_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("test_stage_duration_seconds_bucket")] == [
+        'test_stage_duration_seconds_bucket{stage="llm_call",le="0.01"} 1',
+        'test_stage_duration_seconds_bucket{stage="llm_call",le="0.1"} 3',
+        'test_stage_duration_seconds_bucket{stage="llm_call",le="1.0"} 3',
+        'test_stage_duration_seconds_bucket{stage="llm_call",le="+Inf"} 4',
+    ]
+    assert 'test_stage_duration_seconds_count{stage="llm_call"} 4' in lines
+    assert "# TYPE test_llm_calls_total counter" in lines
+    assert "test_llm_calls_total 4" in lines
+    assert "test_llm_prompt_tokens_total 120" in lines
+    assert not any("unused" in line or "completion_tokens" in line for line in lines)
+
+
+def test_json_snapshot_summarizes_each_stage():
+    snapshot = json.loads(sample_metrics().to_json())
+    stage = snapshot["stages"]["llm_call"]
+
+    assert stage["count"] == 4
+    assert stage["total_seconds"] == 2.105 and stage["max_seconds"] == 2.0
+    assert stage["mean_seconds"] == round(2.105 / 4, 6)
+    assert stage["buckets"] == {"0.01": 1, "0.1": 2, "1.0": 0}
+    assert snapshot["counters"] == {"llm_calls": 4, "llm_calls_avoided": 1, "llm_prompt_tokens": 120}
+
+
+def test_hooks_see_every_observation_and_reset_clears():
+    metrics = Metrics()
+    seen = []
+    metrics.add_hook(lambda kind, name, value: seen.append((kind, name, value)))
+    metrics.inc("saves")
+    metrics.observe("save", 0.5)
+    assert seen == [("counter", "saves", 1), ("timer", "save", 0.5)]
+
+    metrics.reset()
+    assert metrics.snapshot()["stages"] == {} and metrics.snapshot()["counters"] == {}
+
+
+def test_timed_methods_record_into_their_metrics():
+    class Worker:
+        def __init__(self, metrics):
+            self.metrics = metrics
+
+        @timed("work")
+        def work(self):
+            return "done"
+
+    metrics = Metrics()
+    assert Worker(metrics).work() == "done"
+    assert metrics.snapshot()["stages"]["work"]["count"] == 1
+    assert Worker(NULL_METRICS).work() == "done"
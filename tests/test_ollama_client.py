@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import ultra_knowledge_extractor
+from ollama_client import OllamaConnection, RequestCoalescer
+
+
+def test_concurrent_identical_calls_share_one_generation():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "response"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(coalescer.run("key", generate)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(coalescer.run("key", generate))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while coalescer.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert calls == [1] and results == ["response"] * 4
+    assert coalescer.inflight == {}
+    assert coalescer.run("key", lambda: "fresh") == "fresh"
+
+
+def test_followers_get_the_leaders_exception():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait()
+        raise RuntimeError("server went away")
+
+    def call():
+        try:
+            coalescer.run("key", fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait()
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while coalescer.coalesced < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ["server went away"] * 2
+
+
+def test_async_calls_share_one_task_and_survive_a_cancelled_caller():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "response"
+
+    async def main():
+        impatient = asyncio.ensure_future(coalescer.arun("key", generate))
+        await asyncio.sleep(0)
+        patient = [coalescer.arun("key", generate) for _ in range(3)]
+        impatient.cancel()
+        return await asyncio.gather(*patient)
+
+    assert asyncio.run(main()) == ["response"] * 3
+    assert calls == [1] and coalescer.coalesced == 3
+
+
+def connection(models=(), preload_error=None):
+    """OllamaConnection whose server has models installed and answers preloads (or fails with preload_error)"""
+    conn = OllamaConnection("http://ollama.test")
+    conn.client = SimpleNamespace(models=SimpleNamespace(list=lambda: [SimpleNamespace(id=m) for m in models]))
+    conn.preloads = []
+
+    def post(url, json=None, **kwargs):
+        conn.preloads.append((url, json))
+        if preload_error is not None:
+            raise preload_error
+        return SimpleNamespace(raise_for_status=lambda: None)
+
+    conn.http = SimpleNamespace(post=post, close=lambda: None)
+    return conn
+
+
+def test_has_model_accepts_the_implicit_latest_tag():
+    conn = connection(["llama3.2:latest", "qwen2.5:3b"])
+    assert conn.has_model("llama3.2") and conn.has_model("llama3.2:latest")
+    assert conn.has_model("qwen2.5:3b")
+    assert not conn.has_model("qwen2.5") and not conn.has_model("mistral")
+
+
+def test_preload_asks_ollama_to_keep_the_model_resident():
+    conn = connection()
+    assert conn.preload("llama3.2:3b", keep_alive="1h")
+    assert conn.preloads == [("http://ollama.test/api/generate",
+                              {"model": "llama3.2:3b", "keep_alive": "1h", "stream": False})]
+    assert conn.preloaded == {"llama3.2:3b"}
+
+
+def test_failed_preload_is_reported_not_raised():
+    conn = connection(preload_error=httpx.HTTPError("404 Not Found"))
+    assert not conn.preload("llama3.2:3b")
+    assert conn.preloaded == set()
+
+
+@pytest.mark.parametrize("installed, connected", [(True, True), (False, False)])
+def test_setup_llm_checks_the_model_and_preloads_once(kg_file, monkeypatch, installed, connected):
+    extractor = ultra_knowledge_extractor.UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    model_id = extractor.available_models["1"]["model_id"]
+    conn = connection([model_id] if installed else [])
+    monkeypatch.setattr(ultra_knowledge_extractor, "get_connection", lambda host: conn)
+
+    assert extractor.setup_llm("1") is connected
+    assert extractor.setup_llm("1") is connected
+    assert len(conn.preloads) == (1 if installed else 0)
+    assert (extractor.current_model is not None) is connected
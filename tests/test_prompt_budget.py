@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from prompt_budget import PromptBudget, count_tokens, fit_context, priority, truncate_to_tokens
+
+
+def fits(text):
+    """Budget that just holds text as one section (opening a section reserves a newline)"""
+    return count_tokens(text) + 1
+
+
+def budget_with(max_tokens):
+    budget = PromptBudget(max_tokens)
+    budget.section("facts", "Facts: ")
+    budget.section("topics", "Topics: ", ", ")
+    budget.add("facts", "User likes jazz", priority(relevance=1.0))
+    budget.add("topics", "music", priority(recency=1.0))
+    budget.add("facts", "User lives in Lisbon", priority(confidence=1.0))
+    return budget
+
+
+def test_lowest_priority_items_are_dropped_first():
+    full = budget_with(None).render()
+    assert full == "Facts: User likes jazz; User lives in Lisbon\nTopics: music"
+
+    tight = budget_with(fits("Facts: User likes jazz; User lives in Lisbon"))
+    assert tight.render() == "Facts: User likes jazz; User lives in Lisbon"
+
+    tighter = budget_with(fits("Facts: User likes jazz"))
+    assert tighter.render() == "Facts: User likes jazz"
+
+
+def test_kept_items_render_in_insertion_order():
+    budget = PromptBudget(None)
+    budget.section("facts", "Facts: ")
+    for text, score in [("first", 0.1), ("second", 0.9), ("third", 0.5)]:
+        budget.add("facts", text, score)
+    assert budget.render() == "Facts: first; second; third"
+
+
+def test_an_item_too_big_for_what_is_left_does_not_block_smaller_ones():
+    budget = PromptBudget(fits("Facts: short one; tiny"))
+    budget.section("facts", "Facts: ")
+    budget.add("facts", "short one", 1.0)
+    budget.add("facts", "a much longer item that cannot possibly fit in here", 0.9)
+    budget.add("facts", "tiny", 0.1)
+    assert budget.render() == "Facts: short one; tiny"
+
+
+@pytest.mark.parametrize("max_tokens", [0, 5, 17, 40, 120])
+def test_rendered_context_never_exceeds_the_budget(max_tokens):
+    rng = random.Random(max_tokens)
+    budget = PromptBudget(max_tokens)
+    for name in ("a", "b", "c"):
+        budget.section(name, f"Section {name}: ")
+    for i in range(60):
+        words = " ".join(rng.choice(["jazz", "Lisbon", "extraordinarily", "42", "x-ray", "mom's"])
+                         for _ in range(rng.randint(1, 6)))
+        budget.add(rng.choice("abc"), words, rng.random())
+
+    rendered = budget.render(empty="none")
+    assert rendered == "none" or count_tokens(rendered) <= max_tokens
+    assert budget.used_tokens == count_tokens(rendered)
+
+
+def test_fit_context_keeps_earlier_lines_and_items():
+    text = "Known relationships: a; b; c\nRecent topics discussed: x, y"
+    assert fit_context(text, 1000) == text
+    assert fit_context(text, fits("Known relationships: a; b")) == "Known relationships: a; b"
+    assert fit_context(text, 0, "No context") == "No context"
+
+
+def test_truncate_to_tokens_cuts_on_a_word_boundary():
+    text = "one two three four five"
+    assert truncate_to_tokens(text, 3) == "one two three"
+    assert truncate_to_tokens(text, 100) == text
+    assert truncate_to_tokens(text, 0) == ""
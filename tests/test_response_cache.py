@@ -0,0 +1,78 @@
+import json
+import os
+from types import SimpleNamespace
+
+from conftest import extraction
+from ollama_client import ResponseCache
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def key(text):
+    return ResponseCache.make_key("llama3.2:3b", [{"role": "user", "content": text}], 800)
+
+
+def test_whitespace_differences_share_a_key():
+    assert key("I met  Alex\tat the park\n") == key("I met Alex at the park")
+
+
+def test_case_differences_do_not_share_a_key():
+    assert key("I met Rose in May") != key("I met rose in may")
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+
+class FakeClient:
+    """Stands in for the OpenAI client, answering completions from a list in turn"""
+
+    def __init__(self, answers):
+        self.answers = iter(answers)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        self.calls += 1
+        message = SimpleNamespace(content=next(self.answers))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def cached_extractor(kg_file, answers, cache_file=None):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_file=cache_file)
+    extractor.ollama_client = FakeClient(answers)
+    extractor.current_model = {"name": "Test", "model_id": "test:1b"}
+    return extractor
+
+
+def test_unparseable_responses_are_not_cached(kg_file, tmp_path):
+    cache_file = str(tmp_path / "responses.jsonl")
+    extractor = cached_extractor(kg_file, ["Sorry, I can't help with that", json.dumps(extraction(1))], cache_file)
+    messages = [{"role": "user", "content": "I like hobby 1"}]
+
+    assert extractor.generate_with_model(messages) == "Sorry, I can't help with that"
+    assert len(extractor.response_cache.entries) == 0
+    assert not os.path.exists(cache_file)
+
+    assert json.loads(extractor.generate_with_model(messages)) == extraction(1)
+    assert json.loads(extractor.generate_with_model(messages)) == extraction(1)
+    assert extractor.ollama_client.calls == 2
+    assert len(ResponseCache(cache_file=cache_file).entries) == 1
+
+
+def test_only_the_context_free_quick_prompt_is_cached(kg_file):
+    text = "Over the weekend I spent hours on a hobby that I keep coming back to, note 1"
+    extractor = cached_extractor(kg_file, [json.dumps(extraction(1))] * 3)
+
+    extractor.ultra_extract_knowledge(text)
+    assert len(extractor.response_cache.entries) == 0
+
+    extractor.quick_extract_knowledge(text)
+    extractor.quick_extract_knowledge(text)
+    assert extractor.ollama_client.calls == 2
+    assert extractor.response_cache.stats()["hits"] == 1
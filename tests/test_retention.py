@@ -0,0 +1,73 @@
+from conftest import extraction
+from knowledge_graph_store import SQLiteKnowledgeStore
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+RETENTION = {"max_contexts_per_entity": 3, "max_contexts_per_fact": 2, "max_items_per_metadata_list": 4}
+
+
+def repeated_fact(i):
+    """The same fact restated with a different context each time"""
+    data = extraction(i)
+    data["triplets"] = [{"subject": "User", "predicate": "plays", "object": "chess", "category": "interests",
+                         "context": f"context {i}"}]
+    return data
+
+
+def test_entity_contexts_are_a_ring_buffer_and_release_their_texts(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, retention=RETENTION, response_cache_size=0)
+    for i in range(6):
+        extractor.integrate_extracted_knowledge(repeated_fact(i), f"input {i}")
+
+    alex = extractor.kg["named_entities"]["people"]["Alex"]
+    assert alex["mention_count"] == 6
+    assert [extractor.source_text(c) for c in alex["contexts"]] == ["input 3", "input 4", "input 5"]
+    fact = extractor.kg["knowledge_categories"]["interests"]["plays_chess"]
+    assert fact["source_contexts"] == ["context 4", "context 5"]
+    # Older inputs are still referenced by the topic list (cap 4), the oldest by nothing
+    assert "input 0" not in {t["text"] for t in extractor.kg["source_texts"].values()}
+    refs = {t["text"]: t["refs"] for t in extractor.kg["source_texts"].values()}
+    assert refs["input 2"] == 1 and refs["input 5"] == 2
+
+
+def test_compact_applies_new_caps_and_rebuilds_reference_counts(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    for i in range(6):
+        extractor.integrate_extracted_knowledge(repeated_fact(i), f"input {i}")
+    extractor.retention.update(RETENTION)
+
+    dropped = extractor.compact()
+    assert dropped["entity_contexts"] == 3
+    assert dropped["fact_contexts"] == 3
+    assert dropped["metadata_items"] == 2
+    assert dropped["source_texts"] == 2
+    assert {t["text"]: t["refs"] for t in extractor.kg["source_texts"].values()} == {
+        "input 2": 1, "input 3": 2, "input 4": 2, "input 5": 2}
+
+
+def test_store_keeps_ring_buffers_on_write(tmp_path):
+    store = SQLiteKnowledgeStore(str(tmp_path / "graph.db"))
+    extractor = UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"), store=store,
+                                        retention=RETENTION, response_cache_size=0)
+    for i in range(6):
+        extractor.integrate_extracted_knowledge(repeated_fact(i), f"input {i}")
+
+    mentions = store.conn.execute("SELECT input FROM mentions WHERE name = 'Alex' ORDER BY rowid").fetchall()
+    assert [row[0] for row in mentions] == ["input 3", "input 4", "input 5"]
+    assert store.conn.execute("SELECT mention_count FROM entities WHERE name = 'Alex'").fetchone()[0] == 6
+    sources = store.conn.execute("SELECT context FROM fact_sources ORDER BY rowid").fetchall()
+    assert [row[0] for row in sources] == ["context 4", "context 5"]
+    assert store.conn.execute("SELECT COUNT(*) FROM conversation_items").fetchone()[0] == 4
+    extractor.close()
+
+
+def test_store_compact_applies_caps(tmp_path):
+    store = SQLiteKnowledgeStore(str(tmp_path / "graph.db"))
+    extractor = UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"), store=store, response_cache_size=0)
+    for i in range(6):
+        extractor.integrate_extracted_knowledge(repeated_fact(i), f"input {i}")
+    extractor.retention.update(RETENTION)
+
+    assert extractor.compact() == {"entity_contexts": 3, "fact_contexts": 3, "metadata_items": 2}
+    assert store.conn.execute("SELECT COUNT(*) FROM mentions").fetchone()[0] == 3
+    assert extractor.compact() == {"entity_contexts": 0, "fact_contexts": 0, "metadata_items": 0}
+    extractor.close()
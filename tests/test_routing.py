@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from conftest import extraction
+from model_router import ModelRouter
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+# Long and clause-heavy enough that the rule tier defers it to the model
+TEXT = "Yesterday Alex and I argued about moving to Lisbon, because the rent there keeps rising"
+
+
+def routed_extractor(kg_file, responses):
+    """Extractor on a two-tier router whose model answers responses in turn"""
+    router = ModelRouter(["1", "2"], thresholds=(0.99,))
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, router=router, response_cache_size=0)
+    answers = iter(responses)
+    models = []
+
+    def generate(messages, max_tokens=800, on_triplet=None, model=None, cache=True):
+        models.append(model["model_id"])
+        return next(answers)
+
+    async def agenerate(messages, max_tokens=800, model=None, cache=True):
+        return generate(messages, max_tokens, model=model)
+
+    extractor.generate_with_model = generate
+    extractor.agenerate_with_model = agenerate
+    return extractor, router, models
+
+
+def extraction_stats(extractor):
+    stats = extractor.kg["analytics"]["extraction_stats"]
+    return stats["successful_extractions"], stats["failed_extractions"]
+
+
+def test_escalated_input_counts_once(kg_file):
+    extractor, router, models = routed_extractor(kg_file, ["not json", json.dumps(extraction(1))])
+    result = extractor.extract_and_store(TEXT)
+
+    assert result["extraction_successful"]
+    assert models == ["llama3.2:1b", "llama3.2:3b"]
+    assert extraction_stats(extractor) == (1, 0)
+    assert [success for _, success in router.outcomes["1"]] == [False]
+    assert [success for _, success in router.outcomes["2"]] == [True]
+
+
+def test_input_failing_on_every_tier_counts_one_failure(kg_file):
+    extractor, router, models = routed_extractor(kg_file, ["not json", "still not json"])
+    assert not extractor.extract_and_store(TEXT)["extraction_successful"]
+    assert extraction_stats(extractor) == (0, 1)
+    assert len(router.outcomes["1"]) == len(router.outcomes["2"]) == 1
+
+
+def test_batch_and_async_paths_count_once(kg_file):
+    extractor, router, models = routed_extractor(
+        kg_file, ["not json", json.dumps(extraction(1)), json.dumps(extraction(2)), "not json",
+                  json.dumps(extraction(3))])
+    extractor.extract_many([TEXT, TEXT + " again"], concurrency=1)
+    assert extraction_stats(extractor) == (2, 0)
+
+    asyncio.run(extractor.aextract_and_store(TEXT + " and again"))
+    assert extraction_stats(extractor) == (3, 0)
+    assert len(models) == 5
@@ -0,0 +1,56 @@
+import pytest
+
+from rule_extractor import RuleBasedExtractor
+
+
+@pytest.fixture
+def rules():
+    return RuleBasedExtractor()
+
+
+@pytest.mark.parametrize("text, predicate, value", [
+    ("My name is Sam", "name", "Sam"),
+    ("I'm 29 years old", "age", "29"),
+    ("I work at Google", "works_at", "Google"),
+    ("I'm a teacher", "is_a", "teacher"),
+    ("I'm an early riser", "is_a", "early riser"),
+    ("I really like jazz music", "likes", "jazz music"),
+    ("My favorite color is green", "favorite_color", "green"),
+])
+def test_simple_facts_are_resolved_without_the_model(rules, text, predicate, value):
+    triplets = rules.extract(text)["triplets"]
+    assert [(t["predicate"], t["object"]) for t in triplets] == [(predicate, value)]
+
+
+@pytest.mark.parametrize("text", [
+    "I'm a little worried about work",
+    "I'm a bit tired",
+    "I'm a lot happier now",
+    "I like you",
+    "I love it",
+    "I like your idea",
+    "I like that",
+    "I'm a fan of hiking with Alex",
+])
+def test_moods_and_pronoun_objects_go_to_the_model(rules, text):
+    assert rules.extract(text) is None
+
+
+def test_filler_has_nothing_to_extract(rules):
+    assert rules.extract("Hi there! Thanks so much") == {}
+
+
+def test_any_unmatched_clause_defers_the_whole_input(rules):
+    assert rules.extract("My name is Sam and I had a rough week") is None
+
+
+@pytest.mark.parametrize("text", [
+    "My name is not important.",
+    "I work at home now.",
+    "I live in fear of exams.",
+    "I'm a mess today.",
+    "I live in paris",
+    "call me maybe",
+])
+def test_negations_non_entities_and_time_words_go_to_the_model(rules, text):
+    assert rules.extract(text) is None
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import kg_snapshot
+from kg_schema import SCHEMA_VERSION
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+# A graph as the 2.0 extractor wrote it: no meta.version, facts keyed by
+# current_value, and none of the sections added since
+GRAPH_2_0 = {
+    "meta": {"created": "2024-01-01 00:00:00", "total_inputs_processed": 3},
+    "triplets": [
+        {"subject": "User", "predicate": "lives_in", "object": "Lisbon", "category": "demographics",
+         "confidence": 0.9}
+    ],
+    "knowledge_categories": {
+        "demographics": {"lives_in_Lisbon": {"subject": "User", "predicate": "lives_in", "current_value": "Lisbon"}}
+    },
+    "named_entities": {"places": {"Lisbon": {"mention_count": 2, "contexts": []}}},
+    "conversation_metadata": {"entity_mentions": {"Lisbon": 2}},
+    "analytics": {"extraction_stats": {"total_extractions": 3}}
+}
+
+
+def assert_migrated(extractor):
+    kg = extractor.kg
+    assert kg["meta"]["version"] == SCHEMA_VERSION
+    assert kg["meta"]["total_inputs_processed"] == 3
+    assert kg["knowledge_categories"]["demographics"]["lives_in_Lisbon"]["object"] == "Lisbon"
+    assert "current_value" not in kg["knowledge_categories"]["demographics"]["lives_in_Lisbon"]
+    assert kg["conversation_metadata"]["entity_mentions"]["Lisbon"] == 2
+    assert kg["conversation_metadata"]["relationship_frequency"] == {}
+    assert kg["analytics"]["extraction_stats"]["total_extractions"] == 3
+    assert "failed_extractions" in kg["analytics"]["extraction_stats"]
+    assert kg["source_texts"] == {}
+    triplet = next(iter(kg["triplets"]))
+    assert triplet["id"] == extractor.generate_triplet_id(triplet)
+
+
+def test_json_graph_is_migrated_on_load_and_saved_current(kg_file):
+    with open(kg_file, 'w') as f:
+        json.dump(GRAPH_2_0, f)
+
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    assert_migrated(extractor)
+    extractor.persist_knowledge_graph()
+
+    with open(kg_file) as f:
+        assert json.load(f)["meta"]["version"] == SCHEMA_VERSION
+    assert_migrated(UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0))
+
+
+def test_binary_snapshot_is_migrated_on_load(tmp_path):
+    json_file = tmp_path / "old.json"
+    snapshot_file = str(tmp_path / "graph.kgs")
+    json_file.write_text(json.dumps(GRAPH_2_0))
+    kg_snapshot.json_to_snapshot(str(json_file), snapshot_file)
+
+    extractor = UltraKnowledgeExtractor(kg_file=snapshot_file, response_cache_size=0)
+    assert_migrated(extractor)
+    extractor.persist_knowledge_graph()
+    assert_migrated(UltraKnowledgeExtractor(kg_file=snapshot_file, response_cache_size=0))
+
+
+def test_unknown_version_is_refused(kg_file):
+    with open(kg_file, 'w') as f:
+        json.dump({**GRAPH_2_0, "meta": {"version": "9.0"}}, f)
+
+    with pytest.raises(ValueError, match="9.0"):
+        UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
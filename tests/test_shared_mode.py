@@ -0,0 +1,49 @@
+import shared_graph_stress
+from conftest import extraction
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+SHARED_FACT = {"subject": "User", "predicate": "uses", "object": "the shared graph", "category": "technology",
+               "confidence": 0.8}
+
+
+def ingest(extractor, i):
+    data = extraction(i)
+    data["triplets"].append(dict(SHARED_FACT))
+    extractor.integrate_extracted_knowledge(data, f"input {i}")
+    extractor.kg["analytics"]["extraction_stats"]["successful_extractions"] += 1
+    extractor.save_knowledge_graph()
+
+
+def open_shared(kg_file, **kwargs):
+    return UltraKnowledgeExtractor(kg_file=kg_file, shared=True, response_cache_size=0, **kwargs)
+
+
+def check_merged(kg_file, inputs):
+    reader = open_shared(kg_file)
+    kg = reader.kg
+    assert len(kg["triplets"]) == inputs + 1
+    assert kg["triplets"].find(reader.generate_triplet_id(SHARED_FACT))["seen_count"] == inputs
+    assert kg["meta"]["total_inputs_processed"] == inputs
+    assert kg["analytics"]["extraction_stats"]["successful_extractions"] == inputs
+    assert kg["conversation_metadata"]["entity_mentions"]["Alex"] == inputs
+
+
+def test_interleaved_writers_merge_instead_of_overwriting(kg_file):
+    first, second = open_shared(kg_file), open_shared(kg_file)
+    for i in range(0, 10, 2):
+        ingest(first, i)
+        ingest(second, i + 1)
+    check_merged(kg_file, 10)
+
+
+def test_writers_survive_each_others_compactions(kg_file):
+    first, second = open_shared(kg_file, compact_every=3), open_shared(kg_file, compact_every=4)
+    for i in range(0, 20, 2):
+        ingest(first, i)
+        ingest(second, i + 1)
+    check_merged(kg_file, 20)
+
+
+def test_processes_do_not_lose_updates(tmp_path):
+    result = shared_graph_stress.run(workers=3, inputs=8, llm_latency=0.0, compact_every=5, workdir=str(tmp_path))
+    assert result["ok"], result
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import sqlite3
+
+from conftest import extraction
+from knowledge_graph_store import SQLiteKnowledgeStore
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def open_extractor(tmp_path, **kwargs):
+    store = SQLiteKnowledgeStore(str(tmp_path / "graph.db"))
+    return UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"), store=store,
+                                   response_cache_size=0, **kwargs)
+
+
+def test_async_extract_saves_store_off_the_event_loop(tmp_path):
+    extractor = open_extractor(tmp_path)
+
+    async def generate(messages, max_tokens=800, model=None, cache=True):
+        return json.dumps(extraction(1))
+
+    extractor.agenerate_with_model = generate
+    result = asyncio.run(extractor.aextract_and_store("Yesterday evening was spent on hobby 1 with Alex"))
+    assert result["extraction_successful"]
+    extractor.close()
+
+    reloaded = open_extractor(tmp_path)
+    assert reloaded.knowledge_base_size()["total_triplets"] == 1
+    assert reloaded.kg["meta"]["total_inputs_processed"] == 1
+    reloaded.close()
+
+
+def fact(predicate, obj, confidence=0.9, subject="User"):
+    return {"subject": subject, "predicate": predicate, "object": obj, "category": "interests",
+            "confidence": confidence}
+
+
+def test_integrate_writes_triplets_entities_and_facts(tmp_path):
+    extractor = open_extractor(tmp_path)
+    extractor.integrate_extracted_knowledge(extraction(1), "I picked up hobby 1 with Alex")
+    extractor.integrate_extracted_knowledge(extraction(1), "Hobby 1 again with Alex")
+    store = extractor.store
+
+    assert store.knowledge_base_size() == {"total_triplets": 1, "total_entities": 1, "knowledge_categories": 1}
+    assert store.conn.execute("SELECT seen_count FROM triplets").fetchone()[0] == 2
+    assert store.conn.execute("SELECT mention_count FROM entities WHERE name = 'Alex'").fetchone()[0] == 2
+    assert store.conn.execute("SELECT update_count FROM category_facts").fetchone()[0] == 2
+    extractor.close()
+
+
+def test_store_canonicalizes_entities_like_the_json_graph(tmp_path):
+    extractor = open_extractor(tmp_path)
+    for mention in ["Mom", "mom", "my mother"]:
+        extractor.integrate_extracted_knowledge({
+            "triplets": [fact("cooks_for", "User", subject=mention)],
+            "named_entities": {"people": [mention]}
+        }, f"{mention} cooked dinner")
+    store = extractor.store
+
+    assert store.conn.execute("SELECT name, mention_count FROM entities").fetchall() == [("Mom", 3)]
+    assert store.conn.execute("SELECT subject, seen_count FROM triplets").fetchall() == [("Mom", 3)]
+    extractor.save_knowledge_graph()
+    extractor.close()
+
+    # The alias table persists with the store, so a reopened graph keeps merging
+    reloaded = open_extractor(tmp_path)
+    reloaded.integrate_extracted_knowledge({"named_entities": {"people": ["MY MOTHER"]}}, "Mother called")
+    assert reloaded.store.conn.execute("SELECT name, mention_count FROM entities").fetchall() == [("Mom", 4)]
+    reloaded.close()
+
+
+def test_dedupe_merges_rows_from_before_the_unique_index(tmp_path):
+    extractor = open_extractor(tmp_path)
+    extractor.integrate_extracted_knowledge({"triplets": [fact("plays", "chess", 0.7)]}, "I play chess")
+    store = extractor.store
+    store.conn.execute("DROP INDEX idx_triplets_uid")
+    store.conn.execute("INSERT INTO triplets (id, subject, predicate, object, confidence, seen_count)"
+                       " SELECT id, subject, predicate, object, 0.95, 2 FROM triplets")
+
+    assert extractor.dedupe_knowledge_graph() == 1
+    assert store.conn.execute("SELECT confidence, seen_count FROM triplets").fetchall() == [(0.95, 3)]
+    extractor.close()
+
+
+def test_context_is_ranked_by_relevance(tmp_path):
+    extractor = open_extractor(tmp_path)
+    extractor.integrate_extracted_knowledge({"triplets": [
+        fact("plays", "chess"), fact("likes", "hiking"), fact("owns", "a bicycle"), fact("reads", "poetry")
+    ]}, "My hobbies")
+
+    ranked = extractor.store.ranked_triplets("any good chess openings?", limit=2)
+    assert [row[2] for row in ranked] == ["chess"]
+    context = extractor.export_for_llm_context(max_triplets=1, query="poetry books")
+    assert "User reads poetry" in context and "chess" not in context
+    assert "User plays chess" in extractor.store.extraction_context("chess club tonight")
+    extractor.close()
+
+
+def test_existing_json_graph_is_imported_into_an_empty_store(tmp_path):
+    json_graph = UltraKnowledgeExtractor(kg_file=str(tmp_path / "graph.json"), response_cache_size=0)
+    for i in range(3):
+        json_graph.integrate_extracted_knowledge(extraction(i), f"input {i}")
+        json_graph.save_knowledge_graph()
+
+    extractor = open_extractor(tmp_path)
+    assert extractor.knowledge_base_size()["total_triplets"] == 3
+    assert extractor.kg["meta"]["total_inputs_processed"] == 3
+    assert extractor.kg["entity_aliases"] == json_graph.kg["entity_aliases"]
+    mentions = extractor.store.conn.execute("SELECT input FROM mentions ORDER BY rowid").fetchall()
+    assert [row[0] for row in mentions] == ["input 0", "input 1", "input 2"]
+    extractor.close()
+
+
+def test_writes_become_durable_at_save(tmp_path):
+    extractor = open_extractor(tmp_path)
+    reader = sqlite3.connect(str(tmp_path / "graph.db"))
+    extractor.integrate_extracted_knowledge(extraction(1), "input 1")
+    assert reader.execute("SELECT COUNT(*) FROM triplets").fetchone()[0] == 0
+
+    extractor.save_knowledge_graph()
+    assert reader.execute("SELECT COUNT(*) FROM triplets").fetchone()[0] == 1
+    meta = json.loads(reader.execute("SELECT value FROM kv WHERE key = 'meta'").fetchone()[0])
+    assert meta["total_inputs_processed"] == 1
+    extractor.close()
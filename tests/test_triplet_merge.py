@@ -0,0 +1,36 @@
+import json
+
+from ultra_knowledge_extractor import UltraKnowledgeExtractor
+
+
+def fact(confidence):
+    return {"triplets": [{"subject": "User", "predicate": "plays", "object": "chess", "category": "interests",
+                          "confidence": confidence}]}
+
+
+def test_re_extracted_triplet_is_merged_not_appended(kg_file):
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+    extractor.integrate_extracted_knowledge(fact(0.7), "I play chess", current_time="2025-01-01 10:00:00")
+    extractor.integrate_extracted_knowledge(fact(0.95), "Chess again", current_time="2025-01-02 10:00:00")
+    extractor.integrate_extracted_knowledge(fact(0.8), "More chess", current_time="2025-01-03 10:00:00")
+
+    assert len(extractor.kg["triplets"]) == 1
+    triplet = next(iter(extractor.kg["triplets"]))
+    assert triplet["seen_count"] == 3
+    assert triplet["confidence"] == 0.95
+    assert triplet["extracted_at"] == "2025-01-03 10:00:00"
+    assert len(extractor.kg["relationships"]["plays"]) == 1
+
+
+def test_dedupe_folds_duplicates_in_an_older_graph(kg_file):
+    row = {"subject": "User", "predicate": "plays", "object": "chess", "category": "interests"}
+    with open(kg_file, 'w') as f:
+        json.dump({"triplets": [{**row, "confidence": 0.6, "extracted_at": "2025-01-02 00:00:00"},
+                                {**row, "confidence": 0.9, "extracted_at": "2025-01-01 00:00:00"},
+                                {**row, "object": "go", "confidence": 0.8}]}, f)
+    extractor = UltraKnowledgeExtractor(kg_file=kg_file, response_cache_size=0)
+
+    assert extractor.dedupe_knowledge_graph() == 1
+    chess = extractor.kg["triplets"].find(extractor.generate_triplet_id(row))
+    assert (chess["seen_count"], chess["confidence"], chess["extracted_at"]) == (2, 0.9, "2025-01-02 00:00:00")
+    assert len(extractor.kg["triplets"]) == 2
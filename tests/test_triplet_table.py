@@ -0,0 +1,54 @@
+from triplet_table import TripletTable
+
+ROWS = [
+    {"subject": "User", "predicate": "likes", "object": "jazz", "category": "interests", "confidence": 0.9,
+     "id": "a1", "extracted_at": "2025-01-02 10:00:00.000001", "source_input": "I like jazz and Lisbon",
+     "seen_count": 2, "temporal_info": "since 2019"},
+    {"subject": "User", "predicate": "likes", "object": "Lisbon", "id": "b2",
+     "source_input": "I like jazz and Lisbon"},
+    {"subject": "Alex", "predicate": "sister_of", "object": "User", "confidence": 1.0, "id": "c3"},
+]
+
+
+def test_columns_round_trip_keeps_every_field():
+    table = TripletTable(ROWS)
+    restored = TripletTable.from_columns(table.to_columns())
+
+    assert restored.to_json() == table.to_json()
+    assert restored.to_json()[0] == ROWS[0]
+    assert restored.find("c3")["subject"] == "Alex"
+
+
+def test_source_inputs_are_stored_once():
+    table = TripletTable(ROWS)
+    columns = table.to_columns()
+    assert columns["source_input_pool"] == ["I like jazz and Lisbon"]
+    assert columns["source_input_refs"] == [0, 0, -1]
+
+    restored = TripletTable.from_columns(columns)
+    assert restored[0]["source_input"] is restored[1]["source_input"]
+    assert "source_input" not in restored[2]
+
+
+def test_columns_from_older_snapshots_still_load():
+    columns = TripletTable(ROWS).to_columns()
+    del columns["source_input_pool"], columns["source_input_refs"]
+    columns["source_inputs"] = [row.get("source_input") for row in ROWS]
+    assert TripletTable.from_columns(columns).to_json() == TripletTable(ROWS).to_json()
+
+
+def test_records_behave_like_dicts():
+    table = TripletTable(ROWS)
+    record = table[1]
+
+    assert record["object"] == "Lisbon" and record.get("confidence") is None and record.get("x", 7) == 7
+    assert "category" not in record and "source_input" in record
+    assert {**record} == ROWS[1]
+    assert table[-1]["id"] == "c3"
+
+    record["confidence"] = 0.75
+    record["seen_count"] = 3
+    record["object"] = "Porto"
+    record["note"] = "moved"
+    assert table.to_json()[1] == {**ROWS[1], "object": "Porto", "confidence": 0.75, "seen_count": 3, "note": "moved"}
+    assert table.objects[1] == "Porto" and table.confidences[1] == 0.75
@@ -0,0 +1,257 @@
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NO_TIMESTAMP = -(2 ** 63)
+
+# Fields held in typed columns; anything else the model adds goes to a per-row extras dict
+COLUMN_FIELDS = ("id", "subject", "predicate", "object", "category", "confidence",
+                 "extracted_at", "source_input", "seen_count")
+
+
+def timestamp_to_micros(value: Any) -> Optional[int]:
+    """str(datetime) -> microseconds since the epoch, None if it isn't one"""
+    try:
+        return (datetime.fromisoformat(value) - EPOCH) // MICROSECOND
+    except (TypeError, ValueError):
+        return None
+
+
+def micros_to_timestamp(value: int) -> str:
+    return str(EPOCH + value * MICROSECOND)
+
+
+class TripletRecord:
+    """Mapping-style view of one row of a TripletTable
+
+    Supports the dict operations the extractor uses on triplets (item
+    access, get, assignment, ** unpacking) without materializing a dict.
+    """
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "TripletTable", row: int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key: str) -> Any:
+        return self.table.get_field(self.row, key)
+
+    def __setitem__(self, key: str, value: Any):
+        self.table.set_field(self.row, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self.table.get_field(self.row, key)
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self.table.get_field(self.row, key)
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return self.table.row_keys(self.row)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+
+class TripletTable:
+    """Column-oriented triplet store replacing the list of per-triplet dicts
+
+    Strings are interned in a table-local pool so repeated subjects,
+    predicates, categories and source inputs share one object; confidence
+    is float32 and timestamps are int64 microseconds in typed arrays. The
+    table converts to and from the JSON list-of-dicts schema at I/O time.
+    """
+
+    def __init__(self, triplets: Optional[List[Dict]] = None):
+        self.strings: Dict[str, str] = {}
+        self.ids: List[str] = []
+        self.subjects: List[str] = []
+        self.predicates: List[str] = []
+        self.objects: List[str] = []
+        self.categories: List[Optional[str]] = []
+        self.source_inputs: List[Optional[str]] = []
+        self.confidences = array("f")
+        self.has_confidence = bytearray()
+        self.extracted_at = array("q")
+        self.seen_counts = array("l")
+        self.extras: List[Optional[Dict]] = []
+        self.id_rows: Dict[str, int] = {}
+
+        for triplet in triplets or []:
+            self.append(triplet)
+
+    def intern(self, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return self.strings.setdefault(value, value)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[TripletRecord]:
+        for row in range(len(self.ids)):
+            yield TripletRecord(self, row)
+
+    def __getitem__(self, row: int) -> TripletRecord:
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError(row)
+        return TripletRecord(self, row)
+
+    def find(self, triplet_id: str) -> Optional[TripletRecord]:
+        """Record for a triplet ID (first row if the table holds duplicates)"""
+        row = self.id_rows.get(triplet_id)
+        return None if row is None else TripletRecord(self, row)
+
+    def append(self, triplet: Dict) -> TripletRecord:
+        row = len(self.ids)
+        triplet_id = triplet.get("id", "")
+        self.ids.append(triplet_id)
+        self.id_rows.setdefault(triplet_id, row)
+        self.subjects.append(self.intern(triplet["subject"]))
+        self.predicates.append(self.intern(triplet["predicate"]))
+        self.objects.append(self.intern(triplet["object"]))
+        self.categories.append(self.intern(triplet.get("category")))
+        self.source_inputs.append(self.intern(triplet.get("source_input")))
+        self.confidences.append(0.0)
+        self.has_confidence.append(0)
+        self.extracted_at.append(NO_TIMESTAMP)
+        self.seen_counts.append(0)
+        self.extras.append(None)
+
+        for key in ("confidence", "extracted_at", "seen_count"):
+            if key in triplet:
+                self.set_field(row, key, triplet[key])
+        for key, value in triplet.items():
+            if key not in COLUMN_FIELDS:
+                self.set_field(row, key, value)
+        return TripletRecord(self, row)
+
+    def get_field(self, row: int, key: str) -> Any:
+        if key == "id":
+            return self.ids[row]
+        if key == "subject":
+            return self.subjects[row]
+        if key == "predicate":
+            return self.predicates[row]
+        if key == "object":
+            return self.objects[row]
+        if key == "category" and self.categories[row] is not None:
+            return self.categories[row]
+        if key == "source_input" and self.source_inputs[row] is not None:
+            return self.source_inputs[row]
+        if key == "confidence" and self.has_confidence[row]:
+            # float32 storage; round back to what the model emitted
+            return round(self.confidences[row], 6)
+        if key == "extracted_at" and self.extracted_at[row] != NO_TIMESTAMP:
+            return micros_to_timestamp(self.extracted_at[row])
+        if key == "seen_count" and self.seen_counts[row]:
+            return self.seen_counts[row]
+        extras = self.extras[row]
+        if extras is not None and key in extras:
+            return extras[key]
+        raise KeyError(key)
+
+    def set_field(self, row: int, key: str, value: Any):
+        micros = timestamp_to_micros(value) if key == "extracted_at" else None
+        if key == "confidence" and isinstance(value, (int, float)):
+            self.confidences[row] = value
+            self.has_confidence[row] = 1
+        elif micros is not None:
+            self.extracted_at[row] = micros
+        elif key == "seen_count" and isinstance(value, int) and value > 0:
+            self.seen_counts[row] = value
+        elif key in ("subject", "predicate", "object", "category", "source_input"):
+            column = {"subject": self.subjects, "predicate": self.predicates, "object": self.objects,
+                      "category": self.categories, "source_input": self.source_inputs}[key]
+            column[row] = self.intern(value)
+        elif key == "id":
+            self.ids[row] = value
+            self.id_rows.setdefault(value, row)
+        else:
+            if self.extras[row] is None:
+                self.extras[row] = {}
+            self.extras[row][self.intern(key)] = self.intern(value)
+
+    def row_keys(self, row: int) -> List[str]:
+        keys = ["subject", "predicate", "object"]
+        if self.categories[row] is not None:
+            keys.append("category")
+        if self.has_confidence[row]:
+            keys.append("confidence")
+        if self.extras[row]:
+            keys.extend(self.extras[row])
+        keys.append("id")
+        if self.extracted_at[row] != NO_TIMESTAMP:
+            keys.append("extracted_at")
+        if self.source_inputs[row] is not None:
+            keys.append("source_input")
+        if self.seen_counts[row]:
+            keys.append("seen_count")
+        return keys
+
+    def top_by_confidence(self, limit: int) -> List[TripletRecord]:
+        """Highest confidence first, newest first among ties, from the typed columns"""
+        rows = sorted(range(len(self.ids)),
+                      key=lambda row: (self.confidences[row], self.extracted_at[row]), reverse=True)
+        return [TripletRecord(self, row) for row in rows[:limit]]
+
+    def to_json(self) -> List[Dict]:
+        """The JSON list-of-dicts schema"""
+        return [record.to_dict() for record in self]
+
+    def to_columns(self) -> Dict[str, List]:
+        """Column lists for binary snapshots - rebuilt without per-row parsing
+
+        Source inputs are written once each, with rows referring to them by
+        index (-1 for none), since every triplet from one input repeats it.
+        """
+        pool: Dict[str, int] = {}
+        source_refs = [-1 if text is None else pool.setdefault(text, len(pool)) for text in self.source_inputs]
+        return {
+            "ids": self.ids,
+            "subjects": self.subjects,
+            "predicates": self.predicates,
+            "objects": self.objects,
+            "categories": self.categories,
+            "source_input_pool": list(pool),
+            "source_input_refs": source_refs,
+            "confidences": self.confidences.tolist(),
+            "has_confidence": list(self.has_confidence),
+            "extracted_at": self.extracted_at.tolist(),
+            "seen_counts": self.seen_counts.tolist(),
+            "extras": self.extras
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List]) -> "TripletTable":
+        table = cls()
+        for name in ("subjects", "predicates", "objects", "categories"):
+            setattr(table, name, [table.intern(value) for value in columns[name]])
+        if "source_input_refs" in columns:
+            pool = [table.intern(text) for text in columns["source_input_pool"]]
+            table.source_inputs = [None if ref < 0 else pool[ref] for ref in columns["source_input_refs"]]
+        else:  # snapshots written before source inputs were pooled
+            table.source_inputs = [table.intern(value) for value in columns["source_inputs"]]
+        table.ids = columns["ids"]
+        table.confidences = array("f", columns["confidences"])
+        table.has_confidence = bytearray(columns["has_confidence"])
+        table.extracted_at = array("q", columns["extracted_at"])
+        table.seen_counts = array("l", columns["seen_counts"])
+        table.extras = columns["extras"]
+        for row, triplet_id in enumerate(table.ids):
+            table.id_rows.setdefault(triplet_id, row)
+        return table
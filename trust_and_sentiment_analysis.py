@@ -1,18 +1,54 @@
+import asyncio
 import json
 import datetime
 import time
-import re
-from openai import OpenAI
+from ollama_client import DEFAULT_KEEP_ALIVE, ResponseCache, get_async_client, get_connection
+from llm_json import CompiledSchema, drop_invalid, parse_json_object, structured_output
+from instrumentation import Metrics, NULL_METRICS, timed
+from prompt_budget import count_message_tokens, count_tokens, truncate_to_tokens, DEFAULT_PROMPT_BUDGET
 from typing import Dict, List, Any, Optional
 
+SYSTEM_PROMPT = "You are a therapeutic conversation analyst. Respond only with valid JSON."
+
+# Neutral values for required fields the model left out or got wrong
+ANALYSIS_DEFAULTS = {
+    "trust_trend": "STABLE",
+    "trust_confidence": 0.5,
+    "sentiment_trend": "NEUTRAL",
+    "sentiment_confidence": 0.5
+}
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "required": list(ANALYSIS_DEFAULTS) + ["key_indicators", "analysis_summary"],
+    "properties": {
+        "trust_trend": {"type": "string", "enum": ["INCREASING", "DECREASING", "STABLE"]},
+        "trust_confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "sentiment_trend": {"type": "string", "enum": ["IMPROVING", "DECLINING", "NEUTRAL"]},
+        "sentiment_confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "key_indicators": {"type": "array", "items": {"type": "string"}},
+        "analysis_summary": {"type": "string"},
+        "timestamp": {"type": "string"}
+    }
+}
+ANALYSIS_VALIDATOR = CompiledSchema(ANALYSIS_SCHEMA)
+
 class OllamaTrustSentimentAnalyzer:
-    def __init__(self, ollama_host="http://localhost:11434"):
+    def __init__(self, ollama_host="http://localhost:11434", metrics: Optional[Metrics] = None,
+                 keep_alive: str = DEFAULT_KEEP_ALIVE):
         """Initialize Ollama-based Trust & Sentiment Analyzer"""
         self.ollama_host = ollama_host
+        # Per-stage timers and counters; the default no-op sink costs nothing
+        self.metrics = metrics or NULL_METRICS
+        # Process-wide pooled connection, shared with any extractor on the same host
+        self.connection = None
         self.ollama_client = None
+        self.keep_alive = keep_alive  # how long setup_model's preload keeps the model resident
         self.current_model = None
         self.chat_history = []
         self.analysis_history = []
+        # Serializes async access to chat/analysis history; LLM calls run outside it
+        self._history_lock = asyncio.Lock()
         
         # Single model configuration - only Qwen 3B
         self.models = {
@@ -21,7 +57,8 @@ class OllamaTrustSentimentAnalyzer:
                 "model_id": "qwen2.5:3b",
                 "family": "Qwen",
                 "supports_thinking": False,
-                "description": "Alibaba's powerful instruction model - comprehensive analysis"
+                "description": "Alibaba's powerful instruction model - comprehensive analysis",
+                "prompt_budget": 1024  # prompt tokens per analysis call
             }
         }
         
@@ -29,17 +66,17 @@ class OllamaTrustSentimentAnalyzer:
         self.disable_thinking = True  # Default to fast mode
         self.max_tokens = 1000  # Optimized for speed
         self.temperature = 0.1  # Consistent results
+        # Constrain output to ANALYSIS_SCHEMA; switched off if the server rejects it
+        self.structured_output = True
         
     def setup_ollama_client(self):
         """Setup OpenAI client pointing to Ollama"""
         try:
-            self.ollama_client = OpenAI(
-                base_url=f"{self.ollama_host}/v1",
-                api_key="ollama"  # Required but unused
-            )
+            self.connection = get_connection(self.ollama_host)
+            self.ollama_client = self.connection.client
             
             # Test connection
-            models = self.ollama_client.models.list()
+            self.connection.installed_models()
             print(f"✅ Connected to Ollama at {self.ollama_host}")
             return True
             
@@ -74,38 +111,67 @@ class OllamaTrustSentimentAnalyzer:
         model_info = self.models[model_choice]
         print(f"\n🔄 Setting up {model_info['name']}...")
         
-        # Test model availability
+        # Test model availability against the models list, then load it ahead of the first analysis
         try:
-            test_response = self.ollama_client.chat.completions.create(
-                model=model_info["model_id"],
-                messages=[{"role": "user", "content": "Hello"}],
-                max_tokens=10,
-                temperature=0.1
-            )
-            
-            if test_response.choices:
-                self.current_model = model_info
-                print(f"✅ Successfully loaded {model_info['name']}")
-                return True
-            else:
-                print(f"❌ No response from {model_info['name']}")
+            if not self.connection.has_model(model_info["model_id"]):
+                print(f"❌ {model_info['name']} is not installed")
+                print(f"💡 Install it with: 'ollama pull {model_info['model_id']}'")
                 return False
+            
+            if model_info["model_id"] not in self.connection.preloaded:
+                if not self.connection.preload(model_info["model_id"], self.keep_alive):
+                    print(f"⚠️ Could not preload {model_info['name']} - the first analysis will load it")
+            
+            self.current_model = model_info
+            print(f"✅ Successfully loaded {model_info['name']}")
+            return True
                 
         except Exception as e:
             print(f"❌ Error testing model: {e}")
             print(f"💡 Make sure model is installed: 'ollama pull {model_info['model_id']}'")
             return False
     
+    def prompt_budget(self) -> int:
+        """Prompt tokens allowed per call for the current model"""
+        return (self.current_model or {}).get("prompt_budget", DEFAULT_PROMPT_BUDGET)
+    
+    def build_messages(self, prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    @timed("analysis_prompt")
     def create_analysis_prompt(self, current_message: str, chat_history: List[Dict]) -> str:
-        """Create optimized prompt for trust and sentiment analysis"""
+        """Create optimized prompt for trust and sentiment analysis
+        
+        Chat history gets what the prompt budget leaves after the
+        instructions and the current message, newest messages first.
+        """
+        timestamp = datetime.datetime.now().isoformat()
+        history_budget = self.prompt_budget() - count_message_tokens(
+            self.build_messages(self.format_analysis_prompt(current_message, "", timestamp)))
         
         # Build concise chat history (max 3 messages for speed)
+        history_lines = []
+        for msg in reversed(chat_history[-3:]):  # Last 3 messages
+            line_tokens = count_tokens(msg['content']) + 4  # "Message i: " and newline
+            if line_tokens > history_budget:
+                if not history_lines and history_budget > 4:
+                    # The latest message alone is over budget - keep its start
+                    history_lines.append(truncate_to_tokens(msg['content'], history_budget - 4))
+                break
+            history_budget -= line_tokens
+            history_lines.append(msg['content'])
+        
         history_text = ""
-        if chat_history:
-            recent_messages = chat_history[-3:]  # Last 3 messages
-            for i, msg in enumerate(recent_messages, 1):
-                history_text += f"Message {i}: {msg['content']}\n"
+        for i, content in enumerate(reversed(history_lines), 1):
+            history_text += f"Message {i}: {content}\n"
         
+        return self.format_analysis_prompt(current_message, history_text, timestamp)
+    
+    @staticmethod
+    def format_analysis_prompt(current_message: str, history_text: str, timestamp: str) -> str:
         # Optimized prompt - shorter for faster processing
         prompt = f"""You are an AI analyst for therapeutic conversations. Analyze trust and sentiment patterns.
 
@@ -132,13 +198,33 @@ Return ONLY this JSON format:
     "sentiment_confidence": 0.8,
     "key_indicators": ["indicator1", "indicator2"],
     "analysis_summary": "Brief explanation",
-    "timestamp": "{datetime.datetime.now().isoformat()}"
+    "timestamp": "{timestamp}"
 }}
 
 JSON only, no other text."""
         
         return prompt
     
+    def generation_params(self, messages: List[Dict]) -> Dict[str, Any]:
+        params = {
+            "model": self.current_model["model_id"],
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": False
+        }
+        if self.structured_output:
+            params["response_format"] = structured_output("trust_sentiment_analysis", ANALYSIS_SCHEMA)
+        return params
+    
+    def structured_output_rejected(self, error: Exception, params: Dict[str, Any]) -> bool:
+        """True (and structured output off from now on) if error is the server refusing response_format"""
+        if "response_format" not in params or getattr(error, "status_code", None) != 400:
+            return False
+        self.structured_output = False
+        print("⚠️ Server does not support structured output - relying on the prompt for JSON")
+        return True
+    
     def generate_analysis(self, prompt: str) -> str:
         """Generate analysis using Ollama with optimizations"""
         if not self.ollama_client or not self.current_model:
@@ -146,74 +232,89 @@ JSON only, no other text."""
         
         try:
             # Prepare messages
-            messages = [
-                {
-                    "role": "system", 
-                    "content": "You are a therapeutic conversation analyst. Respond only with valid JSON."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ]
-            
-            # Generation parameters
-            generation_params = {
-                "model": self.current_model["model_id"],
-                "messages": messages,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "stream": False
-            }
-            
-            # Generate response
-            response = self.ollama_client.chat.completions.create(**generation_params)
+            messages = self.build_messages(prompt)
             
-            return response.choices[0].message.content
+            # Identical prompts already in flight share one generation
+            if self.connection is not None:
+                key = ResponseCache.make_key(self.current_model["model_id"], messages, self.max_tokens)
+                return self.connection.coalescer.run(key, lambda: self.complete(messages))
+            return self.complete(messages)
             
         except Exception as e:
             raise Exception(f"Generation failed: {str(e)}")
     
-    def parse_analysis_response(self, response: str) -> Dict[str, Any]:
-        """Parse and validate analysis response"""
+    def complete(self, messages: List[Dict]) -> str:
+        # Generation parameters
+        generation_params = self.generation_params(messages)
+        
+        # Generate response
+        self.metrics.inc("analysis_llm_calls")
+        with self.metrics.timer("analysis_llm_call"):
+            try:
+                response = self.ollama_client.chat.completions.create(**generation_params)
+            except Exception as e:
+                if not self.structured_output_rejected(e, generation_params):
+                    raise
+                response = self.ollama_client.chat.completions.create(**self.generation_params(messages))
+        self.metrics.record_usage(getattr(response, "usage", None))
+        
+        return response.choices[0].message.content
+    
+    async def agenerate_analysis(self, prompt: str) -> str:
+        """Async generate_analysis on the shared AsyncOpenAI connection pool"""
+        if not self.current_model:
+            raise Exception("Model not loaded")
+        
         try:
-            # Remove thinking tokens if they appear
-            cleaned_response = self.clean_response(response)
-            
-            # Find JSON in response
-            json_match = re.search(r'\{.*\}', cleaned_response, re.DOTALL)
-            if not json_match:
-                raise ValueError("No JSON found in response")
-            
-            json_str = json_match.group()
-            analysis_result = json.loads(json_str)
-            
-            # Validate required fields
-            required_fields = ["trust_trend", "sentiment_trend", "trust_confidence", "sentiment_confidence"]
-            for field in required_fields:
-                if field not in analysis_result:
-                    analysis_result[field] = "STABLE" if "trend" in field else 0.5
-            
-            return analysis_result
+            messages = self.build_messages(prompt)
+            if self.connection is not None:
+                key = ResponseCache.make_key(self.current_model["model_id"], messages, self.max_tokens)
+                return await self.connection.coalescer.arun(key, lambda: self.acomplete(messages))
+            return await self.acomplete(messages)
             
-        except json.JSONDecodeError as e:
-            print(f"⚠️ JSON parsing error: {e}")
-            print("Response content:", response)
-            return self.create_fallback_analysis(response)
         except Exception as e:
-            print(f"⚠️ Analysis parsing error: {e}")
-            return self.create_fallback_analysis(response)
+            raise Exception(f"Generation failed: {str(e)}")
+    
+    async def acomplete(self, messages: List[Dict]) -> str:
+        client = get_async_client(self.ollama_host)
+        generation_params = self.generation_params(messages)
+        self.metrics.inc("analysis_llm_calls")
+        with self.metrics.timer("analysis_llm_call"):
+            try:
+                response = await client.chat.completions.create(**generation_params)
+            except Exception as e:
+                if not self.structured_output_rejected(e, generation_params):
+                    raise
+                response = await client.chat.completions.create(**self.generation_params(messages))
+        self.metrics.record_usage(getattr(response, "usage", None))
+        
+        return response.choices[0].message.content
     
-    def clean_response(self, response: str) -> str:
-        """Clean response by removing thinking tokens and extra content"""
-        # Remove thinking blocks if present
-        cleaned = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
+    @timed("analysis_parse")
+    def parse_analysis_response(self, response: str) -> Dict[str, Any]:
+        """Parse and validate analysis response
+        
+        The first JSON object after any thinking block is read in one pass
+        and repaired if need be. Fields that fail ANALYSIS_SCHEMA fall back
+        to neutral defaults instead of discarding the whole analysis.
+        """
+        analysis_result, _ = parse_json_object(response)
+        if isinstance(analysis_result, dict):
+            for field in ("trust_trend", "sentiment_trend"):
+                if isinstance(analysis_result.get(field), str):
+                    analysis_result[field] = analysis_result[field].strip().upper()
+            analysis_result = drop_invalid(analysis_result, ANALYSIS_VALIDATOR.errors(analysis_result))
+        
+        if not isinstance(analysis_result, dict):
+            print("⚠️ Analysis parsing error: no JSON object in response")
+            self.metrics.inc("analysis_parse_failures")
+            return self.create_fallback_analysis(response)
         
-        # Remove common prefixes/suffixes
-        cleaned = re.sub(r'^.*?(?=\{)', '', cleaned, flags=re.DOTALL)
-        cleaned = re.sub(r'\}.*?$', '}', cleaned, flags=re.DOTALL)
+        # Validate required fields
+        for field, default in ANALYSIS_DEFAULTS.items():
+            analysis_result.setdefault(field, default)
         
-        return cleaned.strip()
+        return analysis_result
     
     def create_fallback_analysis(self, raw_response: str) -> Dict[str, Any]:
         """Create fallback analysis when parsing fails"""
@@ -268,11 +369,12 @@ JSON only, no other text."""
             processing_time = time.time() - start_time
             analysis_result["processing_time_seconds"] = round(processing_time, 2)
             analysis_result["model_used"] = self.current_model["name"]
+            analysis_result["prompt_tokens"] = count_message_tokens(self.build_messages(prompt))
             
             # Store analysis
             self.analysis_history.append(analysis_result)
             
-            print(f"✅ Analysis completed in {processing_time:.2f}s")
+            print(f"✅ Analysis completed in {processing_time:.2f}s ({analysis_result['prompt_tokens']} prompt tokens)")
             return analysis_result
             
         except Exception as e:
@@ -284,6 +386,39 @@ JSON only, no other text."""
             self.analysis_history.append(error_result)
             return error_result
     
+    async def aperform_analysis(self, current_message: str) -> Dict[str, Any]:
+        """Async perform_analysis - history is locked only while read or appended"""
+        if not self.current_model:
+            return {"error": "No model loaded", "timestamp": datetime.datetime.now().isoformat()}
+        
+        try:
+            start_time = time.time()
+            
+            async with self._history_lock:
+                prompt = self.create_analysis_prompt(current_message, list(self.chat_history))
+            
+            response = await self.agenerate_analysis(prompt)
+            analysis_result = self.parse_analysis_response(response)
+            
+            processing_time = time.time() - start_time
+            analysis_result["processing_time_seconds"] = round(processing_time, 2)
+            analysis_result["model_used"] = self.current_model["name"]
+            analysis_result["prompt_tokens"] = count_message_tokens(self.build_messages(prompt))
+            
+            async with self._history_lock:
+                self.analysis_history.append(analysis_result)
+            return analysis_result
+            
+        except Exception as e:
+            error_result = {
+                "error": str(e),
+                "model_used": self.current_model["name"] if self.current_model else "unknown",
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            async with self._history_lock:
+                self.analysis_history.append(error_result)
+            return error_result
+    
     def add_user_message(self, message: str):
         """Add user message to chat history"""
         self.chat_history.append({
@@ -346,7 +481,7 @@ JSON only, no other text."""
         # Overall performance summary
         if successful_analyses > 0:
             avg_time = total_time / successful_analyses
-            print(f"\n📈 Performance Summary:")
+            print("\n📈 Performance Summary:")
             print(f"   Successful Analyses: {successful_analyses}/{len(self.analysis_history)}")
             print(f"   Average Processing Time: {avg_time:.2f}s")
             print(f"   Total Processing Time: {total_time:.2f}s")
@@ -365,6 +500,8 @@ JSON only, no other text."""
             "analysis_history": self.analysis_history,
             "session_end": datetime.datetime.now().isoformat()
         }
+        if self.metrics.enabled:
+            session_data["metrics"] = self.metrics.snapshot()
         
         with open(filename, 'w') as f:
             json.dump(session_data, f, indent=2)
@@ -388,7 +525,7 @@ def main():
     print("="*60)
     
     # Initialize analyzer
-    analyzer = OllamaTrustSentimentAnalyzer()
+    analyzer = OllamaTrustSentimentAnalyzer(metrics=Metrics())
     
     # Setup Ollama connection
     print("\n🔌 Connecting to Ollama...")
@@ -438,7 +575,7 @@ def main():
     if demo_choice == "1":
         # Sample conversation
         sample_messages = create_sample_therapeutic_conversation()
-        print(f"\n🎭 Running sample conversation analysis...")
+        print("\n🎭 Running sample conversation analysis...")
         print(f"Model: {analyzer.current_model['name']}")
         
         for i, message in enumerate(sample_messages, 1):
@@ -1,41 +1,227 @@
+import argparse
+import asyncio
+import itertools
 import json
 import os
-import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Tuple, Any, Optional, Set
+from typing import Dict, List, Tuple, Any, Optional, Callable
 from collections import defaultdict, Counter
+from collections.abc import MutableMapping
 import hashlib
-from openai import OpenAI  # Add this import
+from knowledge_graph_store import KnowledgeGraphStore, META_SECTIONS
+from knowledge_retrieval import BM25Index, InvertedIndex, tokenize
+from graph_query import AdjacencyIndex
+from entity_resolver import EntityResolver, normalize_entity
+from ollama_client import DEFAULT_KEEP_ALIVE, ResponseCache, get_async_client, get_connection
+from rule_extractor import RuleBasedExtractor
+from llm_json import StreamingJSONScanner, CompiledSchema, drop_invalid, parse_json_object, structured_output
+from triplet_table import TripletTable
+from kg_schema import KnowledgeGraphSchema, SCHEMA_VERSION
+from instrumentation import Metrics, NULL_METRICS, timed
+from model_router import ModelRouter
+from group_commit import GroupCommitWriter, install_signal_handler, synchronized
+from prompt_budget import (PromptBudget, DEFAULT_PROMPT_BUDGET, count_message_tokens,
+                           fit_context, priority, rank_score, recency_scores)
+import kg_snapshot
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows) - shared mode unavailable
+    fcntl = None
+
+# Caps applied as the graph grows; None disables a cap
+DEFAULT_RETENTION = {
+    "max_contexts_per_entity": 10,       # ring buffer of mentions per named entity
+    "max_contexts_per_fact": 5,          # ring buffer of source contexts per category fact
+    "max_items_per_metadata_list": 200,  # ring buffer per conversation_metadata list
+    "growth_bucket": "hour",             # entity_growth rollup granularity
+    "max_growth_buckets": 24 * 90
+}
+
+# Prefix of str(datetime) that identifies a rollup bucket
+GROWTH_BUCKET_LENGTHS = {"minute": 16, "hour": 13, "day": 10}
+
+# Candidates ranked for the extraction context before the token budget trims them
+CONTEXT_CANDIDATES = {"topics": 10, "entities": 30, "facts": 20}
+NO_CONTEXT = "No existing context available."
+
+# Extracted lists that are appended to conversation_metadata as-is
+METADATA_KEYS = ["topics_mentioned", "emotional_indicators", "temporal_markers",
+                 "relationship_dynamics", "behavior_patterns", "decision_factors",
+                 "communication_style", "priority_indicators"]
+
+# What extraction prompts ask for; sent to Ollama as the structured output
+# format and checked again on parse, dropping only the invalid parts
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "required": ["triplets", "named_entities", "topics_mentioned"],
+    "properties": {
+        "triplets": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["subject", "predicate", "object"],
+                "properties": {
+                    "subject": {"type": "string"},
+                    "predicate": {"type": "string"},
+                    "object": {"type": ["string", "number"]},
+                    "category": {"type": "string"},
+                    "subcategory": {"type": "string"},
+                    "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                    "temporal_info": {"type": "string"},
+                    "context": {"type": "string"}
+                }
+            }
+        },
+        "named_entities": {
+            "type": "object",
+            "additionalProperties": {"type": "array", "items": {"type": "string"}}
+        },
+        **{key: {"type": "array"} for key in METADATA_KEYS},
+        "topics_mentioned": {"type": "array", "items": {"type": "string"}}
+    }
+}
+EXTRACTION_VALIDATOR = CompiledSchema(EXTRACTION_SCHEMA)
+
+# Extraction stats that replaying integrate records already reproduces, so
+# shared-mode save records leave them out of their stats delta
+JOURNALED_COUNTERS = {"total_extractions"}
+
 
 class UltraKnowledgeExtractor:
-    def __init__(self, kg_file="ultra_knowledge_graph.json", ollama_host="http://localhost:11434"):
+    def __init__(self, kg_file="ultra_knowledge_graph.json", ollama_host="http://localhost:11434",
+                 journal_mode: bool = False, compact_every: int = 500,
+                 store: Optional[KnowledgeGraphStore] = None,
+                 response_cache_size: int = 256, response_cache_file: Optional[str] = None,
+                 stream_generation: bool = False, retention: Optional[Dict] = None,
+                 snapshot_format: Optional[str] = None, shared: bool = False,
+                 metrics: Optional[Metrics] = None, router: Optional[ModelRouter] = None,
+                 keep_alive: str = DEFAULT_KEEP_ALIVE, save_interval: Optional[float] = None,
+                 max_unsaved_inputs: Optional[int] = None):
         """Initialize the Ultra Knowledge Graph Extraction System with Ollama"""
         self.kg_file = kg_file
         self.ollama_host = ollama_host
+        # Per-stage timers and counters; the default no-op sink costs nothing
+        self.metrics = metrics or NULL_METRICS
         
-        # Updated model definitions for Ollama
+        # Optional storage backend (e.g. SQLiteKnowledgeStore); when set, the bulky
+        # graph sections live in the store and self.kg only carries meta/analytics
+        self.store = store
+        
+        # Write-ahead journal: saves append one compact record per integration
+        # instead of rewriting the whole graph; compaction folds it into the snapshot
+        self.journal_mode = journal_mode or shared
+        self.journal_file = f"{kg_file}.journal"
+        self.compact_every = compact_every
+        self._journal_seq = 0
+        self._journal_records_since_compact = 0
+        self._pending_journal = []
+        self._journal_offset = 0    # bytes of the journal already applied to self.kg
+        self._journal_head = None   # first line; compaction starts the file with a new one
+        
+        # Shared mode: several processes use the same kg_file. Journal appends and
+        # compactions happen under an fcntl lock, after first applying the records
+        # other processes appended; save records carry stats deltas, not totals
+        if shared and fcntl is None:
+            raise RuntimeError("shared mode needs fcntl advisory locks, which this platform lacks")
+        self.shared = shared
+        self.lock_file = f"{kg_file}.lock"
+        self._lock_handle = None
+        self._stats_baseline = {}
+        
+        # "json" (pretty-printed) or "binary" (sectioned, memory-mapped, sections
+        # decoded on first touch); defaults to the existing file's format
+        if snapshot_format is None:
+            is_binary = kg_snapshot.is_snapshot(kg_file) or (not os.path.exists(kg_file) and kg_file.endswith(".ukg"))
+            snapshot_format = "binary" if is_binary else "json"
+        self.snapshot_format = snapshot_format
+        
+        # Updated model definitions for Ollama. prompt_budget caps the prompt
+        # tokens per call; Ollama's default 2048-token window also has to hold
+        # the 800-token response
         self.available_models = {
             "1": {
                 "name": "Llama-3.2-1B (Fastest)",
                 "model_id": "llama3.2:1b",
-                "type": "ollama"
+                "type": "ollama",
+                "prompt_budget": 768
             },
             "2": {
                 "name": "Llama-3.2-3B (Balanced)", 
                 "model_id": "llama3.2:3b",
-                "type": "ollama"
+                "type": "ollama",
+                "prompt_budget": 1024
             },
             "3": {
                 "name": "Llama-3.1-8B (Best Quality)",
                 "model_id": "llama3.1:8b",
-                "type": "ollama"
+                "type": "ollama",
+                "prompt_budget": 1200
             }
         }
         
         self.current_model = None
+        # Process-wide pooled connection to ollama_host, set up by setup_llm
+        self.connection = None
         self.ollama_client = None
+        self.keep_alive = keep_alive  # how long setup_llm's preload keeps the model resident
+        # Optional per-input choice among available_models keys; without it
+        # every input goes to current_model
+        self.router = router
+        # Stream tokens and stop as soon as the JSON object closes
+        self.stream_generation = stream_generation
+        # Ask the server to constrain output to EXTRACTION_SCHEMA; switched off
+        # if it rejects the request
+        self.structured_output = True
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        
+        # LRU of model responses for FAST mode and repeated inputs
+        self.response_cache = ResponseCache(response_cache_size, response_cache_file)
+        self.cache_namespace = ""  # keeps a shared response cache's entries apart per tenant
+        self.quick_min_words = 20  # FAST mode uses the short prompt from this length on
+        # Pattern tier that answers trivial inputs without a model call
+        self.rule_extractor = RuleBasedExtractor()
+        
+        # Triplet ID -> relationship entry, for O(1) merge on ingest
+        # (triplets themselves are found through the TripletTable's own ID index)
+        self.relationship_index = {}
+        # Normalized token -> (category, fact key), for relevant-knowledge lookup
+        self.fact_index = InvertedIndex()
+        # Serializes async access to self.kg; LLM calls run outside it
+        self._kg_lock = asyncio.Lock()
+        # BM25 over triplet text, for ranking facts against the current message
+        self.triplet_ranker = BM25Index()
+        # Subject/object/predicate -> triplet IDs, for graph traversal queries
+        self.adjacency = AdjacencyIndex()
+        # Mention -> canonical entity name, over the graph's persisted alias table
+        self.entity_resolver = EntityResolver({})
+        # Indexes are built on first use so a cold start only reads what it touches
+        self._indexes_built = False
+        # Migrations and in-memory container types for loaded graphs
+        self.schema = KnowledgeGraphSchema(self.initialize_empty_kg, self.generate_triplet_id)
+        # Held by every method that changes self.kg, so the background writer
+        # never encodes a half-applied update
+        self.write_lock = threading.RLock()
+        # Snapshot writes are numbered when encoded, so a background write
+        # never replaces a newer synchronous one
+        self._snapshot_versions = itertools.count(1)
+        self._snapshot_written = 0
+        self._snapshot_file_lock = threading.Lock()
         self.load_knowledge_graph()
         
+        # Optional group commit: saves are queued and written together by a
+        # background thread at most save_interval seconds or max_unsaved_inputs
+        # inputs later - the most a crash can lose. Neither set: every save is
+        # written before extract_and_store returns
+        self.writer = None
+        if save_interval is not None or max_unsaved_inputs is not None:
+            self.writer = GroupCommitWriter(self.background_save, save_interval, max_unsaved_inputs,
+                                            name=f"kg-writer:{os.path.basename(kg_file)}")
+        
     def setup_llm(self, model_choice: str):
         """Setup the selected LLM with Ollama"""
         if model_choice not in self.available_models:
@@ -46,50 +232,185 @@ class UltraKnowledgeExtractor:
         print(f"Setting up {model_info['name']} with Ollama...")
         
         try:
-            # Initialize OpenAI client pointing to Ollama
-            self.ollama_client = OpenAI(
-                base_url=f"{self.ollama_host}/v1",
-                api_key="ollama"  # Required but unused for Ollama
-            )
-            
-            # Test connection by making a simple request
-            test_response = self.ollama_client.chat.completions.create(
-                model=model_info["model_id"],
-                messages=[{"role": "user", "content": "Hello"}],
-                max_tokens=10,
-                temperature=0.1
-            )
-            
-            if test_response.choices:
-                self.current_model = model_info
-                print(f"✅ Successfully connected to {model_info['name']}")
-                return True
-            else:
-                print(f"❌ No response from model {model_info['name']}")
+            # Shared pooled client for this Ollama host
+            self.connection = get_connection(self.ollama_host)
+            self.ollama_client = self.connection.client
+            
+            # Health check: the server answers and has the model, no generation needed
+            if not self.connection.has_model(model_info["model_id"]):
+                print(f"❌ Model {model_info['model_id']} is not installed")
+                print(f"💡 Install it with: 'ollama pull {model_info['model_id']}'")
                 return False
+            
+            # Load the weights now rather than on the first extraction
+            if model_info["model_id"] not in self.connection.preloaded:
+                if not self.connection.preload(model_info["model_id"], self.keep_alive):
+                    print(f"⚠️ Could not preload {model_info['name']} - the first request will load it")
+            
+            self.current_model = model_info
+            print(f"✅ Successfully connected to {model_info['name']}")
+            return True
                 
         except Exception as e:
             print(f"❌ Error connecting to Ollama: {e}")
-            print(f"💡 Make sure Ollama is running: 'ollama serve'")
+            print("💡 Make sure Ollama is running: 'ollama serve'")
             print(f"💡 Make sure model is installed: 'ollama pull {model_info['model_id']}'")
             return False
     
-    def generate_with_model(self, messages: List[Dict], max_tokens: int = 800):
-        """Generate response using Ollama's OpenAI-compatible API - optimized for speed"""
-        if not self.ollama_client or not self.current_model:
+    def generate_with_model(self, messages: List[Dict], max_tokens: int = 800,
+                            on_triplet: Optional[Callable[[Dict], None]] = None, model: Optional[Dict] = None,
+                            cache: bool = True):
+        """Generate response using Ollama's OpenAI-compatible API - optimized for speed
+        
+        cache=False skips the response cache, for prompts that embed graph
+        context and so would almost never repeat.
+        """
+        model = model or self.current_model
+        if not self.ollama_client or not model:
             return "No model loaded"
+        
+        cache_key = ResponseCache.make_key(model["model_id"], messages, max_tokens, self.cache_namespace)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.inc("response_cache_hits")
+                if on_triplet:
+                    StreamingJSONScanner(on_triplet).feed(cached)
+                return cached
+            self.metrics.inc("response_cache_misses")
+        store_key = cache_key if cache else None
+        
+        if on_triplet:
+            return self.stream_with_model(messages, max_tokens, store_key, on_triplet, model)
+        # An identical prompt already in flight on another thread shares its generation
+        if self.connection is not None:
+            return self.connection.coalescer.run(
+                cache_key, lambda: self.generate_uncached(messages, max_tokens, store_key, model))
+        return self.generate_uncached(messages, max_tokens, store_key, model)
+    
+    def cache_response(self, cache_key: Optional[str], content: str):
+        """Keep a response for reuse, unless caching is off for it or it holds no readable JSON object"""
+        if cache_key is not None and parse_json_object(content)[0] is not None:
+            self.response_cache.put(cache_key, content)
+    
+    def generate_uncached(self, messages: List[Dict], max_tokens: int, cache_key: Optional[str], model: Dict) -> str:
+        if self.stream_generation:
+            return self.stream_with_model(messages, max_tokens, cache_key, model=model)
+        
+        try:
+            with self.metrics.timer("llm_call"):
+                response = self.create_completion(messages, max_tokens, stream=False, model=model)
+            self.metrics.record_usage(getattr(response, "usage", None))
             
+            content = response.choices[0].message.content
+            self.cache_response(cache_key, content)
+            return content
+            
+        except Exception as e:
+            print(f"❌ Error generating response: {e}")
+            return f"Error: {e}"
+    
+    def completion_params(self, messages: List[Dict], max_tokens: int, stream: bool = False,
+                          model: Optional[Dict] = None) -> Dict:
+        params = {
+            "model": (model or self.current_model)["model_id"],
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.0,  # Reduced for speed and consistency
+            "top_p": 0.9,        # Added for speed
+            "stream": stream
+        }
+        if self.structured_output:
+            params["response_format"] = structured_output("knowledge_extraction", EXTRACTION_SCHEMA)
+        return params
+    
+    def structured_output_rejected(self, error: Exception, params: Dict) -> bool:
+        """True (and structured output off from now on) if error is the server refusing response_format"""
+        if "response_format" not in params or getattr(error, "status_code", None) != 400:
+            return False
+        self.structured_output = False
+        print("⚠️ Server does not support structured output - relying on the prompt for JSON")
+        return True
+    
+    def create_completion(self, messages: List[Dict], max_tokens: int, stream: bool = False,
+                          model: Optional[Dict] = None):
+        self.metrics.inc("llm_calls")
+        params = self.completion_params(messages, max_tokens, stream, model)
         try:
-            response = self.ollama_client.chat.completions.create(
-                model=self.current_model["model_id"],
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.0,  # Reduced for speed and consistency
-                top_p=0.9,        # Added for speed
-                stream=False      # Non-streaming for now
-            )
+            return self.ollama_client.chat.completions.create(**params)
+        except Exception as e:
+            if not self.structured_output_rejected(e, params):
+                raise
+            return self.ollama_client.chat.completions.create(**self.completion_params(messages, max_tokens, stream, model))
+    
+    async def acreate_completion(self, messages: List[Dict], max_tokens: int, model: Optional[Dict] = None):
+        self.metrics.inc("llm_calls")
+        client = get_async_client(self.ollama_host)
+        params = self.completion_params(messages, max_tokens, model=model)
+        try:
+            return await client.chat.completions.create(**params)
+        except Exception as e:
+            if not self.structured_output_rejected(e, params):
+                raise
+            return await client.chat.completions.create(**self.completion_params(messages, max_tokens, model=model))
+    
+    def stream_with_model(self, messages: List[Dict], max_tokens: int, cache_key: Optional[str],
+                          on_triplet: Optional[Callable[[Dict], None]] = None, model: Optional[Dict] = None):
+        """Streaming generation that parses JSON as it arrives and hangs up once the object closes"""
+        scanner = StreamingJSONScanner(on_triplet)
+        
+        try:
+            start = time.perf_counter()
+            stream = self.create_completion(messages, max_tokens, stream=True, model=model)
             
-            return response.choices[0].message.content
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if scanner.feed(chunk.choices[0].delta.content):
+                            break
+            finally:
+                # Closing the connection makes Ollama stop generating trailing text
+                if hasattr(stream, "close"):
+                    stream.close()
+                self.metrics.observe("llm_call", time.perf_counter() - start)
+            
+            content = scanner.result() or scanner.text
+            self.cache_response(cache_key, content)
+            return content
+            
+        except Exception as e:
+            print(f"❌ Error generating response: {e}")
+            return f"Error: {e}"
+    
+    async def agenerate_with_model(self, messages: List[Dict], max_tokens: int = 800, model: Optional[Dict] = None,
+                                   cache: bool = True):
+        """Async generate_with_model on the shared AsyncOpenAI connection pool"""
+        model = model or self.current_model
+        if not model:
+            return "No model loaded"
+        
+        cache_key = ResponseCache.make_key(model["model_id"], messages, max_tokens, self.cache_namespace)
+        if cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.inc("response_cache_hits")
+                return cached
+            self.metrics.inc("response_cache_misses")
+        store_key = cache_key if cache else None
+        if self.connection is not None:
+            return await self.connection.coalescer.arun(
+                cache_key, lambda: self.agenerate_uncached(messages, max_tokens, store_key, model))
+        return await self.agenerate_uncached(messages, max_tokens, store_key, model)
+    
+    async def agenerate_uncached(self, messages: List[Dict], max_tokens: int, cache_key: Optional[str], model: Dict) -> str:
+        try:
+            with self.metrics.timer("llm_call"):
+                response = await self.acreate_completion(messages, max_tokens, model)
+            self.metrics.record_usage(getattr(response, "usage", None))
+            
+            content = response.choices[0].message.content
+            self.cache_response(cache_key, content)
+            return content
             
         except Exception as e:
             print(f"❌ Error generating response: {e}")
@@ -107,16 +428,487 @@ class UltraKnowledgeExtractor:
         print("   ollama pull llama3.2:3b") 
         print("   ollama pull llama3.1:8b")
     
-    # All other methods remain exactly the same - no changes needed!
     def load_knowledge_graph(self):
-        """Load or initialize the knowledge graph"""
-        if os.path.exists(self.kg_file):
+        """Load or initialize the knowledge graph (snapshot + journal replay)"""
+        if self.store is not None:
+            self.load_from_store()
+            return
+        
+        with self.shared_lock():
+            self.load_snapshot_and_journal()
+        self._stats_baseline = self.stats_counters(self.kg["analytics"]["extraction_stats"])
+    
+    def load_snapshot_and_journal(self):
+        if kg_snapshot.is_snapshot(self.kg_file):
+            self.kg = kg_snapshot.LazyKnowledgeGraph(self.kg_file)
+            self.rehydrate_graph()
+            print(f"📚 Mapped knowledge graph snapshot with {len(self.kg)} sections")
+        elif os.path.exists(self.kg_file):
             with open(self.kg_file, 'r') as f:
                 self.kg = json.load(f)
+            self.rehydrate_graph()
             print(f"📚 Loaded existing knowledge graph with {len(self.kg.get('entities', {}))} entities")
         else:
             self.kg = self.initialize_empty_kg()
             print("🆕 Initialized new knowledge graph")
+        
+        self._indexes_built = False
+        self._journal_seq = self.kg["meta"].get("journal_seq", 0)
+        self._journal_records_since_compact = 0
+        self._journal_offset = 0
+        self._journal_head = None
+        if os.path.exists(self.journal_file):
+            replayed = self.replay_journal()
+            if replayed:
+                print(f"📜 Replayed {replayed} journal records")
+    
+    def load_from_store(self):
+        """Load meta from the storage backend, importing the JSON file into an empty store"""
+        self.kg = self.initialize_empty_kg()
+        
+        if self.store.is_empty() and os.path.exists(self.kg_file):
+            with open(self.kg_file, 'r') as f:
+                self.store.import_json_graph(json.load(f))
+            print(f"📥 Imported {self.kg_file} into storage backend")
+        
+        persisted = self.store.load_meta()
+        if persisted:
+            self.kg["meta"].update(persisted["meta"])
+            self.kg["analytics"]["extraction_stats"].update(persisted["extraction_stats"])
+            for name in META_SECTIONS:
+                if name in persisted:
+                    self.kg[name] = persisted[name]
+            print(f"📚 Loaded knowledge graph from storage backend with {self.store.knowledge_base_size()['total_triplets']} triplets")
+        else:
+            print("🆕 Initialized new knowledge graph in storage backend")
+    
+    def rehydrate_graph(self):
+        """Migrate a freshly loaded graph to the current schema and restore its container types"""
+        meta = self.kg.get("meta") or {}
+        version = self.schema.version_of(meta)
+        
+        def rehydrate(name: str, value: Any) -> Any:
+            return self.schema.rehydrate_section(name, value, version)
+        
+        if isinstance(self.kg, kg_snapshot.LazyKnowledgeGraph):
+            self.kg.on_decode = rehydrate
+            self.kg["meta"] = rehydrate("meta", meta)
+            if version != SCHEMA_VERSION:
+                # Untouched sections are copied forward raw on save, so an
+                # outdated snapshot is migrated in full up front
+                for name in list(self.kg):
+                    self.kg[name]
+        else:
+            self.kg["meta"] = meta
+            for name in list(self.kg):
+                self.kg[name] = rehydrate(name, self.kg[name])
+        
+        self.schema.add_missing_sections(self.kg)
+        if version != SCHEMA_VERSION:
+            print(f"🔄 Migrated knowledge graph from schema {version} to {SCHEMA_VERSION}")
+    
+    def ensure_indexes(self):
+        """Build the lookup indexes the first time something needs them"""
+        if not self._indexes_built:
+            self.build_indexes()
+    
+    def build_indexes(self):
+        """Rebuild the in-memory lookup indexes from self.kg"""
+        self._indexes_built = True
+        self.relationship_index = {}
+        for predicate, relationships in self.kg["relationships"].items():
+            for rel in relationships:
+                rel_id = self.generate_triplet_id({**rel, "predicate": predicate})
+                self.relationship_index.setdefault(rel_id, rel)
+        
+        self.fact_index = InvertedIndex()
+        for category, knowledge in self.kg["knowledge_categories"].items():
+            for key, data in knowledge.items():
+                if isinstance(data, dict):
+                    self.fact_index.add((category, key), self.fact_tokens(key, self.fact_value(data)))
+        
+        self.triplet_ranker = BM25Index()
+        self.adjacency = AdjacencyIndex()
+        self.entity_resolver = EntityResolver(self.kg["entity_aliases"], self.named_entity_types(),
+                                              self.kg["entity_merge_proposals"])
+        for triplet in self.kg["triplets"]:
+            self.triplet_ranker.add(triplet["id"], self.triplet_tokens(triplet))
+            self.adjacency.add(triplet["id"], triplet["subject"], triplet["predicate"], triplet["object"])
+    
+    def named_entity_types(self) -> Dict[str, set]:
+        """Entity name -> the named entity types it is filed under"""
+        if self.store is not None:
+            return self.store.entity_types()
+        types = defaultdict(set)
+        for entity_type, entities in self.kg["named_entities"].items():
+            for name in entities:
+                types[name].add(entity_type)
+        return types
+    
+    @staticmethod
+    def fact_value(data: Dict) -> Any:
+        """Value of a category fact"""
+        return data.get("object", "")
+    
+    @staticmethod
+    def fact_tokens(key: str, value: Any) -> List[str]:
+        """Tokens a category fact can be found by: its key and its value"""
+        return tokenize(key) + tokenize(value)
+    
+    @staticmethod
+    def triplet_tokens(triplet: Dict) -> List[str]:
+        """Text a triplet is ranked on: subject, predicate, object and the input it came from"""
+        return tokenize(f"{triplet['subject']} {triplet['predicate']} {triplet['object']} {triplet.get('source_input', '')}")
+    
+    def relevant_triplets(self, query: str, limit: int = 10) -> List[Dict]:
+        """Top-k stored triplets for a message, best BM25 match first"""
+        self.ensure_indexes()
+        return [self.kg["triplets"].find(triplet_id)
+                for triplet_id in self.triplet_ranker.search(tokenize(query), limit=limit)]
+    
+    def graph_index(self) -> AdjacencyIndex:
+        """Adjacency the graph queries run on: the store's tables in store mode, else the in-memory index"""
+        if self.store is not None:
+            return self.store.adjacency
+        self.ensure_indexes()
+        return self.adjacency
+    
+    def triplets_by_id(self, triplet_ids: List[str]) -> List[Dict]:
+        if self.store is not None:
+            return self.store.triplets_by_id(triplet_ids)
+        return [self.kg["triplets"].find(triplet_id) for triplet_id in triplet_ids]
+    
+    def neighbors(self, entity: str, direction: str = "both", predicate: Optional[str] = None) -> List[Dict]:
+        """Triplets with entity as subject ("out"), object ("in") or either"""
+        triplets = self.triplets_by_id([edge for edge, _ in self.graph_index().neighbors(entity, direction)])
+        return [t for t in triplets if predicate is None or t["predicate"] == predicate]
+    
+    def k_hop(self, entity: str, k: int = 2, limit: Optional[int] = None) -> Dict[str, int]:
+        """Entity name -> hop distance for everything within k hops of entity"""
+        index = self.graph_index()
+        return {index.display_name(key): distance for key, distance in index.k_hop(entity, k, limit).items()}
+    
+    def path(self, source: str, target: str, max_depth: int = 4) -> Optional[List[Dict]]:
+        """Triplets along a shortest path between two entities (either direction), None if unconnected"""
+        edges = self.graph_index().path(source, target, max_depth)
+        return None if edges is None else self.triplets_by_id(edges)
+    
+    def match(self, subject: Optional[str] = None, predicate: Optional[str] = None,
+              obj: Optional[str] = None) -> List[Dict]:
+        """Triplets matching a pattern, e.g. match(predicate="works_at"); None matches anything"""
+        return self.triplets_by_id(self.graph_index().match(subject, predicate, obj))
+    
+    def entity_neighborhood(self, text: str, max_entities: int = 5, max_edges: int = 10) -> List[Dict]:
+        """Triplets around the known entities named in text"""
+        index = self.graph_index()
+        edges = []
+        seen = set()
+        for key in index.mentioned_entities(text)[:max_entities]:
+            for edge, _ in index.neighbors(key):
+                if edge not in seen:
+                    seen.add(edge)
+                    edges.append(edge)
+                    if len(edges) >= max_edges:
+                        return self.triplets_by_id(edges)
+        return self.triplets_by_id(edges)
+    
+    @synchronized
+    def dedupe_knowledge_graph(self) -> int:
+        """One-shot merge of duplicate triplets in an existing graph, returns number removed"""
+        if self.store is not None:
+            return self.store.dedupe_triplets()
+        
+        merged = {}
+        for triplet in self.kg["triplets"]:
+            triplet_id = triplet.get("id") or self.generate_triplet_id(triplet)
+            if triplet_id in merged:
+                self.merge_triplet(merged[triplet_id], triplet.get("confidence", 0.8),
+                                   triplet.get("extracted_at", ""), triplet.get("seen_count", 1))
+            else:
+                merged[triplet_id] = {**triplet, "id": triplet_id, "seen_count": triplet.get("seen_count", 1)}
+        removed = len(self.kg["triplets"]) - len(merged)
+        self.kg["triplets"] = TripletTable(merged.values())
+        
+        for predicate, relationships in list(self.kg["relationships"].items()):
+            merged_rels = {}
+            for rel in relationships:
+                rel_id = self.generate_triplet_id({**rel, "predicate": predicate})
+                if rel_id in merged_rels:
+                    existing = merged_rels[rel_id]
+                    existing["confidence"] = max(existing.get("confidence", 0.8), rel.get("confidence", 0.8))
+                    existing["timestamp"] = max(existing.get("timestamp", ""), rel.get("timestamp", ""))
+                else:
+                    merged_rels[rel_id] = rel
+            self.kg["relationships"][predicate] = list(merged_rels.values())
+        
+        self.build_indexes()
+        return removed
+    
+    @staticmethod
+    def merge_triplet(existing: Dict, confidence: float, extracted_at: str, seen: int = 1):
+        """Fold a re-extracted fact into its stored triplet"""
+        existing["seen_count"] = existing.get("seen_count", 1) + seen
+        existing["extracted_at"] = max(existing.get("extracted_at", ""), extracted_at)
+        existing["confidence"] = max(existing.get("confidence", 0.8), confidence)
+    
+    def canonicalize_triplet(self, triplet: Dict) -> Dict:
+        """Triplet with subject/object mapped to canonical entities, keeping real aliases as *_alias"""
+        subject = self.entity_resolver.resolve(triplet["subject"])
+        # Objects are often plain values, so only already-known entities are mapped
+        obj = self.entity_resolver.lookup(triplet["object"]) or triplet["object"]
+        if subject == triplet["subject"] and obj == triplet["object"]:
+            return triplet
+        
+        canonical = {**triplet, "subject": subject, "object": obj}
+        for field in ("subject", "object"):
+            if normalize_entity(triplet[field]) != normalize_entity(canonical[field]):
+                canonical[f"{field}_alias"] = triplet[field]
+        return canonical
+    
+    @synchronized
+    def rename_entities(self, rename: Callable[[str, Optional[str]], Optional[str]]) -> int:
+        """Rewrite entity names across the graph, merging whatever collapses together
+        
+        rename(name, alias) returns the new name or None; alias is the
+        mention a triplet's subject/object was canonicalized from, if any.
+        Returns the number of triplets changed.
+        """
+        self.ensure_indexes()
+        changed = 0
+        rows = []
+        for triplet in self.kg["triplets"]:
+            row = triplet.to_dict()
+            renamed = False
+            for field in ("subject", "object"):
+                new = rename(row[field], row.get(f"{field}_alias"))
+                if new is not None and new != row[field]:
+                    row.setdefault(f"{field}_alias", row[field])
+                    if normalize_entity(row[f"{field}_alias"]) == normalize_entity(new):
+                        del row[f"{field}_alias"]
+                    row[field] = new
+                    renamed = True
+            if renamed:
+                row["id"] = self.generate_triplet_id(row)
+                changed += 1
+            rows.append(row)
+        self.kg["triplets"] = TripletTable(rows)
+        
+        for relationships in self.kg["relationships"].values():
+            for rel in relationships:
+                for field in ("subject", "object"):
+                    rel[field] = rename(rel[field], None) or rel[field]
+        
+        for facts in self.kg["knowledge_categories"].values():
+            for key, data in list(facts.items()):
+                if not isinstance(data, dict) or "object" not in data:
+                    continue
+                data["subject"] = rename(data.get("subject", ""), None) or data.get("subject", "")
+                new_object = rename(data["object"], None)
+                if new_object is None or new_object == data["object"]:
+                    continue
+                data["object"] = new_object
+                new_key = f"{data['predicate']}_{new_object}".replace(" ", "_")
+                del facts[key]
+                previous = facts.get(new_key)
+                if previous is not None:
+                    data["update_count"] = data.get("update_count", 1) + previous.get("update_count", 1)
+                    if previous.get("last_updated", "") > data.get("last_updated", ""):
+                        data = {**previous, "update_count": data["update_count"]}
+                facts[new_key] = data
+        
+        cap = self.retention["max_contexts_per_entity"]
+        for entities in self.kg["named_entities"].values():
+            for name in list(entities):
+                new = rename(name, None)
+                if new is None or new == name:
+                    continue
+                entry = entities.pop(name)
+                target = entities.get(new)
+                if target is None:
+                    entities[new] = entry
+                    continue
+                target["mention_count"] = target.get("mention_count", 0) + entry.get("mention_count", 0)
+                target["first_mentioned"] = min(target.get("first_mentioned", ""), entry.get("first_mentioned", ""))
+                contexts = sorted(target.get("contexts", []) + entry.get("contexts", []),
+                                  key=lambda context: context.get("timestamp", ""))
+                target["contexts"] = []
+                for context in contexts:
+                    self.append_capped(target["contexts"], context, cap)
+        
+        mentions = self.kg["conversation_metadata"]["entity_mentions"]
+        for name in list(mentions):
+            new = rename(name, None)
+            if new is not None and new != name:
+                mentions[new] += mentions.pop(name)
+        
+        self.dedupe_knowledge_graph()
+        return changed
+    
+    def canonicalize_entities(self) -> int:
+        """Collapse entity variants already in the graph ("Mom", "my mother") onto canonical names"""
+        self.ensure_indexes()
+        resolver = self.entity_resolver
+        canonical = {}
+        for entity_type, entities in self.kg["named_entities"].items():
+            for name in entities:
+                canonical[name] = resolver.resolve(name, entity_type)
+        for triplet in self.kg["triplets"]:
+            canonical.setdefault(triplet["subject"], resolver.resolve(triplet["subject"]))
+        for triplet in self.kg["triplets"]:
+            canonical.setdefault(triplet["object"], resolver.lookup(triplet["object"]) or triplet["object"])
+        for name in self.kg["conversation_metadata"]["entity_mentions"]:
+            canonical.setdefault(name, resolver.resolve(name))
+        return self.rename_entities(lambda name, alias: canonical.get(name))
+    
+    @synchronized
+    def merge_entities(self, names: List[str], into: str) -> int:
+        """Treat names (and all their aliases) as the entity into from now on, merging existing data"""
+        self.ensure_indexes()
+        replaced = self.entity_resolver.merge(names, into)
+        target = self.entity_resolver.lookup(into)
+        keys = {normalize_entity(name) for name in [*names, *replaced]}
+        changed = self.rename_entities(lambda name, alias: target if normalize_entity(name) in keys else None)
+        self.persist_knowledge_graph()
+        return changed
+    
+    @synchronized
+    def split_entity(self, alias: str, new_name: Optional[str] = None) -> int:
+        """Detach an alias from the entity it was merged into; triplets recorded under it move too"""
+        self.ensure_indexes()
+        key = normalize_entity(alias)
+        new = self.entity_resolver.split(alias, new_name)
+        changed = self.rename_entities(
+            lambda name, original: new if original is not None and normalize_entity(original) == key else None)
+        self.persist_knowledge_graph()
+        return changed
+    
+    def replay_journal(self, offset: int = 0) -> int:
+        """Apply journal records newer than the snapshot, returns number of records applied"""
+        snapshot_seq = self._journal_seq
+        replayed = 0
+        valid_bytes = offset
+        torn = False
+        # Integrations below would queue themselves for the journal again
+        own_pending = self._pending_journal
+        self._pending_journal = []
+        
+        with open(self.journal_file, 'rb') as f:
+            self._journal_head = f.readline()
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise json.JSONDecodeError("unterminated record", "", 0)
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    torn = True
+                    break
+                valid_bytes += len(line)
+                if record["seq"] <= snapshot_seq:
+                    continue
+                
+                if record["op"] == "integrate":
+                    self.integrate_extracted_knowledge(record["data"], record["input"], current_time=record["ts"])
+                elif record["op"] == "save":
+                    if "stats_delta" in record:
+                        self.add_counters(self.kg["analytics"]["extraction_stats"], record["stats_delta"])
+                        self.add_counters(self._stats_baseline, record["stats_delta"])
+                    else:
+                        self.kg["analytics"]["extraction_stats"] = record["extraction_stats"]
+                    self.update_save_metadata(record["ts"], record.get("inputs", 1))
+                
+                self._journal_seq = record["seq"]
+                replayed += 1
+        
+        if torn:
+            # A torn final line from a crash mid-append - cut it off so later
+            # appends don't land behind unreadable bytes
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_bytes)
+        
+        # Replayed integrations are already durable in the journal
+        self._pending_journal = own_pending
+        self._journal_offset = valid_bytes
+        self._journal_records_since_compact += replayed
+        return replayed
+    
+    @contextmanager
+    def shared_lock(self):
+        """Exclusive advisory lock on the graph files across processes (no-op unless shared)"""
+        if not self.shared or self._lock_handle is not None:
+            yield
+            return
+        with open(self.lock_file, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            self._lock_handle = handle
+            try:
+                yield
+            finally:
+                self._lock_handle = None
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def sync_shared_journal(self) -> int:
+        """Apply what other processes journaled since we last looked (call under shared_lock)"""
+        head = self.journal_head()
+        if head is None:
+            return 0
+        if head == self._journal_head:
+            return self.replay_journal(self._journal_offset)
+        
+        # Another process compacted (or started) the journal: reload its snapshot,
+        # then reapply our own not-yet-journaled integrations and stats on top
+        own_pending = self._pending_journal
+        own_stats = self.stats_delta()
+        self._pending_journal = []
+        if isinstance(self.kg, kg_snapshot.LazyKnowledgeGraph):
+            # The reload maps the new snapshot; release the old one's mapping
+            self.kg.map.close()
+        self.load_snapshot_and_journal()
+        self._stats_baseline = self.stats_counters(self.kg["analytics"]["extraction_stats"])
+        for record in own_pending:
+            self.integrate_extracted_knowledge(record["data"], record["input"], current_time=record["ts"])
+        self.add_counters(self.kg["analytics"]["extraction_stats"], own_stats)
+        return len(own_pending)
+    
+    def journal_head(self) -> Optional[bytes]:
+        try:
+            with open(self.journal_file, 'rb') as f:
+                return f.readline()
+        except FileNotFoundError:
+            return None
+    
+    @classmethod
+    def stats_counters(cls, stats: Dict) -> Dict:
+        """Copy of the integer counters in extraction_stats (nested dicts included)"""
+        counters = {}
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                counters[key] = cls.stats_counters(value)
+            elif isinstance(value, int) and key not in JOURNALED_COUNTERS:
+                counters[key] = value
+        return counters
+    
+    def stats_delta(self) -> Dict:
+        """Counter increments since the last shared-mode save"""
+        def diff(current: Dict, baseline: Dict) -> Dict:
+            delta = {}
+            for key, value in current.items():
+                if isinstance(value, dict):
+                    nested = diff(value, baseline.get(key, {}))
+                    if nested:
+                        delta[key] = nested
+                elif value != baseline.get(key, 0):
+                    delta[key] = value - baseline.get(key, 0)
+            return delta
+        return diff(self.stats_counters(self.kg["analytics"]["extraction_stats"]), self._stats_baseline)
+    
+    @classmethod
+    def add_counters(cls, target: Dict, delta: Dict):
+        for key, value in delta.items():
+            if isinstance(value, dict):
+                cls.add_counters(target.setdefault(key, {}), value)
+            else:
+                target[key] = target.get(key, 0) + value
             
     def initialize_empty_kg(self):
         """Initialize comprehensive knowledge graph structure"""
@@ -131,12 +923,21 @@ class UltraKnowledgeExtractor:
                 }
             },
             
-            # All extracted triplets with full context
-            "triplets": [],
+            # All extracted triplets with full context (column store, a list in JSON)
+            "triplets": TripletTable(),
             
             # Relationship mappings for quick lookup
             "relationships": defaultdict(list),
             
+            # Normalized entity mention -> canonical entity name
+            "entity_aliases": {},
+            
+            # Near-miss spellings not merged automatically, for 'merge' to confirm
+            "entity_merge_proposals": [],
+            
+            # Raw input texts, stored once and reference-counted from contexts
+            "source_texts": {},
+            
             # Temporal patterns and changes
             "temporal_patterns": {},
             
@@ -154,8 +955,8 @@ class UltraKnowledgeExtractor:
             "conversation_metadata": {
                 "sessions": [],
                 "topics_discussed": [],
-                "entity_mentions": defaultdict(int),
-                "relationship_frequency": defaultdict(int)
+                "entity_mentions": Counter(),
+                "relationship_frequency": Counter()
             },
             
             # Enhanced categorization
@@ -184,86 +985,385 @@ class UltraKnowledgeExtractor:
                     "total_extractions": 0,
                     "successful_extractions": 0,
                     "failed_extractions": 0,
-                    "avg_triplets_per_input": 0
+                    "avg_triplets_per_input": 0,
+                    "llm_calls_avoided": {"rule_based": 0, "no_content": 0}
                 },
                 "entity_growth": [],
                 "knowledge_density": {}
             },
             
             "meta": {
-                "version": "2.0",
+                "version": SCHEMA_VERSION,
                 "created": str(datetime.now()),
                 "last_updated": str(datetime.now()),
                 "total_inputs_processed": 0
             }
         }
     
-    def save_knowledge_graph(self):
+    @timed("save")
+    @synchronized
+    def save_knowledge_graph(self, inputs: int = 1):
         """Save knowledge graph with enhanced metadata"""
-        self.kg["meta"]["last_updated"] = str(datetime.now())
-        self.kg["meta"]["total_inputs_processed"] += 1
+        current_time = str(datetime.now())
+        
+        if self.store is not None:
+            self.update_save_metadata(current_time, inputs)
+            self.store.save_meta(self.kg["meta"], self.kg["analytics"]["extraction_stats"], self.meta_sections())
+            return
+        
+        if not self.journal_mode:
+            self.update_save_metadata(current_time, inputs)
+            self.write_snapshot()
+            return
+        
+        with self.shared_lock():
+            if self.shared:
+                self.sync_shared_journal()
+            self.update_save_metadata(current_time, inputs)
+            
+            record = {"op": "save", "ts": current_time, "inputs": inputs}
+            if self.shared:
+                record["stats_delta"] = self.stats_delta()
+                self._stats_baseline = self.stats_counters(self.kg["analytics"]["extraction_stats"])
+            else:
+                record["extraction_stats"] = self.kg["analytics"]["extraction_stats"]
+            self._pending_journal.append(record)
+            self.append_journal_records()
+            
+            if self._journal_records_since_compact >= self.compact_every:
+                self.compact_journal()
+    
+    def meta_sections(self) -> Dict:
+        """The in-memory sections a store saves alongside meta"""
+        return {name: self.kg[name] for name in META_SECTIONS}
+    
+    @synchronized
+    def persist_knowledge_graph(self):
+        """Write out in-place maintenance changes without counting an input"""
+        if self.store is not None:
+            self.store.save_meta(self.kg["meta"], self.kg["analytics"]["extraction_stats"], self.meta_sections())
+            return
+        if self.journal_mode:
+            with self.shared_lock():
+                if self.shared:
+                    self.sync_shared_journal()
+                self.compact_journal()
+        else:
+            self.write_snapshot()
+    
+    def update_save_metadata(self, current_time: str, inputs: int = 1):
+        """Bump save counters and derived analytics"""
+        self.kg["meta"]["last_updated"] = current_time
+        self.kg["meta"]["total_inputs_processed"] += inputs
         
         # Update analytics
-        total_triplets = len(self.kg["triplets"])
+        total_triplets = self.knowledge_base_size()["total_triplets"]
         total_inputs = self.kg["meta"]["total_inputs_processed"]
         if total_inputs > 0:
             self.kg["analytics"]["extraction_stats"]["avg_triplets_per_input"] = total_triplets / total_inputs
+    
+    def write_snapshot(self):
+        """Atomically write the full graph - a crash leaves the previous file intact"""
+        self.stamp_journal_seq()
+        version = next(self._snapshot_versions)
+        with self._snapshot_file_lock:
+            if self.snapshot_format == "binary":
+                kg_snapshot.write_snapshot(self.kg_file, self.kg, default=self.snapshot_default)
+            else:
+                tmp_file = f"{self.kg_file}.tmp"
+                with open(tmp_file, 'w') as f:
+                    json.dump(self.kg, f, indent=2, default=self.json_default)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.kg_file)
+            self._snapshot_written = version
+        if self.metrics.enabled:
+            self.metrics.inc("bytes_written", os.path.getsize(self.kg_file))
+    
+    def stamp_journal_seq(self):
+        """Record the last journal record this graph already holds
         
-        with open(self.kg_file, 'w') as f:
-            json.dump(self.kg, f, indent=2)
+        Every full snapshot carries it, whatever the mode, so the loader
+        never applies a leftover journal's records a second time.
+        """
+        self.kg["meta"]["journal_seq"] = self._journal_seq
     
-    def get_extraction_context(self, user_input: str) -> str:
-        """Build comprehensive context for better extraction"""
-        context_parts = []
+    def encode_snapshot(self) -> List[bytes]:
+        """The full graph as the bytes write_snapshot would put on disk"""
+        self.stamp_journal_seq()
+        if self.snapshot_format == "binary":
+            return kg_snapshot.encode_snapshot(self.kg, default=self.snapshot_default)
+        return [json.dumps(self.kg, indent=2, default=self.json_default).encode()]
+    
+    def request_save(self, inputs: int = 1):
+        """Save now, or queue the save for the background writer when there is one"""
+        if self.writer is not None:
+            self.writer.mark_dirty(inputs)
+        else:
+            self.save_knowledge_graph(inputs)
+    
+    def background_save(self, inputs: int):
+        """The writer's save: one write covering every input queued since the last
+        
+        Snapshot graphs are encoded under write_lock and written outside it,
+        so ingestion waits at most for the encoding, never for the disk.
+        Journaled and store-backed graphs save as usual, one record and one
+        fsync per group.
+        """
+        if self.journal_mode or self.store is not None:
+            self.save_knowledge_graph(inputs)
+            return
+        
+        with self.metrics.timer("save"):
+            with self.write_lock:
+                self.update_save_metadata(str(datetime.now()), inputs)
+                parts = self.encode_snapshot()
+                version = next(self._snapshot_versions)
+            with self._snapshot_file_lock:
+                if version < self._snapshot_written:
+                    return  # a synchronous write already saved newer state
+                kg_snapshot.write_atomic(self.kg_file, parts)
+                self._snapshot_written = version
+        self.metrics.inc("bytes_written", sum(len(part) for part in parts))
+    
+    def flush_pending_saves(self):
+        """Write out saves the background writer is still holding"""
+        if self.writer is not None:
+            self.writer.flush()
+    
+    def close(self):
+        """Stop the background writer, saving anything it still holds"""
+        if self.writer is not None:
+            self.writer.close()
+    
+    @staticmethod
+    def json_default(value: Any) -> Any:
+        """Convert in-memory containers back to the JSON file schema"""
+        if isinstance(value, TripletTable):
+            return value.to_json()
+        if isinstance(value, MutableMapping):
+            return dict(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    
+    @classmethod
+    def snapshot_default(cls, value: Any) -> Any:
+        """Like json_default, but triplets go to binary snapshots column-wise"""
+        if isinstance(value, TripletTable):
+            return {"columns": value.to_columns()}
+        return cls.json_default(value)
+    
+    def append_journal_records(self):
+        """Append pending records to the journal as compact JSON lines"""
+        if not self._pending_journal:
+            return
+        
+        lines = []
+        for record in self._pending_journal:
+            self._journal_seq += 1
+            lines.append(json.dumps({"seq": self._journal_seq, **record}, separators=(",", ":")))
+        
+        with open(self.journal_file, 'a') as f:
+            start = f.tell()
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_offset = f.tell()
+        self.metrics.inc("bytes_written", self._journal_offset - start)
+        self._journal_head = self.journal_head()
+        
+        self._journal_records_since_compact += len(self._pending_journal)
+        self._pending_journal = []
+    
+    def compact_journal(self):
+        """Fold the journal into a fresh snapshot and start a new journal"""
+        self.append_journal_records()
+        
+        # The snapshot records the last folded seq, so a crash before the
+        # swap below only means those records are skipped on replay
+        self.write_snapshot()
+        
+        # The new journal opens with a marker naming the folded seq, so a
+        # shared-mode reader sees a different first line and reloads instead
+        # of reading on from a stale offset
+        marker = json.dumps({"seq": self._journal_seq, "op": "compacted"}, separators=(",", ":")) + "\n"
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(marker)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+        self._journal_offset = len(marker.encode())
+        self._journal_head = marker.encode()
+        self._journal_records_since_compact = 0
+    
+    def knowledge_base_size(self) -> Dict[str, int]:
+        """Headline counts for the knowledge graph"""
+        if self.store is not None:
+            return self.store.knowledge_base_size()
+        
+        return {
+            "total_triplets": len(self.kg["triplets"]),
+            "total_entities": sum(len(entities) for entities in self.kg["named_entities"].values()),
+            "knowledge_categories": len([cat for cat in self.kg["knowledge_categories"] if self.kg["knowledge_categories"][cat]])
+        }
+    
+    def prompt_budget(self, model: Optional[Dict] = None) -> int:
+        """Prompt tokens allowed per call for model (the current one by default)"""
+        return (model or self.current_model or {}).get("prompt_budget", DEFAULT_PROMPT_BUDGET)
+    
+    @timed("extraction_context")
+    def get_extraction_context(self, user_input: str, max_tokens: Optional[int] = None) -> str:
+        """Build comprehensive context for better extraction
+        
+        Candidate lines are ranked by relevance to the input, confidence and
+        recency, and kept best first until max_tokens (the model's whole
+        prompt budget by default) is used up.
+        """
+        if max_tokens is None:
+            max_tokens = self.prompt_budget()
+        if self.store is not None:
+            return fit_context(self.store.extraction_context(user_input), max_tokens, NO_CONTEXT)
+        
+        self.ensure_indexes()
+        budget = PromptBudget(max_tokens)
+        budget.section("topics", "Recent topics discussed: ", ", ")
+        budget.section("entities", "Frequently mentioned entities: ", ", ")
+        budget.section("relationships", "Known relationships: ")
+        budget.section("neighborhood", "Connected facts about mentioned entities: ")
+        budget.section("knowledge", "Relevant existing knowledge: ")
         
         # Recent conversation topics
-        if self.kg["conversation_metadata"]["topics_discussed"]:
-            recent_topics = list(self.kg["conversation_metadata"]["topics_discussed"][-10:])
-            context_parts.append(f"Recent topics discussed: {', '.join(recent_topics)}")
+        recent_topics = list(self.kg["conversation_metadata"]["topics_discussed"][-CONTEXT_CANDIDATES["topics"]:])
+        for i, topic in enumerate(recent_topics):
+            budget.add("topics", topic, priority(recency=(i + 1) / len(recent_topics)))
         
         # Frequently mentioned entities
-        frequent_entities = sorted(
-            self.kg["conversation_metadata"]["entity_mentions"].items(),
-            key=lambda x: x[1], reverse=True
-        )[:15]
-        if frequent_entities:
-            entities_str = ", ".join([f"{entity}({count})" for entity, count in frequent_entities])
-            context_parts.append(f"Frequently mentioned entities: {entities_str}")
-        
-        # Known relationships
-        known_relationships = []
-        for rel_type, relationships in list(self.kg["relationships"].items())[:10]:
-            for rel in relationships[:3]:
-                known_relationships.append(f"{rel['subject']} {rel_type} {rel['object']}")
-        if known_relationships:
-            context_parts.append(f"Known relationships: {'; '.join(known_relationships)}")
-        
-        # Current knowledge in relevant categories
-        input_keywords = set(user_input.lower().split())
-        relevant_knowledge = []
+        frequent_entities = self.kg["conversation_metadata"]["entity_mentions"].most_common(CONTEXT_CANDIDATES["entities"])
+        for entity, count in frequent_entities:
+            budget.add("entities", f"{entity}({count})", priority(relevance=0.5 * count / frequent_entities[0][1]))
         
-        for category, knowledge in self.kg["knowledge_categories"].items():
-            if not knowledge:
-                continue
-            for key, data in list(knowledge.items())[:5]:
-                if isinstance(data, dict) and "current_value" in data:
-                    value_words = set(str(data["current_value"]).lower().split())
-                    if input_keywords.intersection(value_words) or any(keyword in key.lower() for keyword in input_keywords):
-                        relevant_knowledge.append(f"{category}.{key}: {data['current_value']}")
+        # Known relationships - the facts most relevant to this input, or a small sample
+        def add_triplets(section: str, triplets: List[Dict], relevance: float):
+            recency = recency_scores([t.get("extracted_at") for t in triplets])
+            for rank, triplet in enumerate(triplets):
+                fact = f"{triplet['subject']} {triplet['predicate']} {triplet['object']}"
+                if fact not in known_facts:
+                    known_facts.add(fact)
+                    budget.add(section, fact, priority(relevance * rank_score(rank, len(triplets)),
+                                                       triplet.get("confidence", 0.8), recency[rank]))
+        
+        known_facts = set()
+        add_triplets("relationships", self.relevant_triplets(user_input, limit=CONTEXT_CANDIDATES["facts"]), 1.0)
+        if not known_facts:
+            sample = [{"predicate": rel_type, "extracted_at": rel.get("timestamp"), **rel}
+                      for rel_type, relationships in list(self.kg["relationships"].items())[:10]
+                      for rel in relationships[:3]]
+            add_triplets("relationships", sample, 0.0)
+        
+        # Graph neighborhood of entities the input names
+        add_triplets("neighborhood", self.entity_neighborhood(user_input, max_edges=CONTEXT_CANDIDATES["facts"]), 0.5)
         
-        if relevant_knowledge:
-            context_parts.append(f"Relevant existing knowledge: {'; '.join(relevant_knowledge[:10])}")
+        # Current knowledge in relevant categories - one posting lookup per input token
+        fact_keys = self.fact_index.lookup(tokenize(user_input), limit=CONTEXT_CANDIDATES["facts"])
+        facts = [self.kg["knowledge_categories"][category][key] for category, key in fact_keys]
+        recency = recency_scores([data.get("last_updated") for data in facts])
+        for rank, ((category, key), data) in enumerate(zip(fact_keys, facts)):
+            budget.add("knowledge", f"{category}.{key}: {self.fact_value(data)}",
+                       priority(rank_score(rank, len(facts)), data.get("confidence", 0.8), recency[rank]))
         
-        return "\n".join(context_parts) if context_parts else "No existing context available."
+        return budget.render(NO_CONTEXT)
     
-    def ultra_extract_knowledge(self, user_input: str) -> Dict:
+    def ultra_extract_knowledge(self, user_input: str, on_triplet: Optional[Callable[[Dict], None]] = None) -> Dict:
         """Ultra-comprehensive knowledge extraction - optimized for speed"""
-        
-        extraction_context = self.get_extraction_context(user_input)
         current_time = str(datetime.now())
+        pre_extracted = self.pre_extract_knowledge(user_input, current_time)
+        if pre_extracted is not None:
+            return pre_extracted
+        
+        return self.model_extract(user_input, current_time, lambda model: self.build_extraction_messages(user_input, model),
+                                  max_tokens=800, on_triplet=on_triplet)  # Reduced for speed
+    
+    def model_extract(self, user_input: str, current_time: str, build_messages: Callable[[Optional[Dict]], List[Dict]],
+                      max_tokens: int, extraction_method: str = "ultra_comprehensive",
+                      on_triplet: Optional[Callable[[Dict], None]] = None, tier: Optional[str] = None,
+                      cache: bool = False) -> Dict:
+        """Generate and parse one extraction, moving up the router's tiers while it asks to escalate
         
-        # Simplified and faster system prompt
-        system_prompt = f"""You are a personal knowledge assistant. The user is voluntarily sharing information about themselves to build their personal knowledge graph. This is consensual information sharing for legitimate personal use.
+        Without a router this is a single call to the current model. The
+        input counts once towards the success/failure stats, by the
+        attempt that is kept. cache is only worth turning on for prompts
+        that depend on the input alone.
+        """
+        if tier is None and self.router is not None:
+            tier = self.router.choose(user_input)
+        while True:
+            model = self.available_models[tier] if tier is not None else None
+            messages = build_messages(model)
+            prompt_tokens = self.record_prompt_tokens(messages)
+            start = time.perf_counter()
+            response = self.generate_with_model(messages, max_tokens, on_triplet, model=model, cache=cache)
+            extracted_data = self.parse_extraction_response(response, user_input, current_time, extraction_method,
+                                                            prompt_tokens=prompt_tokens, count_result=False)
+            if tier is not None:
+                tier = self.route_outcome(tier, user_input, extracted_data, time.perf_counter() - start)
+            if tier is None:
+                self.count_extraction_result(extracted_data)
+                return extracted_data
+    
+    def timed_generate(self, messages: List[Dict], max_tokens: int, model: Optional[Dict] = None) -> Tuple[str, float]:
+        """generate_with_model plus its wall time, for feeding the router from worker threads"""
+        start = time.perf_counter()
+        return self.generate_with_model(messages, max_tokens, model=model, cache=False), time.perf_counter() - start
+    
+    def route_outcome(self, tier: str, user_input: str, extracted_data: Dict, seconds: float) -> Optional[str]:
+        """Report one routed call to the router; the tier to retry on, or None to keep this extraction"""
+        if not extracted_data:
+            outcome = "unparsable"
+        elif not extracted_data.get("triplets") and not any(extracted_data.get("named_entities", {}).values()):
+            outcome = "empty"
+        else:
+            outcome = "ok"
+        self.router.record(tier, seconds, outcome != "unparsable")
+        next_tier = self.router.escalate(tier, user_input, outcome)
+        if next_tier is not None:
+            self.metrics.inc("model_escalations")
+            print(f"⬆️ {outcome.capitalize()} extraction - retrying with {self.available_models[next_tier]['name']}")
+        return next_tier
+    
+    @synchronized
+    def pre_extract_knowledge(self, user_input: str, current_time: str) -> Optional[Dict]:
+        """Rule-based tier: extraction data ({} for chit-chat) or None when the LLM is needed"""
+        extraction_data = self.rule_extractor.extract(user_input)
+        if extraction_data is None:
+            return None
+        
+        stats = self.kg["analytics"]["extraction_stats"]
+        avoided = stats.setdefault("llm_calls_avoided", {"rule_based": 0, "no_content": 0})
+        if not extraction_data:
+            avoided["no_content"] += 1
+            self.metrics.inc("llm_calls_avoided")
+            return {}
+        
+        avoided["rule_based"] += 1
+        stats["successful_extractions"] += 1
+        self.metrics.inc("llm_calls_avoided")
+        extraction_data["meta"] = {
+            "timestamp": current_time,
+            "session_id": f"session_{datetime.now().strftime('%Y%m%d_%H')}",
+            "input_text": user_input,
+            "extraction_method": "rule_based"
+        }
+        return extraction_data
+    
+    def build_extraction_messages(self, user_input: str, model: Optional[Dict] = None) -> List[Dict]:
+        """Build the extraction prompt for an input against the current graph
+        
+        The graph context gets whatever the model's prompt budget leaves
+        after the instructions and the input itself.
+        """
+        def messages_with(extraction_context: str) -> List[Dict]:
+            # Simplified and faster system prompt
+            system_prompt = f"""You are a personal knowledge assistant. The user is voluntarily sharing information about themselves to build their personal knowledge graph. This is consensual information sharing for legitimate personal use.
 
 CONTEXT: {extraction_context}
 
@@ -284,7 +1384,7 @@ Return JSON format:
       "predicate": "relationship_or_attribute",
       "object": "value",
       "category": "identity|social|interests|goals|lifestyle",
-      "confidence": 0.8-1.0
+      "confidence": 0.9
     }}
   ],
   "named_entities": {{
@@ -297,69 +1397,168 @@ Return JSON format:
 
 Respond with JSON only, no other text."""
 
+            return [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f'The user says: "{user_input}"\n\nExtract personal information and return as JSON only.'}
+            ]
+        
+        context_budget = self.prompt_budget(model) - count_message_tokens(messages_with(""))
+        return messages_with(self.get_extraction_context(user_input, context_budget))
+    
+    def quick_extract_knowledge(self, user_input: str) -> Dict:
+        """FAST mode extraction: short context-free prompt and a smaller token budget
+        
+        Without graph context the prompt depends only on the input, so
+        repeated inputs are served straight from the response cache.
+        """
+        current_time = str(datetime.now())
+        pre_extracted = self.pre_extract_knowledge(user_input, current_time)
+        if pre_extracted is not None:
+            return pre_extracted
+        
         messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f'The user says: "{user_input}"\n\nExtract personal information and return as JSON only.'}
+            {"role": "system", "content": """Extract personal facts the user shares about themselves. Return JSON only:
+{"triplets": [{"subject": "User", "predicate": "...", "object": "...", "category": "identity|social|interests|goals|lifestyle", "confidence": 0.9}],
+ "named_entities": {"people": [], "places": [], "organizations": []},
+ "topics_mentioned": []}"""},
+            {"role": "user", "content": user_input}
         ]
         
-        try:
-            response = self.generate_with_model(messages, max_tokens=800)  # Reduced for speed
-            
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                extraction_json = json_match.group()
-                extraction_data = json.loads(extraction_json)
-                
-                # Add metadata
-                extraction_data["meta"] = {
-                    "timestamp": current_time,
-                    "session_id": f"session_{datetime.now().strftime('%Y%m%d_%H')}",
-                    "input_text": user_input,
-                    "extraction_method": "ultra_comprehensive"
-                }
-                
-                self.kg["analytics"]["extraction_stats"]["successful_extractions"] += 1
-                return extraction_data
-                
-            else:
-                print(f"⚠️ Could not extract JSON from response")
-                self.kg["analytics"]["extraction_stats"]["failed_extractions"] += 1
-                return {}
-                
-        except Exception as e:
-            print(f"❌ Error in knowledge extraction: {e}")
-            self.kg["analytics"]["extraction_stats"]["failed_extractions"] += 1
+        return self.model_extract(user_input, current_time, lambda model: messages, max_tokens=300,
+                                  extraction_method="quick", cache=True)
+    
+    @synchronized
+    def record_prompt_tokens(self, messages: List[Dict]) -> int:
+        """Approximate tokens of a prompt about to be sent, added to the running totals"""
+        tokens = count_message_tokens(messages)
+        usage = self.kg["analytics"]["extraction_stats"].setdefault("prompt_tokens", {"calls": 0, "total": 0})
+        usage["calls"] += 1
+        usage["total"] += tokens
+        return tokens
+    
+    @timed("parse")
+    @synchronized
+    def parse_extraction_response(self, response: str, user_input: str, current_time: str,
+                                  extraction_method: str = "ultra_comprehensive",
+                                  prompt_tokens: Optional[int] = None, count_result: bool = True) -> Dict:
+        """Parse the model's extraction JSON and record success/failure
+        
+        The first JSON object in the response is read in one pass, repaired
+        if need be, and checked against EXTRACTION_SCHEMA; invalid triplets
+        or fields are dropped instead of failing the whole extraction.
+        Routed callers pass count_result=False and count the input once
+        routing has settled on an attempt.
+        """
+        stats = self.kg["analytics"]["extraction_stats"]
+        extraction_data, errors = parse_json_object(response, EXTRACTION_VALIDATOR)
+        if errors:
+            extraction_data = drop_invalid(extraction_data, errors)
+            stats["schema_violations"] = stats.get("schema_violations", 0) + len(errors)
+            self.metrics.inc("schema_violations", len(errors))
+        
+        if not isinstance(extraction_data, dict):
+            print("⚠️ Could not extract JSON from response")
+            self.metrics.inc("parse_failures")
+            if count_result:
+                self.count_extraction_result({})
             return {}
+        
+        # Add metadata
+        extraction_data["meta"] = {
+            "timestamp": current_time,
+            "session_id": f"session_{datetime.now().strftime('%Y%m%d_%H')}",
+            "input_text": user_input,
+            "extraction_method": extraction_method
+        }
+        if prompt_tokens is not None:
+            extraction_data["meta"]["prompt_tokens"] = prompt_tokens
+        
+        if count_result:
+            self.count_extraction_result(extraction_data)
+        return extraction_data
+    
+    @synchronized
+    def count_extraction_result(self, extracted_data: Dict):
+        """Count one input's model extraction as successful (parsed) or failed"""
+        stats = self.kg["analytics"]["extraction_stats"]
+        stats["successful_extractions" if extracted_data else "failed_extractions"] += 1
     
-    def integrate_extracted_knowledge(self, extracted_data: Dict, user_input: str):
+    @timed("integrate")
+    @synchronized
+    def integrate_extracted_knowledge(self, extracted_data: Dict, user_input: str, current_time: Optional[str] = None):
         """Integrate extracted knowledge into the comprehensive knowledge graph"""
         if not extracted_data:
             return
         
-        current_time = str(datetime.now())
+        current_time = current_time or str(datetime.now())
+        
+        self.ensure_indexes()
+        if self.store is not None:
+            # Same entity resolution as the JSON graph, so "Mom" and "my mother" are one node
+            named_entities = {
+                entity_type: [self.entity_resolver.resolve(entity, entity_type) for entity in entities]
+                for entity_type, entities in extracted_data.get("named_entities", {}).items()
+            }
+            triplets = [self.canonicalize_triplet(triplet) for triplet in extracted_data.get("triplets", [])]
+            self.store.integrate({**extracted_data, "named_entities": named_entities, "triplets": triplets},
+                                 user_input, current_time, self.generate_triplet_id, self.retention)
+            self.kg["analytics"]["extraction_stats"]["total_extractions"] += 1
+            return
+        
+        if self.journal_mode:
+            self._pending_journal.append({
+                "op": "integrate",
+                "ts": current_time,
+                "input": user_input,
+                "data": extracted_data
+            })
+        
+        # Resolve entity mentions first, so triplets naming a new entity see it
+        named_entities = {
+            entity_type: [self.entity_resolver.resolve(entity, entity_type) for entity in entities]
+            for entity_type, entities in extracted_data.get("named_entities", {}).items()
+        }
         
         # Process triplets
         if "triplets" in extracted_data:
             for triplet in extracted_data["triplets"]:
-                # Add to main triplets store
-                triplet_with_meta = {
-                    **triplet,
-                    "id": self.generate_triplet_id(triplet),
-                    "extracted_at": current_time,
-                    "source_input": user_input
-                }
-                self.kg["triplets"].append(triplet_with_meta)
+                triplet = self.canonicalize_triplet(triplet)
+                triplet_id = self.generate_triplet_id(triplet)
+                confidence = triplet.get("confidence", 0.8)
+                
+                existing = self.kg["triplets"].find(triplet_id)
+                if existing is not None:
+                    # Known fact - merge instead of storing another copy
+                    self.merge_triplet(existing, confidence, current_time)
+                else:
+                    # Add to main triplets store
+                    triplet_with_meta = {
+                        **triplet,
+                        "id": triplet_id,
+                        "extracted_at": current_time,
+                        "source_input": user_input,
+                        "seen_count": 1
+                    }
+                    self.kg["triplets"].append(triplet_with_meta)
+                    self.triplet_ranker.add(triplet_id, self.triplet_tokens(triplet_with_meta))
+                    self.adjacency.add(triplet_id, triplet["subject"], triplet["predicate"], triplet["object"])
                 
                 # Add to relationships mapping
                 predicate = triplet["predicate"]
-                self.kg["relationships"][predicate].append({
-                    "subject": triplet["subject"],
-                    "object": triplet["object"],
-                    "confidence": triplet.get("confidence", 0.8),
-                    "timestamp": current_time,
-                    "context": triplet.get("context", "")
-                })
+                existing_rel = self.relationship_index.get(triplet_id)
+                if existing_rel is not None:
+                    existing_rel["confidence"] = max(existing_rel.get("confidence", 0.8), confidence)
+                    existing_rel["timestamp"] = current_time
+                else:
+                    rel = {
+                        "subject": triplet["subject"],
+                        "object": triplet["object"],
+                        "confidence": confidence,
+                        "timestamp": current_time,
+                        "context": triplet.get("context", "")
+                    }
+                    self.kg["relationships"][predicate].append(rel)
+                    self.relationship_index[triplet_id] = rel
                 
                 # Add to knowledge categories
                 category = triplet.get("category", "general")
@@ -370,6 +1569,11 @@ Respond with JSON only, no other text."""
                 
                 key = f"{triplet['predicate']}_{triplet['object']}".replace(" ", "_")
                 
+                previous = self.kg["knowledge_categories"][category].get(key, {})
+                source_contexts = previous.get("source_contexts", [])
+                if triplet.get("context"):
+                    self.append_capped(source_contexts, triplet["context"], self.retention["max_contexts_per_fact"])
+                
                 self.kg["knowledge_categories"][category][key] = {
                     "subject": triplet["subject"],
                     "predicate": triplet["predicate"],
@@ -378,13 +1582,14 @@ Respond with JSON only, no other text."""
                     "confidence": triplet.get("confidence", 0.8),
                     "temporal_info": triplet.get("temporal_info", "unknown"),
                     "last_updated": current_time,
-                    "update_count": self.kg["knowledge_categories"][category].get(key, {}).get("update_count", 0) + 1,
-                    "source_contexts": self.kg["knowledge_categories"][category].get(key, {}).get("source_contexts", []) + [triplet.get("context", "")]
+                    "update_count": previous.get("update_count", 0) + 1,
+                    "source_contexts": source_contexts
                 }
+                self.fact_index.add((category, key), self.fact_tokens(key, triplet["object"]))
         
         # Process named entities
-        if "named_entities" in extracted_data:
-            for entity_type, entities in extracted_data["named_entities"].items():
+        if named_entities:
+            for entity_type, entities in named_entities.items():
                 if entity_type not in self.kg["named_entities"]:
                     self.kg["named_entities"][entity_type] = {}
                 
@@ -397,83 +1602,324 @@ Respond with JSON only, no other text."""
                         }
                     
                     self.kg["named_entities"][entity_type][entity]["mention_count"] += 1
-                    self.kg["named_entities"][entity_type][entity]["contexts"].append({
+                    self.append_capped(self.kg["named_entities"][entity_type][entity]["contexts"], {
                         "timestamp": current_time,
-                        "input": user_input,
+                        "input_ref": self.store_source_text(user_input),
                         "context": extracted_data.get("context", "")
-                    })
+                    }, self.retention["max_contexts_per_entity"])
                     
                     # Update conversation metadata
                     self.kg["conversation_metadata"]["entity_mentions"][entity] += 1
         
         # Process other extracted information
-        for key in ["topics_mentioned", "emotional_indicators", "temporal_markers", 
-                   "relationship_dynamics", "behavior_patterns", "decision_factors", 
-                   "communication_style", "priority_indicators"]:
+        for key in METADATA_KEYS:
             if key in extracted_data:
                 if key not in self.kg["conversation_metadata"]:
                     self.kg["conversation_metadata"][key] = []
                 
                 for item in extracted_data[key]:
-                    self.kg["conversation_metadata"][key].append({
+                    self.append_capped(self.kg["conversation_metadata"][key], {
                         "value": item,
                         "timestamp": current_time,
-                        "source_input": user_input
-                    })
+                        "source_ref": self.store_source_text(user_input)
+                    }, self.retention["max_items_per_metadata_list"])
         
         # Update analytics
         self.kg["analytics"]["extraction_stats"]["total_extractions"] += 1
         
-        # Track knowledge growth
+        # Track knowledge growth, one rolled-up row per time bucket
         entity_count = sum(len(entities) for entities in self.kg["named_entities"].values())
-        self.kg["analytics"]["entity_growth"].append({
+        self.record_growth({
             "timestamp": current_time,
             "total_entities": entity_count,
             "total_triplets": len(self.kg["triplets"]),
             "total_categories": len([cat for cat in self.kg["knowledge_categories"] if self.kg["knowledge_categories"][cat]])
         })
     
+    def append_capped(self, items: List, item: Any, cap: Optional[int]):
+        """Append to a list used as a ring buffer of at most cap entries"""
+        items.append(item)
+        if cap and len(items) > cap:
+            for evicted in items[:len(items) - cap]:
+                if isinstance(evicted, dict):
+                    self.release_source_text(evicted.get("input_ref") or evicted.get("source_ref"))
+            del items[:len(items) - cap]
+    
+    def store_source_text(self, text: str) -> str:
+        """Store a raw input once and return its content-addressed reference"""
+        ref = hashlib.md5(text.encode()).hexdigest()[:12]
+        source_texts = self.kg.setdefault("source_texts", {})
+        if ref in source_texts:
+            source_texts[ref]["refs"] += 1
+        else:
+            source_texts[ref] = {"text": text, "refs": 1}
+        return ref
+    
+    def release_source_text(self, ref: Optional[str]):
+        """Drop one reference to a stored input, deleting it with the last one"""
+        source_texts = self.kg.get("source_texts", {})
+        if ref in source_texts:
+            source_texts[ref]["refs"] -= 1
+            if source_texts[ref]["refs"] <= 0:
+                del source_texts[ref]
+    
+    def source_text(self, item: Dict) -> str:
+        """Raw input behind an entity context or metadata item (inline in older graphs)"""
+        ref = item.get("input_ref") or item.get("source_ref")
+        if ref is not None:
+            return self.kg.get("source_texts", {}).get(ref, {}).get("text", "")
+        return item.get("input", item.get("source_input", ""))
+    
+    def growth_bucket(self, timestamp: str) -> str:
+        return timestamp[:GROWTH_BUCKET_LENGTHS[self.retention["growth_bucket"]]]
+    
+    def record_growth(self, row: Dict, inputs: int = 1):
+        """Fold a growth sample into the current bucket or start a new one"""
+        growth = self.kg["analytics"]["entity_growth"]
+        bucket = self.growth_bucket(row["timestamp"])
+        if growth and growth[-1].get("bucket") == bucket:
+            growth[-1].update(row)
+            growth[-1]["inputs"] = growth[-1].get("inputs", 1) + inputs
+        else:
+            self.append_capped(growth, {"bucket": bucket, "inputs": inputs, **row},
+                               self.retention["max_growth_buckets"])
+    
+    @synchronized
+    def compact(self) -> Dict[str, int]:
+        """Apply retention to an existing graph and persist it, returns what was dropped"""
+        if self.store is not None:
+            return self.store.apply_retention(self.retention)
+        
+        dropped = {"entity_contexts": 0, "fact_contexts": 0, "metadata_items": 0, "growth_rows": 0, "source_texts": 0}
+        
+        # Reference counts are rebuilt from the contexts that survive
+        old_texts = self.kg.get("source_texts", {})
+        self.kg["source_texts"] = {}
+        
+        def to_ref(item: Dict, inline_key: str, ref_key: str):
+            if inline_key in item:
+                text = item.pop(inline_key)
+            else:
+                text = old_texts.get(item.get(ref_key), {}).get("text", "")
+            item[ref_key] = self.store_source_text(text)
+        
+        for entities in self.kg["named_entities"].values():
+            for data in entities.values():
+                contexts = data.get("contexts", [])
+                cap = self.retention["max_contexts_per_entity"]
+                if cap and len(contexts) > cap:
+                    dropped["entity_contexts"] += len(contexts) - cap
+                    del contexts[:len(contexts) - cap]
+                for context in contexts:
+                    to_ref(context, "input", "input_ref")
+        
+        for knowledge in self.kg["knowledge_categories"].values():
+            for data in knowledge.values():
+                if not isinstance(data, dict) or "source_contexts" not in data:
+                    continue
+                kept = [context for context in data["source_contexts"] if context]
+                cap = self.retention["max_contexts_per_fact"]
+                if cap:
+                    kept = kept[-cap:]
+                dropped["fact_contexts"] += len(data["source_contexts"]) - len(kept)
+                data["source_contexts"] = kept
+        
+        for key, items in self.kg["conversation_metadata"].items():
+            if not isinstance(items, list):
+                continue
+            cap = self.retention["max_items_per_metadata_list"]
+            if cap and len(items) > cap:
+                dropped["metadata_items"] += len(items) - cap
+                del items[:len(items) - cap]
+            for item in items:
+                if isinstance(item, dict):
+                    to_ref(item, "source_input", "source_ref")
+        
+        rows = self.kg["analytics"]["entity_growth"]
+        self.kg["analytics"]["entity_growth"] = []
+        for row in rows:
+            self.record_growth({k: v for k, v in row.items() if k not in ("bucket", "inputs")}, row.get("inputs", 1))
+        dropped["growth_rows"] = len(rows) - len(self.kg["analytics"]["entity_growth"])
+        
+        dropped["source_texts"] = len(set(old_texts) - set(self.kg["source_texts"]))
+        
+        self.persist_knowledge_graph()
+        return dropped
+    
     def generate_triplet_id(self, triplet: Dict) -> str:
         """Generate unique ID for triplet to avoid duplicates"""
         content = f"{triplet['subject']}_{triplet['predicate']}_{triplet['object']}"
         return hashlib.md5(content.encode()).hexdigest()[:12]
     
-    def extract_and_store(self, user_input: str) -> Dict:
-        """Main method to extract and store knowledge from user input"""
-        print("🧠 Ultra-extracting knowledge...")
+    def extract_and_store(self, user_input: str, fast: bool = False,
+                          on_triplet: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Main method to extract and store knowledge from user input
         
-        # Extract comprehensive knowledge
-        extracted_data = self.ultra_extract_knowledge(user_input)
+        on_triplet turns on streaming and is called with each triplet as soon
+        as it has been generated, before the rest of the response.
+        """
+        if fast and len(user_input.split()) >= self.quick_min_words:
+            print("⚡ Quick-extracting knowledge...")
+            extracted_data = self.quick_extract_knowledge(user_input)
+        else:
+            print("🧠 Ultra-extracting knowledge...")
+            # Extract comprehensive knowledge
+            extracted_data = self.ultra_extract_knowledge(user_input, on_triplet=on_triplet)
         
         if extracted_data:
             # Integrate into knowledge graph
             self.integrate_extracted_knowledge(extracted_data, user_input)
             
-            # Save knowledge graph
-            self.save_knowledge_graph()
-            
-            # Prepare summary for output
-            summary = self.generate_extraction_summary(extracted_data)
-            print(f"✅ Extracted and stored knowledge successfully")
+            # Save knowledge graph (queued when a background writer is on)
+            self.request_save()
             
-            return {
-                "extraction_successful": True,
-                "extracted_triplets": len(extracted_data.get("triplets", [])),
-                "named_entities_found": sum(len(entities) for entities in extracted_data.get("named_entities", {}).values()),
-                "topics_identified": len(extracted_data.get("topics_mentioned", [])),
-                "summary": summary,
-                "total_knowledge_base_size": {
-                    "total_triplets": len(self.kg["triplets"]),
-                    "total_entities": sum(len(entities) for entities in self.kg["named_entities"].values()),
-                    "knowledge_categories": len([cat for cat in self.kg["knowledge_categories"] if self.kg["knowledge_categories"][cat]])
-                }
-            }
+            print("✅ Extracted and stored knowledge successfully")
         else:
             print("⚠️ No knowledge extracted from input")
+        
+        return self.build_extraction_result(extracted_data)
+    
+    async def aextract_and_store(self, user_input: str) -> Dict:
+        """Async extract_and_store for event-loop hosts
+        
+        The graph lock is held while building the prompt and while
+        integrating, but released for the model call, so concurrent calls
+        on one instance overlap their generations. The save runs on a
+        worker thread after the lock is released, so neither disk I/O nor
+        a full background writer stalls the event loop or the other calls.
+        """
+        current_time = str(datetime.now())
+        
+        async with self._kg_lock:
+            extracted_data = self.pre_extract_knowledge(user_input, current_time)
+            tier = None
+            if extracted_data is None and self.router is not None:
+                tier = self.router.choose(user_input)
+        
+        while extracted_data is None:
+            model = self.available_models[tier] if tier is not None else None
+            async with self._kg_lock:
+                messages = self.build_extraction_messages(user_input, model)
+                prompt_tokens = self.record_prompt_tokens(messages)
+            
+            start = time.perf_counter()
+            response = await self.agenerate_with_model(messages, max_tokens=800, model=model, cache=False)
+            
+            async with self._kg_lock:
+                attempt = self.parse_extraction_response(response, user_input, current_time,
+                                                         prompt_tokens=prompt_tokens, count_result=False)
+                if tier is not None:
+                    tier = self.route_outcome(tier, user_input, attempt, time.perf_counter() - start)
+                if tier is None:
+                    self.count_extraction_result(attempt)
+                    extracted_data = attempt
+        
+        async with self._kg_lock:
+            self.integrate_extracted_knowledge(extracted_data, user_input)
+            result = self.build_extraction_result(extracted_data)
+        if extracted_data:
+            await asyncio.to_thread(self.request_save)
+        return result
+    
+    def build_extraction_result(self, extracted_data: Dict) -> Dict:
+        """Result dict returned to callers for one processed input"""
+        if not extracted_data:
             return {
                 "extraction_successful": False,
                 "message": "No extractable knowledge found in input"
             }
+        
+        return {
+            "extraction_successful": True,
+            "extracted_triplets": len(extracted_data.get("triplets", [])),
+            "named_entities_found": sum(len(entities) for entities in extracted_data.get("named_entities", {}).values()),
+            "topics_identified": len(extracted_data.get("topics_mentioned", [])),
+            "prompt_tokens": extracted_data.get("meta", {}).get("prompt_tokens", 0),
+            "summary": self.generate_extraction_summary(extracted_data),
+            "total_knowledge_base_size": self.knowledge_base_size()
+        }
+    
+    def extract_many(self, inputs: List[str], concurrency: int = 4, checkpoint_every: Optional[int] = None) -> Dict:
+        """Batch extraction with LLM calls fanned out over a bounded thread pool
+        
+        Only the model calls run concurrently. Prompts are built, responses
+        parsed and results integrated on the calling thread in input order:
+        input i is submitted right after input i - concurrency is integrated,
+        so the graph each prompt sees is the same on every run. The graph is
+        saved every checkpoint_every inputs and once at the end, or handed to
+        the background writer after each input when there is one. With a
+        router, escalations are retried on the calling thread.
+        """
+        inputs = list(inputs)
+        results = [None] * len(inputs)
+        pending = {}
+        unsaved = 0
+        start_time = time.time()
+        
+        def submit(pool, index):
+            current_time = str(datetime.now())
+            pre_extracted = self.pre_extract_knowledge(inputs[index], current_time)
+            if pre_extracted is not None:
+                pending[index] = (current_time, None, None, pre_extracted)
+                return
+            tier = self.router.choose(inputs[index]) if self.router is not None else None
+            model = self.available_models[tier] if tier is not None else None
+            messages = self.build_extraction_messages(inputs[index], model)
+            pending[index] = (current_time, tier, self.record_prompt_tokens(messages),
+                              pool.submit(self.timed_generate, messages, 800, model))
+        
+        print(f"🧠 Batch-extracting {len(inputs)} inputs with concurrency {concurrency}...")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for index in range(min(concurrency, len(inputs))):
+                submit(pool, index)
+            
+            for index, user_input in enumerate(inputs):
+                current_time, tier, prompt_tokens, outcome = pending.pop(index)
+                if isinstance(outcome, dict):
+                    extracted_data = outcome
+                else:
+                    response, seconds = outcome.result()
+                    extracted_data = self.parse_extraction_response(response, user_input, current_time,
+                                                                    prompt_tokens=prompt_tokens, count_result=False)
+                    if tier is not None:
+                        tier = self.route_outcome(tier, user_input, extracted_data, seconds)
+                    if tier is not None:
+                        extracted_data = self.model_extract(
+                            user_input, current_time, lambda model: self.build_extraction_messages(user_input, model),
+                            max_tokens=800, tier=tier)
+                    else:
+                        self.count_extraction_result(extracted_data)
+                self.integrate_extracted_knowledge(extracted_data, user_input)
+                results[index] = {"input_index": index, **self.build_extraction_result(extracted_data)}
+                if self.writer is not None:
+                    self.writer.mark_dirty()
+                else:
+                    unsaved += 1
+                
+                if checkpoint_every and unsaved >= checkpoint_every:
+                    self.save_knowledge_graph(inputs=unsaved)
+                    unsaved = 0
+                    print(f"💾 Checkpoint after {index + 1}/{len(inputs)} inputs")
+                
+                if index + concurrency < len(inputs):
+                    submit(pool, index + concurrency)
+        
+        if unsaved:
+            self.save_knowledge_graph(inputs=unsaved)
+        
+        elapsed = time.time() - start_time
+        successful = sum(1 for result in results if result["extraction_successful"])
+        print(f"✅ Batch complete: {successful}/{len(inputs)} inputs in {elapsed:.2f}s")
+        
+        return {
+            "results": results,
+            "total_inputs": len(inputs),
+            "successful_inputs": successful,
+            "failed_inputs": len(inputs) - successful,
+            "elapsed_seconds": round(elapsed, 3),
+            "inputs_per_second": round(len(inputs) / elapsed, 3) if elapsed > 0 else 0.0,
+            "total_knowledge_base_size": self.knowledge_base_size()
+        }
     
     def generate_extraction_summary(self, extracted_data: Dict) -> List[str]:
         """Generate human-readable summary of extracted information"""
@@ -502,6 +1948,10 @@ Respond with JSON only, no other text."""
     
     def display_knowledge_stats(self):
         """Display comprehensive knowledge graph statistics"""
+        if self.store is not None:
+            self.store.display_stats(self.kg["meta"], self.kg["analytics"]["extraction_stats"])
+            return
+        
         print("\n" + "="*100)
         print("📊 ULTRA KNOWLEDGE GRAPH STATISTICS")
         print("="*100)
@@ -516,6 +1966,19 @@ Respond with JSON only, no other text."""
         print(f"📂 Active Knowledge Categories: {total_categories}")
         print(f"🔄 Total Inputs Processed: {self.kg['meta']['total_inputs_processed']}")
         print(f"🎯 Extraction Success Rate: {self.kg['analytics']['extraction_stats']['successful_extractions']}/{self.kg['analytics']['extraction_stats']['total_extractions']}")
+        avoided = self.kg["analytics"]["extraction_stats"].get("llm_calls_avoided", {})
+        print(f"⚡ LLM Calls Avoided: {avoided.get('rule_based', 0)} rule-based, {avoided.get('no_content', 0)} no-content")
+        usage = self.kg["analytics"]["extraction_stats"].get("prompt_tokens", {})
+        if usage.get("calls"):
+            print(f"📏 Prompt Tokens: {usage['total']} over {usage['calls']} calls "
+                  f"(avg {usage['total'] / usage['calls']:.0f}, budget {self.prompt_budget()})")
+        if self.router is not None:
+            print("🔀 Model Routing:")
+            for tier, row in self.router.summary().items():
+                success = f"{row['success_rate']:.0%}" if row["success_rate"] is not None else "n/a"
+                latency = f"{row['mean_latency_seconds']:.2f}s" if row["mean_latency_seconds"] is not None else "n/a"
+                print(f"  {self.available_models[tier]['name']}: {row['calls']} calls, "
+                      f"parse success {success}, mean latency {latency}")
         
         # Category breakdown
         print("\n📋 KNOWLEDGE BY CATEGORY:")
@@ -549,34 +2012,47 @@ Respond with JSON only, no other text."""
         # Recent growth
         if self.kg["analytics"]["entity_growth"]:
             latest_growth = self.kg["analytics"]["entity_growth"][-1]
-            print(f"\n📈 Current Knowledge Graph Size:")
+            print("\n📈 Current Knowledge Graph Size:")
             print(f"  • Entities: {latest_growth['total_entities']}")
             print(f"  • Triplets: {latest_growth['total_triplets']}")
             print(f"  • Categories: {latest_growth['total_categories']}")
         
         print("="*100)
     
-    def export_for_llm_context(self, max_triplets: int = 50, max_entities: int = 30) -> str:
-        """Export knowledge graph in format optimized for LLM context"""
-        context_parts = []
-        
-        # Recent high-confidence triplets
-        recent_triplets = sorted(
-            self.kg["triplets"],
-            key=lambda x: (x.get("confidence", 0), x.get("extracted_at", "")),
-            reverse=True
-        )[:max_triplets]
-        
-        if recent_triplets:
-            context_parts.append("KEY KNOWLEDGE ABOUT USER:")
-            for triplet in recent_triplets:
-                confidence = triplet.get("confidence", 0)
-                if confidence >= 0.7:  # Only high-confidence info
-                    subj = triplet["subject"]
-                    pred = triplet["predicate"].replace("_", " ")
-                    obj = triplet["object"]
-                    temporal = triplet.get("temporal_info", "")
-                    context_parts.append(f"• {subj} {pred} {obj} {f'({temporal})' if temporal else ''}")
+    def export_for_llm_context(self, max_triplets: int = 50, max_entities: int = 30,
+                               query: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        """Export knowledge graph in format optimized for LLM context
+        
+        With a query, triplets are the top-k BM25 matches for it instead of
+        the globally highest-confidence ones. With max_tokens, items are
+        kept by relevance, confidence and recency until the budget is used.
+        """
+        if self.store is not None:
+            context = self.store.export_for_llm_context(max_triplets, max_entities, query=query)
+            return fit_context(context, max_tokens) if max_tokens is not None else context
+        
+        budget = PromptBudget(max_tokens)
+        budget.section("knowledge", "KEY KNOWLEDGE ABOUT USER:\n", "\n")
+        budget.section("entities", "\nIMPORTANT ENTITIES: ", ", ")
+        budget.section("patterns", "\nBEHAVIOR PATTERNS: ", "; ")
+        
+        if query:
+            recent_triplets = self.relevant_triplets(query, limit=max_triplets)
+        else:
+            # Recent high-confidence triplets
+            recent_triplets = self.kg["triplets"].top_by_confidence(max_triplets)
+        
+        recency = recency_scores([triplet.get("extracted_at") for triplet in recent_triplets])
+        for rank, triplet in enumerate(recent_triplets):
+            confidence = triplet.get("confidence", 0)
+            if confidence >= 0.7:  # Only high-confidence info
+                subj = triplet["subject"]
+                pred = triplet["predicate"].replace("_", " ")
+                obj = triplet["object"]
+                temporal = triplet.get("temporal_info", "")
+                relevance = rank_score(rank, len(recent_triplets)) if query else 0.0
+                budget.add("knowledge", f"• {subj} {pred} {obj} {f'({temporal})' if temporal else ''}",
+                           priority(relevance, confidence, recency[rank]))
         
         # Important entities
         important_entities = []
@@ -585,21 +2061,30 @@ Respond with JSON only, no other text."""
                                    key=lambda x: x[1]["mention_count"], reverse=True)
             for entity, data in sorted_entities[:5]:  # Top 5 per type
                 if data["mention_count"] > 1:  # Only frequently mentioned
-                    important_entities.append(f"{entity} ({entity_type})")
+                    important_entities.append((f"{entity} ({entity_type})", data["mention_count"]))
         
-        if important_entities:
-            context_parts.append(f"\nIMPORTANT ENTITIES: {', '.join(important_entities[:max_entities])}")
+        important_entities = important_entities[:max_entities]
+        top_mentions = max((mentions for _, mentions in important_entities), default=1)
+        for entity, mentions in important_entities:
+            budget.add("entities", entity, priority(relevance=0.5 * mentions / top_mentions))
         
         # Behavioral patterns
         if "behavior_patterns" in self.kg["conversation_metadata"]:
             recent_patterns = [item["value"] for item in self.kg["conversation_metadata"]["behavior_patterns"][-10:]]
-            if recent_patterns:
-                context_parts.append(f"\nBEHAVIOR PATTERNS: {'; '.join(set(recent_patterns))}")
+            for i, pattern in enumerate(dict.fromkeys(recent_patterns)):
+                budget.add("patterns", pattern, priority(recency=(i + 1) / len(recent_patterns)))
         
-        return "\n".join(context_parts)
+        return budget.render()
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main extraction loop"""
+    parser = argparse.ArgumentParser(description="Interactive knowledge extraction into a local knowledge graph")
+    parser.add_argument("--save-interval", type=float,
+                        help="save in the background at most this many seconds late (default: save every input)")
+    parser.add_argument("--max-unsaved", type=int,
+                        help="save in the background at most this many inputs late (default: save every input)")
+    args = parser.parse_args(argv)
+    
     print("🧠 ULTRA KNOWLEDGE EXTRACTION SYSTEM (Ollama Edition)")
     print("=" * 60)
     print("🎯 PURPOSE: Maximum information capture and knowledge graph building")
@@ -607,7 +2092,12 @@ def main():
     print("🔗 Powered by Ollama's OpenAI-compatible API")
     
     # Initialize the system
-    extractor = UltraKnowledgeExtractor()
+    # With either flag, saves are written in the background and a crash loses
+    # at most that many seconds or inputs
+    extractor = UltraKnowledgeExtractor(metrics=Metrics(), save_interval=args.save_interval,
+                                        max_unsaved_inputs=args.max_unsaved)
+    if extractor.writer is not None:
+        install_signal_handler()  # a kill flushes queued saves like 'quit' does
     
     # Model selection
     while True:
@@ -625,8 +2115,11 @@ def main():
             print("Please try again.")
     
     print("\n🎯 Ultra Knowledge Extractor is ready!")
-    print("💡 Commands: 'quit' to exit, 'stats' for statistics, 'export' for LLM context")
-    print("⚡ Commands: 'fast' to toggle fast mode, 'full' to toggle full mode")
+    print("💡 Commands: 'quit' to exit, 'stats' for statistics, 'export' for LLM context, 'dedupe' to merge duplicates, 'compact' to apply retention")
+    print("🪪 Commands: 'canonicalize' to collapse entity variants, 'merge A, B => C', 'split A => B', 'proposals' for suggested merges")
+    print("⚡ Commands: 'fast' to toggle fast mode, 'full' to toggle full mode, 'stream' to toggle streaming")
+    print("⏱️ Commands: 'metrics' for per-stage timings (Prometheus text), 'metrics json' for a JSON snapshot")
+    print("🔀 Commands: 'route' to toggle picking the model per input, 'routes' for recent routing decisions")
     print("🔍 Share anything and I'll extract maximum knowledge for your knowledge graph")
     print("-" * 80)
     
@@ -639,6 +2132,7 @@ def main():
         user_input = input("\nInput: ").strip()
         
         if user_input.lower() in ['quit', 'exit']:
+            extractor.close()
             print("\n👋 Knowledge extraction session complete!")
             break
         elif user_input.lower() == 'stats':
@@ -651,10 +2145,66 @@ def main():
             print(context)
             print("-" * 60)
             continue
+        elif user_input.lower() == 'dedupe':
+            removed = extractor.dedupe_knowledge_graph()
+            extractor.persist_knowledge_graph()
+            print(f"🧹 Merged {removed} duplicate triplets")
+            continue
+        elif user_input.lower() == 'canonicalize':
+            changed = extractor.canonicalize_entities()
+            extractor.persist_knowledge_graph()
+            print(f"🪪 Canonicalized entities in {changed} triplets")
+            continue
+        elif user_input.lower().startswith('merge '):
+            # merge Mom, my mother => Mother
+            names, _, into = user_input[len('merge '):].partition('=>')
+            if not into.strip():
+                print("💡 Usage: merge <name>, <name>, ... => <canonical name>")
+                continue
+            changed = extractor.merge_entities([name.strip() for name in names.split(',') if name.strip()], into.strip())
+            print(f"🔗 Merged into '{into.strip()}' ({changed} triplets updated)")
+            continue
+        elif user_input.lower() == 'proposals':
+            extractor.ensure_indexes()
+            for proposal in extractor.entity_resolver.proposals:
+                print(f"🔗 merge {proposal['mention']} => {proposal['candidate']}  (similarity {proposal['score']})")
+            if not extractor.entity_resolver.proposals:
+                print("💡 No merge proposals")
+            continue
+        elif user_input.lower().startswith('split '):
+            # split Jordan => Jordan (cousin)
+            alias, _, new_name = user_input[len('split '):].partition('=>')
+            changed = extractor.split_entity(alias.strip(), new_name.strip() or None)
+            print(f"✂️ Split '{alias.strip()}' off ({changed} triplets updated)")
+            continue
         elif user_input.lower() == 'fast':
             fast_mode = True
             print("🚀 Switched to FAST mode (optimized for speed)")
             continue
+        elif user_input.lower() == 'compact':
+            dropped = extractor.compact()
+            print(f"🗜️ Compacted knowledge graph: {dropped}")
+            continue
+        elif user_input.lower() in ('metrics', 'metrics json'):
+            # Per-stage timings: context, llm_call, parse, integrate, save
+            print(extractor.metrics.to_json() if user_input.lower().endswith('json') else extractor.metrics.to_prometheus())
+            continue
+        elif user_input.lower() == 'route':
+            if extractor.router is None:
+                # Routing decisions are appended next to the graph for tuning the thresholds
+                extractor.router = ModelRouter(list(extractor.available_models), log_file=f"{extractor.kg_file}.routing.jsonl")
+            else:
+                extractor.router = None
+            print(f"🔀 Per-input model routing {'ON' if extractor.router else 'OFF'}")
+            continue
+        elif user_input.lower() == 'routes':
+            for decision in (extractor.router.recent_decisions() if extractor.router else []):
+                print(f"  {decision['event']}: {extractor.available_models[decision['tier']]['name']} - {decision['reason']}")
+            continue
+        elif user_input.lower() == 'stream':
+            extractor.stream_generation = not extractor.stream_generation
+            print(f"📡 Streaming generation {'ON' if extractor.stream_generation else 'OFF'}")
+            continue
         elif user_input.lower() == 'full':
             fast_mode = False
             print("🔍 Switched to COMPREHENSIVE mode (detailed extraction)")
@@ -664,42 +2214,10 @@ def main():
         
         # Extract and store knowledge
         try:
-            import time
             start_time = time.time()
             
-            # Toggle extraction mode based on fast_mode
-            if fast_mode and hasattr(extractor, 'response_cache'):
-                # Force quick mode
-                old_method = extractor.extract_and_store
-                def quick_wrapper(user_input):
-                    if len(user_input.split()) < 20:
-                        return old_method(user_input)
-                    else:
-                        # For longer inputs in fast mode, still use quick extraction
-                        extracted_data = extractor.quick_extract_knowledge(user_input)
-                        if extracted_data:
-                            extractor.integrate_extracted_knowledge(extracted_data, user_input)
-                            extractor.save_knowledge_graph()
-                            summary = extractor.generate_extraction_summary(extracted_data)
-                            return {
-                                "extraction_successful": True,
-                                "extracted_triplets": len(extracted_data.get("triplets", [])),
-                                "named_entities_found": sum(len(entities) for entities in extracted_data.get("named_entities", {}).values()),
-                                "topics_identified": len(extracted_data.get("topics_mentioned", [])),
-                                "summary": summary,
-                                "total_knowledge_base_size": {
-                                    "total_triplets": len(extractor.kg["triplets"]),
-                                    "total_entities": sum(len(entities) for entities in extractor.kg["named_entities"].values()),
-                                    "knowledge_categories": len([cat for cat in extractor.kg["knowledge_categories"] if extractor.kg["knowledge_categories"][cat]])
-                                }
-                            }
-                        else:
-                            return {"extraction_successful": False, "message": "No extractable knowledge found"}
-                
-                result = quick_wrapper(user_input)
-            else:
-                # Use normal extraction
-                result = extractor.extract_and_store(user_input)
+            # FAST mode routes long inputs through the quick prompt, whose responses are cached
+            result = extractor.extract_and_store(user_input, fast=fast_mode)
             
             end_time = time.time()
             processing_time = end_time - start_time